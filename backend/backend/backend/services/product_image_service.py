@@ -2,6 +2,7 @@
 
 import contextlib
 import json
+import time
 from pathlib import Path
 from uuid import UUID, uuid4
 from typing import Dict, Any
@@ -23,6 +24,10 @@ from backend.dtos.wooden_board_dtos import WoodenBoardInputDTO
 from backend.services.image_service import image_service
 from backend.settings import settings
 
+# Timeout for the image analysis request; it is also sent to the YOLO backend
+# as an absolute deadline so it can drop work nobody will wait for.
+ANALYSIS_TIMEOUT_SECONDS = 60.0
+
 
 class ProductImageService:
     """Service for handling product operations with image analysis."""
@@ -77,10 +82,12 @@ class ProductImageService:
             base_url = self.yolo_base_url.rstrip('/')
             volume_service_url = f"{base_url}/wooden_boards_volume_seg/?height={height_in_meters}&length={length_in_meters}"
 
-            async with httpx.AsyncClient(timeout=60.0) as client:
+            deadline = time.time() + ANALYSIS_TIMEOUT_SECONDS
+            async with httpx.AsyncClient(timeout=ANALYSIS_TIMEOUT_SECONDS) as client:
                 response = await client.post(
                     volume_service_url,
                     files=files,
+                    headers={"X-Request-Deadline": f"{deadline:.3f}"},
                 )
                 
                 if response.status_code != 200:
@@ -1,7 +1,20 @@
 from fastapi import APIRouter
 
+from core.segmentation import segmenter
+from core.settings import settings
+
 router = APIRouter()
 
 @router.get("/health")
 async def read_health():
     return {"status": "ok"}
+
+
+@router.get("/status")
+async def read_status():
+    """
+    State of the path to the segmentation service: requests in flight and
+    waiting for a slot, and the circuit breaker state (closed, open or
+    half_open) with its failure and slow call rates.
+    """
+    return {"inference_mode": settings.INFERENCE_MODE, **segmenter.status()}
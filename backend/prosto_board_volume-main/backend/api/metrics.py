@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+
+from core.detection_store import detection_store
+from core.logging_config import logging_metrics
+from core.segmentation import segmenter
+from core.settings import settings
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def read_metrics():
+    """
+    Inference mode with its metrics: for http, connection metrics of the
+    segmentation service client (requests, retries, errors, new vs reused
+    connections and waits for a free pooled connection) with the admission
+    queue and circuit breaker state of /status; for local, requests,
+    timeouts and the average inference time. Also the usage of the store
+    behind /remeasure and the log level with the number of records dropped
+    by the log queue.
+    """
+    return {
+        "inference_mode": settings.INFERENCE_MODE,
+        **segmenter.metrics(),
+        "detection_store": detection_store.stats(),
+        "logging": logging_metrics(),
+    }
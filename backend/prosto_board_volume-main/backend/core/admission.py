@@ -0,0 +1,120 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Deque
+
+
+class AdmissionQueueFullError(Exception):
+    """
+    The wait queue for the segmentation service is full.
+    """
+
+
+class AdmissionTimeoutError(Exception):
+    """
+    No slot became free within the allowed wait.
+    """
+
+
+class AdmissionLimiter:
+    """
+    Bounded number of requests in flight to the segmentation service.
+
+    Requests beyond max_in_flight wait in a FIFO queue and get a slot in
+    arrival order: a released slot is handed directly to the oldest waiter,
+    so a newly arrived request cannot overtake the queue. When max_waiting
+    requests are already waiting, new ones are rejected at once instead of
+    piling up.
+
+    Args:
+        max_in_flight: Requests sent at the same time; 0 disables the limit
+        max_waiting: Requests allowed to wait for a slot
+    """
+
+    def __init__(self, max_in_flight: int, max_waiting: int):
+        self.max_in_flight = max_in_flight
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted_total = 0
+        self.queued_total = 0
+        self.rejected_total = 0
+        self.timeouts_total = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def slot(self, timeout: float):
+        """
+        Hold a slot for the duration of the block.
+
+        Args:
+            timeout: Longest wait for a slot in seconds
+
+        Raises:
+            AdmissionQueueFullError: If max_waiting requests are already waiting
+            AdmissionTimeoutError: If no slot became free within timeout
+        """
+        await self.acquire(timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, timeout: float) -> None:
+        if self.max_in_flight <= 0 or (self.in_flight < self.max_in_flight and not self._waiters):
+            self.in_flight += 1
+            self.admitted_total += 1
+            return
+
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected_total += 1
+            raise AdmissionQueueFullError(
+                f"Segmentation queue is full: {self.in_flight} in flight, {len(self._waiters)} waiting"
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, max(timeout, 0))
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts_total += 1
+                raise AdmissionTimeoutError(f"No segmentation slot became free within {timeout:.1f} s")
+            raise
+        finally:
+            self.wait_seconds += time.monotonic() - started
+
+        # The slot of the releasing request was handed over, in_flight is unchanged
+        self.admitted_total += 1
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def status(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_waiting": self.max_waiting,
+            "admitted_total": self.admitted_total,
+            "queued_total": self.queued_total,
+            "rejected_total": self.rejected_total,
+            "timeouts_total": self.timeouts_total,
+            "wait_avg_ms": self.wait_seconds / self.queued_total * 1000 if self.queued_total else 0.0,
+        }
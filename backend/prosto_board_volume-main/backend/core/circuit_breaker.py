@@ -0,0 +1,221 @@
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+from core.logging_config import setup_logger
+
+logger = setup_logger("circuit_breaker")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """
+    The circuit is open: the call is rejected without reaching the service.
+
+    Attributes:
+        retry_after: Seconds until the service is probed again
+    """
+
+    def __init__(self, retry_after: float):
+        super().__init__("Detection service circuit is open")
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the segmentation service.
+
+    closed: calls go through, and their outcomes over the last window_seconds
+    are tracked. Once at least min_calls outcomes are known and the share of
+    failures reaches failure_rate, or the share of calls slower than
+    slow_call_seconds reaches slow_call_rate, the circuit opens.
+
+    open: calls fail at once for open_seconds, so requests do not queue up
+    behind a saturated or unreachable service.
+
+    half_open: up to half_open_probes calls are let through. If all of them
+    succeed in time the circuit closes; a single failed or slow probe opens
+    it again for another open_seconds.
+
+    Args:
+        window_seconds: Length of the sliding window of outcomes
+        min_calls: Outcomes needed in the window before the rates are evaluated
+        failure_rate: Share of failed calls that opens the circuit
+        slow_call_seconds: Duration from which a call counts as slow
+        slow_call_rate: Share of slow calls that opens the circuit
+        open_seconds: Time the circuit stays open before probing
+        half_open_probes: Successful probes needed to close the circuit
+    """
+
+    def __init__(
+        self,
+        window_seconds: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        half_open_probes: int,
+    ):
+        self.window_seconds = window_seconds
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+
+        self.state = CLOSED
+        self._changed_at = time.monotonic()
+        # (finished at, failed, slow) of calls made while closed
+        self._outcomes: Deque[Tuple[float, bool, bool]] = deque()
+        self._failed_calls = 0
+        self._slow_calls = 0
+        # Incremented on every state change, so that late probe outcomes are ignored
+        self._generation = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.opened_total = 0
+        self.rejected_total = 0
+        self.last_open_reason = ""
+
+    def acquire(self) -> Optional[int]:
+        """
+        Ask for permission to call the service.
+
+        Returns:
+            Probe ticket if the call is a half-open probe, otherwise None;
+            pass it to record() or release()
+
+        Raises:
+            CircuitOpenError: If the circuit is open or all probes are already in flight
+        """
+        now = time.monotonic()
+        if self.state == OPEN:
+            remaining = self._changed_at + self.open_seconds - now
+            if remaining > 0:
+                self.rejected_total += 1
+                raise CircuitOpenError(remaining)
+            self._change_state(HALF_OPEN, now)
+            logger.info("Пробные запросы к сервису сегментации после %.0f с паузы", self.open_seconds)
+
+        if self.state == HALF_OPEN:
+            if self._probes_in_flight + self._probe_successes >= self.half_open_probes:
+                self.rejected_total += 1
+                raise CircuitOpenError(self.open_seconds)
+            self._probes_in_flight += 1
+            return self._generation
+        return None
+
+    def release(self, probe: Optional[int]) -> None:
+        """
+        Give back the permission of a call that ended without an outcome (cancelled).
+        """
+        if self._is_current_probe(probe):
+            self._probes_in_flight -= 1
+
+    def record(self, probe: Optional[int], failed: bool, duration: float) -> None:
+        """
+        Record the outcome of a permitted call.
+
+        Args:
+            probe: Ticket returned by acquire()
+            failed: The service did not answer or answered with a server error
+            duration: Call duration in seconds
+        """
+        now = time.monotonic()
+        slow = duration >= self.slow_call_seconds
+
+        if probe is not None:
+            if not self._is_current_probe(probe):
+                return
+            self._probes_in_flight -= 1
+            if failed or slow:
+                self._open(now, "failed probe" if failed else f"slow probe ({duration:.1f} s)")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.half_open_probes:
+                self._change_state(CLOSED, now)
+                logger.info("Сервис сегментации восстановился, выключатель закрыт")
+            return
+
+        # Outcomes of calls that started before the circuit opened are ignored
+        if self.state != CLOSED:
+            return
+
+        self._outcomes.append((now, failed, slow))
+        self._failed_calls += failed
+        self._slow_calls += slow
+        self._trim(now)
+        if len(self._outcomes) < self.min_calls:
+            return
+
+        failure_rate, slow_call_rate = self._rates()
+        if failure_rate >= self.failure_rate:
+            self._open(now, f"failure rate {failure_rate:.0%} over {len(self._outcomes)} calls")
+        elif slow_call_rate >= self.slow_call_rate:
+            self._open(now, f"slow call rate {slow_call_rate:.0%} over {len(self._outcomes)} calls")
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        self._trim(now)
+        failure_rate, slow_call_rate = self._rates()
+        return {
+            "state": self.state,
+            "state_seconds": now - self._changed_at,
+            "retry_after_seconds": (
+                max(self._changed_at + self.open_seconds - now, 0.0) if self.state == OPEN else 0.0
+            ),
+            "calls_in_window": len(self._outcomes),
+            "failure_rate": failure_rate,
+            "slow_call_rate": slow_call_rate,
+            "probes_in_flight": self._probes_in_flight,
+            "probe_successes": self._probe_successes,
+            "opened_total": self.opened_total,
+            "rejected_total": self.rejected_total,
+            "last_open_reason": self.last_open_reason,
+            "thresholds": {
+                "window_seconds": self.window_seconds,
+                "min_calls": self.min_calls,
+                "failure_rate": self.failure_rate,
+                "slow_call_seconds": self.slow_call_seconds,
+                "slow_call_rate": self.slow_call_rate,
+                "open_seconds": self.open_seconds,
+                "half_open_probes": self.half_open_probes,
+            },
+        }
+
+    def _open(self, now: float, reason: str) -> None:
+        self._change_state(OPEN, now)
+        self.opened_total += 1
+        self.last_open_reason = reason
+        logger.warning(
+            "Выключатель сервиса сегментации открыт на %.0f с: %s", self.open_seconds, reason
+        )
+
+    def _change_state(self, state: str, now: float) -> None:
+        self.state = state
+        self._changed_at = now
+        self._generation += 1
+        self._outcomes.clear()
+        self._failed_calls = 0
+        self._slow_calls = 0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _is_current_probe(self, probe: Optional[int]) -> bool:
+        return probe is not None and probe == self._generation and self.state == HALF_OPEN
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window_seconds:
+            _, failed, slow = self._outcomes.popleft()
+            self._failed_calls -= failed
+            self._slow_calls -= slow
+
+    def _rates(self) -> Tuple[float, float]:
+        if not self._outcomes:
+            return 0.0, 0.0
+        return self._failed_calls / len(self._outcomes), self._slow_calls / len(self._outcomes)
@@ -0,0 +1,246 @@
+import asyncio
+import random
+import time
+from typing import Callable, NamedTuple, Optional
+
+import aiohttp
+
+from core.logging_config import setup_logger
+from core.settings import settings
+
+logger = setup_logger("detect_client")
+
+# Statuses worth retrying: the detect service is overloaded or still loading
+# the model (503) or a proxy in front of it failed (502). 504 means the
+# request deadline has passed, so it is not retried.
+RETRY_STATUSES = (502, 503)
+
+
+class DetectResponse(NamedTuple):
+    """
+    Response of the segmentation service, read in full.
+
+    Attributes:
+        status: HTTP status code
+        content_type: Media type without parameters
+        body: Response body
+    """
+
+    status: int
+    content_type: str
+    body: bytes
+
+
+class DetectClient:
+    """
+    Long-lived HTTP client for the segmentation service.
+
+    One aiohttp session with a pooled keep-alive connector is shared by all
+    requests, so consecutive analyses reuse TCP connections instead of
+    opening a new one each time. The session is created in the application
+    lifespan (start) and closed on shutdown (close).
+
+    Transient failures (connection errors and RETRY_STATUSES) are retried
+    with exponential backoff and full jitter, as long as the retry still
+    fits before the request deadline.
+    """
+
+    def __init__(self):
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.requests_total = 0
+        self.retries_total = 0
+        self.errors_total = 0
+        self.connections_created = 0
+        self.connections_reused = 0
+        self.pool_waits = 0
+        self.pool_wait_seconds = 0.0
+
+    async def start(self) -> None:
+        if self._session is not None:
+            return
+
+        trace = aiohttp.TraceConfig()
+        trace.on_connection_create_end.append(self._on_connection_created)
+        trace.on_connection_reuseconn.append(self._on_connection_reused)
+        trace.on_connection_queued_start.append(self._on_pool_wait_start)
+        trace.on_connection_queued_end.append(self._on_pool_wait_end)
+
+        connector = aiohttp.TCPConnector(
+            limit=settings.SEGMENT_POOL_LIMIT,
+            limit_per_host=settings.SEGMENT_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=settings.SEGMENT_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300,
+        )
+        self._session = aiohttp.ClientSession(connector=connector, trace_configs=[trace])
+        logger.info(
+            "Пул соединений к сервису сегментации создан: limit=%d, limit_per_host=%d",
+            settings.SEGMENT_POOL_LIMIT, settings.SEGMENT_POOL_LIMIT_PER_HOST,
+        )
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def post_image(
+        self,
+        url: str,
+        image_bytes: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        params: dict,
+        headers: dict,
+        deadline: float,
+    ) -> DetectResponse:
+        """
+        Send an image to the segmentation service, retrying transient failures.
+
+        Args:
+            url: Segmentation endpoint
+            image_bytes: Image to upload as the "file" form field
+            filename: Upload file name
+            content_type: Upload media type
+            params: Query parameters
+            headers: Request headers
+            deadline: Absolute deadline (Unix time in seconds) for all attempts together
+
+        Returns:
+            The last response received, including non-retryable error statuses
+
+        Raises:
+            aiohttp.ClientError: If the service stayed unreachable after all retries
+            asyncio.TimeoutError: If the deadline passed before a response arrived
+        """
+
+        def form_data() -> aiohttp.FormData:
+            data = aiohttp.FormData()
+            data.add_field("file", image_bytes, filename=filename, content_type=content_type)
+            return data
+
+        return await self._post(url, form_data, params, headers, deadline)
+
+    async def post_handle(
+        self,
+        url: str,
+        handle: str,
+        params: dict,
+        headers: dict,
+        deadline: float,
+    ) -> DetectResponse:
+        """
+        Ask the segmentation service for an image already written to shared
+        memory, retrying transient failures the same way as post_image.
+
+        Args:
+            url: Shared memory segmentation endpoint
+            handle: File name of the image in the shared memory directory
+            params: Query parameters
+            headers: Request headers
+            deadline: Absolute deadline (Unix time in seconds) for all attempts together
+
+        Returns:
+            The last response received, including non-retryable error statuses
+
+        Raises:
+            aiohttp.ClientError: If the service stayed unreachable after all retries
+            asyncio.TimeoutError: If the deadline passed before a response arrived
+        """
+        return await self._post(url, lambda: None, {**params, "handle": handle}, headers, deadline)
+
+    async def _post(
+        self,
+        url: str,
+        data: Callable[[], Optional[aiohttp.FormData]],
+        params: dict,
+        headers: dict,
+        deadline: float,
+    ) -> DetectResponse:
+        if self._session is None:
+            await self.start()
+
+        attempt = 0
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+
+            timeout = aiohttp.ClientTimeout(
+                total=remaining,
+                connect=min(settings.SEGMENT_CONNECT_TIMEOUT_SECONDS, remaining),
+            )
+
+            self.requests_total += 1
+            result: Optional[DetectResponse] = None
+            retry_after = None
+            try:
+                # Form data can only be sent once, so it is rebuilt for every attempt
+                async with self._session.post(
+                    url, data=data(), params=params, headers=headers, timeout=timeout
+                ) as response:
+                    result = DetectResponse(response.status, response.content_type, await response.read())
+                    if response.status not in RETRY_STATUSES or attempt >= settings.SEGMENT_RETRIES:
+                        return result
+                    retry_after = response.headers.get("Retry-After")
+                    logger.warning("Сервис сегментации ответил HTTP %d, попытка %d", response.status, attempt + 1)
+            except asyncio.TimeoutError:
+                self.errors_total += 1
+                raise
+            except aiohttp.ClientConnectionError as e:
+                self.errors_total += 1
+                if attempt >= settings.SEGMENT_RETRIES:
+                    raise
+                logger.warning("Ошибка соединения с сервисом сегментации (%r), попытка %d", e, attempt + 1)
+
+            delay = self._backoff(attempt, retry_after)
+            if time.time() + delay >= deadline:
+                # A retry would not finish before the deadline
+                if result is not None:
+                    return result
+                raise aiohttp.ClientConnectionError("Detection service unavailable, no time left to retry")
+
+            attempt += 1
+            self.retries_total += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt: int, retry_after: Optional[str]) -> float:
+        """
+        Delay before the next attempt: Retry-After from the service if given,
+        otherwise exponential backoff with full jitter.
+        """
+        if retry_after is not None:
+            try:
+                return max(0.0, float(retry_after)) * random.uniform(1.0, 1.2)
+            except ValueError:
+                pass
+        return random.uniform(0, settings.SEGMENT_RETRY_BACKOFF_SECONDS * 2**attempt)
+
+    def metrics(self) -> dict:
+        return {
+            "requests_total": self.requests_total,
+            "retries_total": self.retries_total,
+            "errors_total": self.errors_total,
+            "connections_created": self.connections_created,
+            "connections_reused": self.connections_reused,
+            "pool_waits": self.pool_waits,
+            "pool_wait_avg_ms": self.pool_wait_seconds / self.pool_waits * 1000 if self.pool_waits else 0.0,
+            "pool_limit": settings.SEGMENT_POOL_LIMIT,
+            "pool_limit_per_host": settings.SEGMENT_POOL_LIMIT_PER_HOST,
+        }
+
+    async def _on_connection_created(self, session, context, params) -> None:
+        self.connections_created += 1
+
+    async def _on_connection_reused(self, session, context, params) -> None:
+        self.connections_reused += 1
+
+    async def _on_pool_wait_start(self, session, context, params) -> None:
+        context.pool_wait_started = time.monotonic()
+
+    async def _on_pool_wait_end(self, session, context, params) -> None:
+        self.pool_waits += 1
+        self.pool_wait_seconds += time.monotonic() - context.pool_wait_started
+
+
+# Shared by all requests; started and closed in the application lifespan
+detect_client = DetectClient()
@@ -0,0 +1,130 @@
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from core.settings import settings
+
+
+class StoredDetections(NamedTuple):
+    """
+    Boards of one analysed image, kept for re-measuring with other dimensions.
+
+    Attributes:
+        quads: float32 (N, 4, 2) corners ordered by order_quads, in original image coordinates
+        confidences: (N,) model confidences
+        class_names: Class name of every board
+    """
+
+    quads: np.ndarray
+    confidences: np.ndarray
+    class_names: List[str]
+
+    def nbytes(self) -> int:
+        return self.quads.nbytes + self.confidences.nbytes + sum(len(name) for name in self.class_names)
+
+
+class DetectionStore:
+    """
+    Board quads of recent analyses, addressed by a random handle.
+
+    Volumes depend on the quads and the board height and length only, so a
+    new height or length for an already analysed image is answered from the
+    stored quads without another segmentation. Entries live in an LRU that
+    is bounded by total size; an entry also expires ttl_seconds after it was
+    last used.
+
+    Args:
+        max_bytes: Maximum total size of stored quads
+        ttl_seconds: Lifetime of an entry since its last use
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # handle -> (expiry on the monotonic clock, detections, size)
+        self._entries: OrderedDict[str, tuple] = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def put(self, detections: StoredDetections) -> Optional[str]:
+        """
+        Store the boards of an analysis.
+
+        Returns:
+            Handle for get(), or None if the entry alone exceeds max_bytes
+        """
+        size = detections.nbytes()
+        if size > self.max_bytes:
+            return None
+
+        now = time.monotonic()
+        self._drop_expired(now)
+        handle = uuid.uuid4().hex
+        self._entries[handle] = (now + self.ttl_seconds, detections, size)
+        self.bytes += size
+
+        # Evict least recently used entries until the store fits its limit
+        while self.bytes > self.max_bytes:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+        return handle
+
+    def get(self, handle: str) -> Optional[StoredDetections]:
+        """
+        Stored boards for a handle, or None if it is unknown or has expired.
+        A hit extends the lifetime of the entry by ttl_seconds.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(handle)
+        if entry is not None and entry[0] <= now:
+            self._remove(handle)
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+
+        _, detections, size = entry
+        self._entries[handle] = (now + self.ttl_seconds, detections, size)
+        self._entries.move_to_end(handle)
+        self.hits += 1
+        return detections
+
+    def stats(self) -> dict:
+        return {
+            "items": len(self._entries),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+        }
+
+    def _drop_expired(self, now: float) -> None:
+        # Entries are in order of last use, so expired ones are at the front
+        while self._entries:
+            handle, (expires, _, _) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            self._remove(handle)
+            self.expired += 1
+
+    def _remove(self, handle: str) -> None:
+        _, _, size = self._entries.pop(handle)
+        self.bytes -= size
+
+
+# Shared by all requests of this process
+detection_store = DetectionStore(
+    max_bytes=settings.DETECTION_STORE_MAX_MB * 1024 * 1024,
+    ttl_seconds=settings.DETECTION_STORE_TTL_SECONDS,
+)
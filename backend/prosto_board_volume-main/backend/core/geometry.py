@@ -0,0 +1,273 @@
+from typing import NamedTuple, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+# Class names counted as boards
+BOARD_CLASS_NAMES = ("wood", "wooden", "board", "timber", "lumber")
+
+
+# Ways to reduce a contour to 4 corners (QUAD_FIT_METHOD):
+# search - sweep of 20 approxPolyDP epsilon values over the contour and its hull,
+# bisection - doubling and binary search of epsilon over the same range,
+# hull - maximum-area quadrilateral with vertices on the convex hull
+QUAD_FIT_METHODS = ("search", "bisection", "hull")
+
+# approxPolyDP epsilon range as a fraction of the perimeter
+_EPS_LOW = 0.01
+_EPS_HIGH = 0.2
+# Binary search precision: half of the sweep step (0.01)
+_BISECTION_TOLERANCE = 0.005
+# Hull vertex limit: the search over vertex pairs is O(n^3)
+_MAX_HULL_POINTS = 48
+
+
+def _approx_quad_search(curve: np.ndarray) -> Optional[np.ndarray]:
+    """
+    First of 20 evenly spaced epsilon values that leaves exactly 4 vertices.
+    """
+    perimeter = cv2.arcLength(curve, True)
+
+    # Try a range of epsilon values to get exactly 4 points
+    for eps_factor in np.linspace(_EPS_LOW, _EPS_HIGH, 20):
+        approx = cv2.approxPolyDP(curve, eps_factor * perimeter, True)
+        if len(approx) == 4:
+            return approx.reshape(-1, 2)
+    return None
+
+
+def _approx_quad_bisection(curve: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Smallest epsilon that leaves at most 4 vertices.
+
+    The approxPolyDP vertex count almost never grows with epsilon, so epsilon
+    is doubled from _EPS_LOW while more than 4 vertices remain and the boundary
+    is then narrowed by binary search. Typical contours need the same 1-3
+    calls as the sweep, while a contour with no exact 4-vertex approximation
+    is rejected after 6 calls instead of 20.
+
+    Args:
+        curve: Contour of shape (n, 1, 2)
+
+    Returns:
+        (4, 2) corners, or None if no epsilon in range gives exactly 4 vertices
+    """
+    perimeter = cv2.arcLength(curve, True)
+    eps_low = None
+    eps_high = _EPS_LOW
+    approx = cv2.approxPolyDP(curve, eps_high * perimeter, True)
+    while len(approx) > 4:
+        if eps_high >= _EPS_HIGH:
+            return None
+        eps_low, eps_high = eps_high, min(2 * eps_high, _EPS_HIGH)
+        approx = cv2.approxPolyDP(curve, eps_high * perimeter, True)
+
+    if eps_low is not None:
+        while eps_high - eps_low > _BISECTION_TOLERANCE:
+            eps_mid = (eps_low + eps_high) / 2
+            candidate = cv2.approxPolyDP(curve, eps_mid * perimeter, True)
+            if len(candidate) > 4:
+                eps_low = eps_mid
+            else:
+                eps_high, approx = eps_mid, candidate
+    return approx.reshape(-1, 2) if len(approx) == 4 else None
+
+
+def _max_area_quad(curve: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Maximum-area quadrilateral with vertices among the convex hull vertices.
+
+    The contour is simplified with the lowest epsilon first, which keeps the
+    corners and makes the hull much cheaper than over every mask point. For
+    each diagonal (i, j) the other two corners are the hull vertices farthest
+    from it on either side, so the area is the max minus the min of the cross
+    product; all diagonals are evaluated in one NumPy operation.
+
+    Args:
+        curve: Contour of shape (n, 1, 2)
+
+    Returns:
+        (4, 2) corners in hull order, or None for degenerate contours
+    """
+    perimeter = cv2.arcLength(curve, True)
+    hull = cv2.convexHull(cv2.approxPolyDP(curve, _EPS_LOW * perimeter, True))
+    eps_factor = 2 * _EPS_LOW
+    while len(hull) > _MAX_HULL_POINTS:
+        hull = cv2.approxPolyDP(hull, eps_factor * perimeter, True)
+        eps_factor *= 2
+
+    points = hull.reshape(-1, 2).astype(np.float64)
+    if len(points) < 4:
+        return None
+    if len(points) == 4:
+        return points.astype(np.float32)
+
+    # rel[i, k] = P[k] - P[i]; cross[i, j, k] = (P[j] - P[i]) x (P[k] - P[i])
+    rel = points[None, :, :] - points[:, None, :]
+    cross = rel[:, :, None, 0] * rel[:, None, :, 1] - rel[:, :, None, 1] * rel[:, None, :, 0]
+    areas = cross.max(axis=2) - cross.min(axis=2)
+    i, j = np.unravel_index(np.argmax(areas), areas.shape)
+    corners = sorted({int(i), int(j), int(np.argmax(cross[i, j])), int(np.argmin(cross[i, j]))})
+    if len(corners) < 4:
+        return None
+    return points[corners].astype(np.float32)
+
+
+def optimize_quad_points(points_array: np.ndarray, method: str = "search") -> np.ndarray:
+    """
+    Transforms an arbitrary set of points into the optimal 4 corner points.
+
+    With the search method, approxPolyDP is swept over the contour and then
+    over its convex hull; bisection replaces the sweep with a binary search
+    of epsilon and hull takes the maximum-area quadrilateral on the convex
+    hull. The minimum area bounding rectangle is the final fallback.
+
+    Args:
+        points_array: Numpy array of shape (n, 2) containing n points
+        method: One of QUAD_FIT_METHODS
+
+    Returns:
+        Numpy array of shape (4, 2) containing the optimal 4 corner points
+
+    Raises:
+        ValueError: If the method is unknown or the polygon has no points
+    """
+    # If we already have exactly 4 points, return them
+    if len(points_array) == 4:
+        return points_array
+    if len(points_array) == 0:
+        raise ValueError("Cannot fit a quad to an empty polygon")
+
+    # Reshape for OpenCV functions if needed
+    points_reshaped = points_array.reshape(-1, 1, 2).astype(np.float32)
+
+    if method == "hull":
+        quad = _max_area_quad(points_reshaped)
+    elif method == "bisection":
+        quad = _approx_quad_bisection(points_reshaped)
+        if quad is None:
+            quad = _approx_quad_bisection(cv2.convexHull(points_reshaped))
+    elif method == "search":
+        quad = _approx_quad_search(points_reshaped)
+        if quad is None:
+            quad = _approx_quad_search(cv2.convexHull(points_reshaped))
+    else:
+        raise ValueError(f"Unknown quad fit method: {method}")
+
+    if quad is not None:
+        return quad
+
+    # Minimum area bounding rectangle always returns 4 points, so it's our final fallback
+    return cv2.boxPoints(cv2.minAreaRect(points_reshaped))
+
+
+def fit_quads(polygons: Sequence[np.ndarray], method: str = "search") -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce every polygon to 4 corner points.
+
+    Polygons that already have 4 points (geometry=quad from the detect
+    service) are taken as is; others go through optimize_quad_points.
+
+    Args:
+        polygons: Polygons of shape (n_i, 2)
+        method: One of QUAD_FIT_METHODS
+
+    Returns:
+        float32 (N, 4, 2) corners and a bool (N,) mask of polygons that could be fitted
+    """
+    quads = np.zeros((len(polygons), 4, 2), dtype=np.float32)
+    fitted = np.ones(len(polygons), dtype=bool)
+    for i, polygon in enumerate(polygons):
+        try:
+            quads[i] = optimize_quad_points(np.asarray(polygon, dtype=np.float32), method)
+        except (cv2.error, ValueError):
+            fitted[i] = False
+    return quads, fitted
+
+
+def order_quads(quads: np.ndarray) -> np.ndarray:
+    """
+    Order the corners of every quad the same way as order_points_consistently:
+    by angle around the centroid, starting from the corner with the smallest x + y.
+
+    Args:
+        quads: float32 (N, 4, 2) corners
+
+    Returns:
+        (N, 4, 2) ordered corners
+    """
+    centroids = np.mean(quads, axis=1, keepdims=True)
+    angles = np.arctan2(quads[:, :, 1] - centroids[:, :, 1], quads[:, :, 0] - centroids[:, :, 0])
+    ordered = np.take_along_axis(quads, np.argsort(angles, axis=1)[:, :, None], axis=1)
+
+    # Rotate each quad to start from the "top-left" corner
+    start = np.argmin(np.sum(ordered, axis=2), axis=1)
+    rotation = (np.arange(4)[None, :] + start[:, None]) % 4
+    return np.take_along_axis(ordered, rotation[:, :, None], axis=1)
+
+
+class BoardDimensions(NamedTuple):
+    """
+    Real-world dimensions of boards computed from their ordered quads.
+
+    Attributes:
+        widths: (N,) board widths in meters (the longer pair of sides)
+        heights: (N,) board heights in meters
+        ratios: (N,) meters per pixel of each board
+        volumes: (N,) unrounded volumes in cubic meters
+        valid: (N,) bool mask of boards with positive sides and a finite positive scale
+    """
+
+    widths: np.ndarray
+    heights: np.ndarray
+    ratios: np.ndarray
+    volumes: np.ndarray
+    valid: np.ndarray
+
+
+def board_dimensions(quads: np.ndarray, input_height: float, input_length: float) -> BoardDimensions:
+    """
+    Compute dimensions and volumes of all boards in one pass.
+
+    Opposite sides of each quad are averaged into pixel width and height,
+    which are swapped so that width >= height. The known board height maps
+    the pixel height to meters, and volume is width * height * length.
+
+    Args:
+        quads: (N, 4, 2) corners ordered by order_quads
+        input_height: Real board height in meters
+        input_length: Real board length in meters
+
+    Returns:
+        Dimensions of all boards; entries where valid is False must be skipped
+    """
+    points = quads.astype(np.float64)
+    deltas = np.roll(points, -1, axis=1) - points
+    sides = np.sqrt(deltas[:, :, 0] ** 2 + deltas[:, :, 1] ** 2)
+
+    # Average opposite sides
+    width_px = (sides[:, 0] + sides[:, 2]) / 2
+    height_px = (sides[:, 1] + sides[:, 3]) / 2
+
+    # The longer side is the width (consistent orientation)
+    width_px, height_px = np.maximum(width_px, height_px), np.minimum(width_px, height_px)
+
+    # Degenerate quads give inf/nan here; they are excluded through valid
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratios = input_height / height_px
+        widths = width_px * ratios
+        heights = height_px * ratios
+        volumes = widths * heights * input_length
+        valid = (
+            np.all(sides > 0, axis=1)
+            & (height_px > 0)
+            & np.isfinite(ratios)
+            & (ratios > 0)
+            & (volumes > 0)
+            & (widths > 0)
+            & (heights > 0)
+        )
+    if input_height <= 0:
+        valid[:] = False
+
+    return BoardDimensions(widths=widths, heights=heights, ratios=ratios, volumes=volumes, valid=valid)
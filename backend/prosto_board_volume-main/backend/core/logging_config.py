@@ -1,8 +1,13 @@
+import atexit
 import logging
+import queue
 import sys
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
 
+from core.settings import settings
+
 # Создаем директорию для логов если её нет
 log_directory = "logs"
 if not os.path.exists(log_directory):
@@ -12,10 +17,62 @@ if not os.path.exists(log_directory):
 log_format = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 
+class _DroppingQueueHandler(QueueHandler):
+    """
+    Puts records on the queue without blocking the request.
+
+    The record is enqueued as is: the message is formatted by the listener
+    thread, not by the caller. When the queue is full the record is dropped
+    and counted instead of waiting for the writer.
+    """
+
+    dropped = 0
+    _dropped_lock = threading.Lock()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with _DroppingQueueHandler._dropped_lock:
+                _DroppingQueueHandler.dropped += 1
+
+
+class _FileRouter(logging.Handler):
+    """
+    Writes each record to the file of the logger that created it (<name>.log).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.file_handlers = {}
+
+    def emit(self, record: logging.LogRecord) -> None:
+        file_handler = self.file_handlers.get(record.name)
+        if file_handler is not None:
+            file_handler.handle(record)
+
+
+# Обработчик для вывода в консоль
+console_handler = logging.StreamHandler(sys.stdout)
+console_handler.setFormatter(log_format)
+
+# One queue and one background writer thread for all loggers of the process:
+# request threads only enqueue, file and console I/O happen on the listener thread
+_file_router = _FileRouter()
+_log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+_queue_handler = _DroppingQueueHandler(_log_queue)
+_listener = QueueListener(_log_queue, _file_router, console_handler)
+_listener.start()
+
+
 def setup_logger(name):
     logger = logging.getLogger(name)
-    # Set to DEBUG level for detailed debugging
-    logger.setLevel(logging.DEBUG)
+    logger.setLevel(settings.LOG_LEVEL)
+    if name in _file_router.file_handlers:
+        return logger
 
     # Обработчик для записи в файл
     file_handler = RotatingFileHandler(
@@ -24,11 +81,37 @@ def setup_logger(name):
         backupCount=5,
     )
     file_handler.setFormatter(log_format)
-    logger.addHandler(file_handler)
+    _file_router.file_handlers[name] = file_handler
 
-    # Обработчик для вывода в консоль
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(log_format)
-    logger.addHandler(console_handler)
+    logger.addHandler(_queue_handler)
 
     return logger
+
+
+def detection_sampled(index: int) -> bool:
+    """
+    Whether per-detection debug lines are logged for the detection with this index.
+
+    Args:
+        index: Detection index within the request
+
+    Returns:
+        True for every LOG_DETECTION_SAMPLE_EVERY-th detection, never if it is 0
+    """
+    every = settings.LOG_DETECTION_SAMPLE_EVERY
+    return every > 0 and index % every == 0
+
+
+def logging_metrics() -> dict:
+    return {
+        "level": settings.LOG_LEVEL,
+        "dropped_records": _DroppingQueueHandler.dropped,
+    }
+
+
+@atexit.register
+def stop_logging() -> None:
+    """
+    Write out the queued records and stop the listener thread.
+    """
+    _listener.stop()
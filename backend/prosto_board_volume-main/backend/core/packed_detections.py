@@ -0,0 +1,209 @@
+import json
+import struct
+from itertools import chain
+from typing import List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+try:
+    # orjson parses the JSON response several times faster; json is the fallback
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Media type of the binary /detect_seg/ response (see detect/services/packed_detections.py)
+PACKED_MEDIA_TYPE = "application/vnd.prosto-board.detections"
+
+_HEADER = struct.Struct("<4sHHII")
+_MAGIC = b"PBDS"
+_VERSION = 1
+
+
+class PackedDetections(NamedTuple):
+    """
+    Segmentation results as dense arrays decoded from the binary detect response.
+
+    Polygon i is points[offsets[i]:offsets[i + 1]]. Arrays decoded by from_bytes
+    are read-only views over the response bytes.
+
+    Attributes:
+        confidences: float32 (n,) model confidences
+        class_ids: uint32 (n,) indices into class_names
+        offsets: uint32 (n + 1,) polygon boundaries in points
+        points: float32 (v, 2) vertices of all polygons back to back
+        class_names: Class name table
+    """
+
+    confidences: np.ndarray
+    class_ids: np.ndarray
+    offsets: np.ndarray
+    points: np.ndarray
+    class_names: Tuple[str, ...]
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PackedDetections":
+        """
+        Decode the binary detect response without copying the arrays.
+
+        Args:
+            data: Response body
+
+        Returns:
+            Decoded detections
+
+        Raises:
+            ValueError: If the data is not a supported packed detections payload
+        """
+        magic, version, _, count, vertices = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Unsupported detections format: {magic!r} v{version}")
+
+        offset = _HEADER.size
+        confidences = np.frombuffer(data, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+        class_ids = np.frombuffer(data, dtype="<u4", count=count, offset=offset)
+        offset += 4 * count
+        offsets = np.frombuffer(data, dtype="<u4", count=count + 1, offset=offset)
+        offset += 4 * (count + 1)
+        points = np.frombuffer(data, dtype="<f4", count=2 * vertices, offset=offset).reshape(-1, 2)
+        offset += 8 * vertices
+        (names_length,) = struct.unpack_from("<I", data, offset)
+        names = bytes(data[offset + 4 : offset + 4 + names_length]).decode("utf-8")
+
+        return cls(
+            confidences=confidences,
+            class_ids=class_ids,
+            offsets=offsets,
+            points=points,
+            class_names=tuple(names.split("\n")) if names else (),
+        ).validate()
+
+    @classmethod
+    def from_polygons(
+        cls, confidences: Sequence[float], class_names: Sequence[str], polygons: Sequence[np.ndarray]
+    ) -> "PackedDetections":
+        """
+        Build detections from per-detection confidences, class names and polygons.
+
+        Args:
+            confidences: Model confidences
+            class_names: Class name of each detection
+            polygons: Polygons of shape (n_i, 2)
+
+        Returns:
+            Packed detections with the polygons concatenated into one float32 array
+        """
+        table = tuple(dict.fromkeys(class_names))
+        index = {name: i for i, name in enumerate(table)}
+
+        offsets = np.zeros(len(polygons) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(polygon) for polygon in polygons])
+        points = (
+            np.concatenate([np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in polygons])
+            if polygons
+            else np.empty((0, 2), dtype=np.float32)
+        )
+
+        return cls(
+            confidences=np.asarray(confidences, dtype=np.float32).reshape(-1),
+            class_ids=np.fromiter((index[name] for name in class_names), dtype=np.uint32, count=len(class_names)),
+            offsets=offsets,
+            points=points,
+            class_names=table,
+        )
+
+    @classmethod
+    def from_json(cls, data: bytes) -> "PackedDetections":
+        """
+        Decode the JSON detect response straight into the same arrays.
+
+        No model object is created per detection or per point: fields are
+        read from the parsed lists, coordinates of all polygons are collected
+        into one float32 array and validated as a whole.
+
+        Args:
+            data: Response body, a list of {"confidence", "class_name", "points": [{"x", "y"}]}
+
+        Returns:
+            Decoded detections
+
+        Raises:
+            json.JSONDecodeError: If the body is not valid JSON
+            ValueError: If the JSON does not have the expected structure or
+                contains non-finite coordinates
+        """
+        items = _json_loads(data)
+        if not isinstance(items, list):
+            raise ValueError(f"Expected a list of detections, got {type(items).__name__}")
+
+        try:
+            confidences = np.array([item["confidence"] for item in items], dtype=np.float32)
+            names = [item["class_name"] for item in items]
+            polygons = [item["points"] for item in items]
+            lengths = np.array([len(points) for points in polygons], dtype=np.uint32)
+            vertices = int(lengths.sum())
+            points = np.fromiter(
+                chain.from_iterable((point["x"], point["y"]) for points in polygons for point in points),
+                dtype=np.float32,
+                count=2 * vertices,
+            ).reshape(-1, 2)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Malformed detection in response: {e!r}") from e
+
+        if not all(isinstance(name, str) for name in names):
+            raise ValueError("class_name must be a string")
+
+        class_names = tuple(dict.fromkeys(names))
+        class_index = {name: i for i, name in enumerate(class_names)}
+        offsets = np.zeros(len(items) + 1, dtype=np.uint32)
+        np.cumsum(lengths, out=offsets[1:])
+
+        return cls(
+            confidences=confidences,
+            class_ids=np.array([class_index[name] for name in names], dtype=np.uint32),
+            offsets=offsets,
+            points=points,
+            class_names=class_names,
+        ).validate()
+
+    def validate(self) -> "PackedDetections":
+        """
+        Check the arrays as a whole instead of validating every point.
+
+        Returns:
+            self, so that constructors can return the validated value
+
+        Raises:
+            ValueError: If the arrays are inconsistent or contain non-finite values
+        """
+        count = len(self.confidences)
+        if len(self.class_ids) != count or len(self.offsets) != count + 1:
+            raise ValueError("Detection arrays have inconsistent lengths")
+        if self.offsets[0] != 0 or self.offsets[-1] != len(self.points) or np.any(np.diff(self.offsets.astype(np.int64)) < 0):
+            raise ValueError("Polygon offsets do not match the points")
+        if count and int(self.class_ids.max()) >= len(self.class_names):
+            raise ValueError("Class id outside of the class name table")
+        if not np.all(np.isfinite(self.confidences)) or not np.all(np.isfinite(self.points)):
+            raise ValueError("Detections contain non-finite values")
+        return self
+
+    def polygons(self) -> List[np.ndarray]:
+        """
+        Polygons as views into points.
+        """
+        return np.split(self.points, self.offsets[1:-1])
+
+    def polygon(self, i: int) -> np.ndarray:
+        return self.points[self.offsets[i] : self.offsets[i + 1]]
+
+    def class_name(self, i: int) -> str:
+        return self.class_names[self.class_ids[i]]
+
+    def class_mask(self, names: Tuple[str, ...]) -> np.ndarray:
+        """
+        Bool (n,) mask of detections whose class name, lowercased, is in names.
+        """
+        table = np.array([name.lower() in names for name in self.class_names], dtype=bool)
+        return table[self.class_ids] if len(table) else np.zeros(len(self.class_ids), dtype=bool)
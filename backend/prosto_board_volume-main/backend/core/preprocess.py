@@ -0,0 +1,66 @@
+import io
+from typing import NamedTuple
+
+from PIL import Image, ImageOps
+
+# EXIF orientations that rotate the image by 90 or 270 degrees
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class PreparedImage(NamedTuple):
+    """
+    An image prepared for the model.
+
+    Attributes:
+        image: Image passed to the model (possibly shrunk)
+        width: Width of the original image with the EXIF orientation applied
+        height: Height of the original image with the EXIF orientation applied
+    """
+
+    image: Image.Image
+    width: int
+    height: int
+
+    @property
+    def scale(self) -> tuple:
+        """
+        Factors from image coordinates back to original image coordinates.
+        """
+        return self.width / self.image.width, self.height / self.image.height
+
+
+def decode_image(image_bytes: bytes, max_side: int) -> PreparedImage:
+    """
+    Decode an upload for the in-process model.
+
+    Vendored from the detect service (detect/services/preprocess.py) so that
+    INFERENCE_MODE=local decodes exactly like the detect service does with
+    FAST_DECODE; keep the two in sync. JPEGs are decoded in draft mode close
+    to max_side, the EXIF orientation is applied and the image is shrunk to
+    max_side on its longer side.
+
+    Args:
+        image_bytes: Uploaded image
+        max_side: Model input size
+
+    Returns:
+        The decoded image and the size of the upright original
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+
+    width, height = image.size
+    if image.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    if max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+
+    image = ImageOps.exif_transpose(image)
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    else:
+        image.load()
+
+    return PreparedImage(image, width, height)
@@ -0,0 +1,537 @@
+import abc
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import aiohttp
+from PIL import Image
+
+from core.admission import AdmissionLimiter, AdmissionQueueFullError, AdmissionTimeoutError
+from core.circuit_breaker import CircuitBreaker, CircuitOpenError
+from core.detect_client import DetectResponse, detect_client
+from core.logging_config import setup_logger
+from core.packed_detections import PACKED_MEDIA_TYPE, PackedDetections
+from core.preprocess import decode_image
+from core.settings import settings
+from core.shared_memory import SharedImageStore
+
+logger = setup_logger("segmentation")
+
+T = TypeVar("T")
+
+
+class SegmentationError(Exception):
+    """
+    Segmentation failed; the endpoint answers with status_code, detail and headers.
+    """
+
+    def __init__(self, status_code: int, detail: str, headers: Optional[dict] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.headers = headers
+
+
+class Segmenter(abc.ABC):
+    """
+    Shared inference interface of the volume endpoint.
+
+    An implementation turns an uploaded image into the full-resolution
+    polygons of all detections. HttpSegmenter asks the segmentation service,
+    LocalSegmenter runs the model in this process; the endpoint computes the
+    same volumes from either result.
+    """
+
+    async def start(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def segment(
+        self,
+        image_bytes: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        deadline: float,
+        own_deadline: bool = True,
+    ) -> PackedDetections:
+        """
+        Segment one image.
+
+        Args:
+            image_bytes: Uploaded image
+            filename: Upload file name
+            content_type: Upload media type
+            deadline: Absolute deadline (Unix time in seconds)
+            own_deadline: The deadline is SEGMENT_TIMEOUT_SECONDS after the request
+                arrived, not an earlier deadline set by the caller
+
+        Returns:
+            Detections in original image coordinates
+
+        Raises:
+            SegmentationError: If the image could not be segmented before the deadline
+        """
+
+    def metrics(self) -> dict:
+        return {}
+
+    def status(self) -> dict:
+        """
+        State of the protection in front of the segmentation backend, for /status.
+        """
+        return {}
+
+
+def retry_after_headers(seconds: float) -> dict:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+def segment_request_headers(deadline: float) -> dict:
+    """
+    Build headers for the segmentation service request.
+
+    Args:
+        deadline: Absolute deadline passed on as X-Request-Deadline, so the detect
+            service can drop the request once nobody waits for it
+
+    Returns:
+        Accept header asking for the binary format when SEGMENT_RESPONSE_FORMAT is "binary".
+        The JSON fallback is still parsed if the detect service does not support it.
+    """
+    headers = {"X-Request-Deadline": f"{deadline:.3f}"}
+    if settings.SEGMENT_RESPONSE_FORMAT == "binary":
+        headers["Accept"] = f"{PACKED_MEDIA_TYPE}, application/json;q=0.5"
+    else:
+        headers["Accept"] = "application/json"
+    return headers
+
+
+def detect_failed(status: int, own_deadline: bool) -> bool:
+    """
+    Whether a detect service response counts as a failure for the circuit breaker.
+
+    503 is the detect service shedding load from its full queue and is not
+    counted. 504 means the forwarded deadline passed; it is counted only if
+    that was our own SEGMENT_TIMEOUT_SECONDS. Other 5xx responses are failures,
+    client errors such as an unreadable image say nothing about the service health.
+    """
+    if status == 503:
+        return False
+    if status == 504:
+        return own_deadline
+    return status >= 500
+
+
+class SegmentationGuard:
+    """
+    Admission queue and circuit breaker in front of a segmentation backend.
+
+    At most max_in_flight calls run at a time, the rest wait in a fair queue
+    for at most SEGMENT_MAX_QUEUE_WAIT_SECONDS and never past the request
+    deadline. A circuit breaker rejects calls at once with 503 while the
+    backend fails or answers too slowly, and lets a few probes through to
+    detect its recovery.
+
+    Failures are connection errors, errors of the backend and timeouts
+    under our own SEGMENT_TIMEOUT_SECONDS. A request that runs out of an
+    earlier deadline set by its caller is not recorded.
+
+    Args:
+        max_in_flight: Calls running at the same time; 0 disables the limit
+    """
+
+    def __init__(self, max_in_flight: int):
+        self._admission = AdmissionLimiter(
+            max_in_flight=max_in_flight,
+            max_waiting=settings.SEGMENT_MAX_WAITING,
+        )
+        self._breaker: Optional[CircuitBreaker] = None
+        if settings.SEGMENT_BREAKER_ENABLED:
+            self._breaker = CircuitBreaker(
+                window_seconds=settings.SEGMENT_BREAKER_WINDOW_SECONDS,
+                min_calls=settings.SEGMENT_BREAKER_MIN_CALLS,
+                failure_rate=settings.SEGMENT_BREAKER_FAILURE_RATE,
+                slow_call_seconds=settings.SEGMENT_BREAKER_SLOW_CALL_SECONDS,
+                slow_call_rate=settings.SEGMENT_BREAKER_SLOW_CALL_RATE,
+                open_seconds=settings.SEGMENT_BREAKER_OPEN_SECONDS,
+                half_open_probes=settings.SEGMENT_BREAKER_HALF_OPEN_PROBES,
+            )
+
+    async def run(
+        self,
+        call: Callable[[], Awaitable[T]],
+        deadline: float,
+        failed: Callable[[T], bool] = lambda result: False,
+        own_deadline: bool = True,
+    ) -> T:
+        """
+        Run call once a slot is free and record its outcome in the breaker.
+
+        Args:
+            call: Starts the segmentation call
+            deadline: Absolute deadline (Unix time in seconds)
+            failed: Whether a returned result counts as a backend failure
+            own_deadline: The deadline is our own SEGMENT_TIMEOUT_SECONDS, so a
+                504 from call counts as a failure
+
+        Returns:
+            The result of call
+
+        Raises:
+            SegmentationError: 503 if the breaker is open or the queue is full,
+                504 if the deadline passed while waiting, or the error of call
+        """
+        probe = None
+        if self._breaker is not None:
+            try:
+                probe = self._breaker.acquire()
+            except CircuitOpenError as e:
+                logger.warning("Запрос отклонен: выключатель сервиса сегментации открыт")
+                raise SegmentationError(503, str(e), headers=retry_after_headers(e.retry_after))
+
+        recorded = False
+        try:
+            # Wait in the fair queue, but never past the request deadline
+            queue_wait = min(deadline - time.time(), settings.SEGMENT_MAX_QUEUE_WAIT_SECONDS)
+            async with self._admission.slot(queue_wait):
+                started = time.monotonic()
+                try:
+                    result = await call()
+                except Exception as e:
+                    timed_out = isinstance(e, SegmentationError) and e.status_code == 504
+                    if self._breaker is not None and (own_deadline or not timed_out):
+                        self._breaker.record(probe, True, time.monotonic() - started)
+                        recorded = True
+                    raise
+                if self._breaker is not None:
+                    self._breaker.record(probe, failed(result), time.monotonic() - started)
+                    recorded = True
+        except AdmissionQueueFullError as e:
+            logger.warning("Запрос отклонен: %s", e)
+            raise SegmentationError(503, str(e), headers=retry_after_headers(settings.SEGMENT_RETRY_BACKOFF_SECONDS))
+        except AdmissionTimeoutError as e:
+            if time.time() >= deadline:
+                raise SegmentationError(504, "Request deadline exceeded while waiting for the detection service")
+            logger.warning("Запрос отклонен: %s", e)
+            raise SegmentationError(503, str(e), headers=retry_after_headers(settings.SEGMENT_RETRY_BACKOFF_SECONDS))
+        finally:
+            if self._breaker is not None and not recorded:
+                self._breaker.release(probe)
+
+        return result
+
+    def status(self) -> dict:
+        """
+        State of the admission queue and the circuit breaker, for /status.
+        """
+        status = {"admission": self._admission.status()}
+        if self._breaker is not None:
+            status["circuit_breaker"] = self._breaker.status()
+        return status
+
+
+class HttpSegmenter(Segmenter):
+    """
+    Segmentation by the detect service over the pooled HTTP client.
+
+    With SEGMENT_IMAGE_TRANSPORT=shm the image is handed over through shared
+    memory instead of a multipart upload; if the handoff fails, the same
+    request is sent as an upload.
+
+    At most SEGMENT_MAX_IN_FLIGHT requests are sent at a time, the rest wait
+    in a fair queue behind a circuit breaker (SegmentationGuard).
+    """
+
+    def __init__(self):
+        self._guard = SegmentationGuard(max_in_flight=settings.SEGMENT_MAX_IN_FLIGHT)
+        self._shared_images: Optional[SharedImageStore] = None
+        if settings.SEGMENT_IMAGE_TRANSPORT == "shm":
+            self._shared_images = SharedImageStore(
+                directory=settings.SEGMENT_SHM_DIR,
+                orphan_seconds=settings.SEGMENT_SHM_ORPHAN_SECONDS,
+                retry_seconds=settings.SEGMENT_SHM_RETRY_SECONDS,
+            )
+
+    async def start(self) -> None:
+        if not settings.YOLO_SERVICE_SEGMENT_URL:
+            raise RuntimeError("YOLO_SERVICE_SEGMENT_URL is required with INFERENCE_MODE=http")
+        # One pooled client to the segmentation service for the whole process
+        await detect_client.start()
+        if self._shared_images is not None:
+            await self._shared_images.start()
+
+    async def close(self) -> None:
+        if self._shared_images is not None:
+            await self._shared_images.close()
+        await detect_client.close()
+
+    async def _post_shared(
+        self, image_bytes: bytes, params: dict, headers: dict, deadline: float
+    ) -> Optional[DetectResponse]:
+        """
+        Hand the image over through shared memory.
+
+        Returns:
+            The detect service response, or None if the image has to be uploaded instead
+        """
+        store = self._shared_images
+        try:
+            handle = await asyncio.to_thread(store.write, image_bytes)
+        except OSError as e:
+            store.disable(f"cannot write to {store.directory}: {e}")
+            return None
+
+        try:
+            response = await detect_client.post_handle(
+                settings.YOLO_SERVICE_SEGMENT_URL.rstrip("/") + "/shm",
+                handle,
+                params=params,
+                headers=headers,
+                deadline=deadline,
+            )
+        finally:
+            # Unlinking a tmpfs file is cheap; a file missed here is removed as an orphan
+            store.remove(handle)
+
+        if response.status == 404:
+            # Handle not visible to the detect service (another host) or SHM_ENABLED=false
+            store.disable(response.body.decode("utf-8", errors="replace"))
+            return None
+        store.handoffs_total += 1
+        return response
+
+    async def segment(
+        self,
+        image_bytes: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        deadline: float,
+        own_deadline: bool = True,
+    ) -> PackedDetections:
+        response = await self._guard.run(
+            lambda: self._send(image_bytes, filename, content_type, deadline),
+            deadline,
+            failed=lambda response: detect_failed(response.status, own_deadline),
+            own_deadline=own_deadline,
+        )
+        return self._decode(response)
+
+    async def _send(
+        self,
+        image_bytes: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        deadline: float,
+    ) -> DetectResponse:
+        """
+        Send the image to the detect service.
+
+        Raises:
+            SegmentationError: 503 if the service is unreachable, 504 if it did not answer before the deadline
+        """
+        logger.debug("Отправка запроса к сервису сегментации: %s", settings.YOLO_SERVICE_SEGMENT_URL)
+        remaining = deadline - time.time()
+
+        # With geometry=quad the detect service fits the corners with our QUAD_FIT_METHOD
+        params = {"geometry": settings.SEGMENT_GEOMETRY, "quad_fit": settings.QUAD_FIT_METHOD}
+        headers = segment_request_headers(deadline)
+
+        try:
+            response = None
+            if self._shared_images is not None and self._shared_images.available():
+                response = await self._post_shared(image_bytes, params, headers, deadline)
+            if response is None:
+                # Pooled keep-alive connection; transient failures are retried before the deadline
+                response = await detect_client.post_image(
+                    settings.YOLO_SERVICE_SEGMENT_URL,
+                    image_bytes,
+                    filename=filename,
+                    content_type=content_type,
+                    params=params,
+                    headers=headers,
+                    deadline=deadline,
+                )
+        except aiohttp.ClientError as e:
+            logger.error("Ошибка сетевого соединения с сервисом сегментации: %s", e)
+            raise SegmentationError(503, f"Cannot connect to detection service: {e}")
+        except asyncio.TimeoutError:
+            logger.error("Сервис сегментации не ответил за %.1f с", remaining)
+            raise SegmentationError(504, "Detection service did not respond before the request deadline")
+
+        logger.info("Получен ответ от сервиса сегментации: HTTP %d", response.status)
+        return response
+
+    @staticmethod
+    def _decode(response: DetectResponse) -> PackedDetections:
+        """
+        Turn the detect service response into detections.
+
+        Raises:
+            SegmentationError: With the service's status for error responses, 500 for malformed bodies
+        """
+        if response.status != 200:
+            error_message = response.body.decode("utf-8", errors="replace")
+            logger.error("Ошибка сервиса Wood_detection_seg: HTTP %d - %s", response.status, error_message)
+            raise SegmentationError(response.status, f"Ошибка от Wood_detection: {error_message}")
+
+        # Both formats are decoded straight into NumPy arrays; pydantic models are built only for the output
+        if response.content_type == PACKED_MEDIA_TYPE:
+            try:
+                packed = PackedDetections.from_bytes(response.body)
+            except Exception as e:
+                logger.error("Ошибка разбора бинарного ответа сервиса сегментации: %s", e)
+                raise SegmentationError(500, f"Invalid binary response from detection service: {e}")
+            logger.debug("Успешно обработано %d результатов сегментации (бинарный ответ)", len(packed.confidences))
+        else:
+            try:
+                packed = PackedDetections.from_json(response.body)
+            except json.JSONDecodeError as e:
+                logger.error("Ошибка парсинга JSON: %s", e)
+                raise SegmentationError(500, f"Invalid JSON response from detection service: {e}")
+            except ValueError as e:
+                logger.error("Ошибка валидации результатов сегментации: %s", e)
+                raise SegmentationError(500, f"Validation error: {e}")
+            logger.debug("Успешно обработано %d результатов сегментации", len(packed.confidences))
+
+        return packed
+
+    def metrics(self) -> dict:
+        metrics = {"detect_client": detect_client.metrics(), **self.status()}
+        if self._shared_images is not None:
+            metrics["shared_memory"] = self._shared_images.metrics()
+        return metrics
+
+    def status(self) -> dict:
+        return self._guard.status()
+
+
+class LocalSegmenter(Segmenter):
+    """
+    Segmentation by the model loaded into this process (INFERENCE_MODE=local).
+
+    Removes the HTTP hop, the multipart upload and the encode/decode of the
+    polygons. The model runs on one dedicated thread, so requests are served
+    one at a time in arrival order and the event loop is never blocked.
+    Requests wait for the model thread behind the same admission queue and
+    circuit breaker as the http mode. Requires the ultralytics package.
+    """
+
+    def __init__(self):
+        # One call at a time: the rest wait in the fair queue, not on the executor
+        self._guard = SegmentationGuard(max_in_flight=1)
+        self._model = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.requests_total = 0
+        self.timeouts_total = 0
+        self.inferences_total = 0
+        self.inference_seconds = 0.0
+
+    async def start(self) -> None:
+        if self._model is not None:
+            return
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="segmentation")
+        started = time.perf_counter()
+        self._model = await asyncio.get_running_loop().run_in_executor(self._executor, self._load_model)
+        logger.info(
+            "Модель сегментации загружена в процесс: %s за %.1f с",
+            settings.LOCAL_MODEL_PATH, time.perf_counter() - started,
+        )
+
+    async def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._model = None
+
+    @staticmethod
+    def _load_model():
+        try:
+            from ultralytics import YOLO
+        except ImportError as e:
+            raise RuntimeError("INFERENCE_MODE=local requires the ultralytics package (uv sync --group local)") from e
+
+        model = YOLO(settings.LOCAL_MODEL_PATH, task="segment")
+        # Warmup, so that the first request does not pay for lazy initialisation
+        imgsz = settings.LOCAL_INFERENCE_IMGSZ
+        model(Image.new("RGB", (imgsz, imgsz)), imgsz=imgsz, verbose=False)
+        return model
+
+    def _predict(self, image_bytes: bytes, deadline: float) -> PackedDetections:
+        if time.time() >= deadline:
+            # The caller gave up while this call waited for the model thread
+            raise SegmentationError(504, "Request deadline exceeded before segmentation started")
+
+        started = time.perf_counter()
+        prepared = decode_image(image_bytes, settings.LOCAL_INFERENCE_IMGSZ)
+        result = self._model(prepared.image, imgsz=settings.LOCAL_INFERENCE_IMGSZ, verbose=False)[0]
+        self.inferences_total += 1
+        self.inference_seconds += time.perf_counter() - started
+
+        if result.masks is None:
+            return PackedDetections.from_polygons([], [], [])
+        return PackedDetections.from_polygons(
+            confidences=[float(conf) for conf in result.boxes.conf],
+            class_names=[result.names[int(cls_id)] for cls_id in result.boxes.cls],
+            # Back to original image coordinates
+            polygons=[seg * prepared.scale for seg in result.masks.xy],
+        )
+
+    async def segment(
+        self,
+        image_bytes: bytes,
+        filename: Optional[str],
+        content_type: Optional[str],
+        deadline: float,
+        own_deadline: bool = True,
+    ) -> PackedDetections:
+        if self._model is None:
+            await self.start()
+
+        self.requests_total += 1
+        return await self._guard.run(
+            lambda: self._run_model(image_bytes, deadline), deadline, own_deadline=own_deadline
+        )
+
+    async def _run_model(self, image_bytes: bytes, deadline: float) -> PackedDetections:
+        remaining = deadline - time.time()
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._predict, image_bytes, deadline)
+        try:
+            return await asyncio.wait_for(future, max(remaining, 0))
+        except asyncio.TimeoutError:
+            self.timeouts_total += 1
+            logger.error("Сегментация не завершилась за %.1f с", remaining)
+            raise SegmentationError(504, "Segmentation did not finish before the request deadline")
+
+    def metrics(self) -> dict:
+        return {
+            "local_inference": {
+                "model": settings.LOCAL_MODEL_PATH,
+                "imgsz": settings.LOCAL_INFERENCE_IMGSZ,
+                "requests_total": self.requests_total,
+                "timeouts_total": self.timeouts_total,
+                "inference_avg_ms": (
+                    self.inference_seconds / self.inferences_total * 1000 if self.inferences_total else 0.0
+                ),
+            },
+            **self.status(),
+        }
+
+    def status(self) -> dict:
+        return self._guard.status()
+
+
+def create_segmenter() -> Segmenter:
+    if settings.INFERENCE_MODE == "local":
+        return LocalSegmenter()
+    return HttpSegmenter()
+
+
+# Selected by INFERENCE_MODE; started and closed in the application lifespan
+segmenter = create_segmenter()
@@ -1,9 +1,55 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal
 
 class Settings(BaseSettings):
-    YOLO_SERVICE_SEGMENT_URL: str
+    # Инференс: http — через сервис сегментации, local — модель загружается в этот процесс
+    INFERENCE_MODE: Literal["http", "local"] = "http"
+    # По умолчанию — веса сервиса сегментации из того же репозитория
+    LOCAL_MODEL_PATH: str = "../detect/models/wood.pt"
+    LOCAL_INFERENCE_IMGSZ: int = 640
+    # Обязателен при INFERENCE_MODE=http
+    YOLO_SERVICE_SEGMENT_URL: str = ""
     CONFIDENCE_THRESHOLD: float = 0.5
+    # Форма полигонов от сервиса сегментации: quad (4 угла), simplified или full
+    SEGMENT_GEOMETRY: Literal["full", "simplified", "quad"] = "quad"
+    # Формат ответа сервиса сегментации: binary (упакованные массивы) или json
+    SEGMENT_RESPONSE_FORMAT: Literal["binary", "json"] = "binary"
+    # Приведение полигонов geometry=simplified/full к 4 углам: перебор, бинарный поиск epsilon или по выпуклой оболочке
+    QUAD_FIT_METHOD: Literal["search", "bisection", "hull"] = "search"
+    # Таймаут запроса к сервису сегментации; передаётся ему как X-Request-Deadline
+    SEGMENT_TIMEOUT_SECONDS: float = 60
+    # Передача изображения сервису сегментации: upload (multipart) или shm (файл в общей памяти на том же хосте)
+    SEGMENT_IMAGE_TRANSPORT: Literal["upload", "shm"] = "upload"
+    SEGMENT_SHM_DIR: str = "/dev/shm"
+    SEGMENT_SHM_ORPHAN_SECONDS: float = 300
+    SEGMENT_SHM_RETRY_SECONDS: float = 60
+    # Пул keep-alive соединений к сервису сегментации: лимиты, таймаут подключения и повторы с джиттером
+    SEGMENT_POOL_LIMIT: int = 100
+    SEGMENT_POOL_LIMIT_PER_HOST: int = 32
+    SEGMENT_KEEPALIVE_SECONDS: float = 30
+    SEGMENT_CONNECT_TIMEOUT_SECONDS: float = 3
+    SEGMENT_RETRIES: int = 2
+    SEGMENT_RETRY_BACKOFF_SECONDS: float = 0.2
+    # Не больше SEGMENT_MAX_IN_FLIGHT запросов к сервису сегментации одновременно (0 — без ограничения), остальные ждут в очереди
+    SEGMENT_MAX_IN_FLIGHT: int = 32
+    SEGMENT_MAX_WAITING: int = 64
+    SEGMENT_MAX_QUEUE_WAIT_SECONDS: float = 10
+    # Выключатель: доля ошибок или медленных ответов за окно, после которой запросы сразу отклоняются, и пробные запросы
+    SEGMENT_BREAKER_ENABLED: bool = True
+    SEGMENT_BREAKER_WINDOW_SECONDS: float = 30
+    SEGMENT_BREAKER_MIN_CALLS: int = 10
+    SEGMENT_BREAKER_FAILURE_RATE: float = 0.5
+    SEGMENT_BREAKER_SLOW_CALL_SECONDS: float = 20
+    SEGMENT_BREAKER_SLOW_CALL_RATE: float = 0.8
+    SEGMENT_BREAKER_OPEN_SECONDS: float = 15
+    SEGMENT_BREAKER_HALF_OPEN_PROBES: int = 3
+    # Хранение углов досок для /remeasure: лимит размера (0 — не хранить) и время жизни с последнего обращения
+    DETECTION_STORE_MAX_MB: int = 64
+    DETECTION_STORE_TTL_SECONDS: float = 1800
+    # Логирование: уровень, размер очереди фонового писателя и каждая N-я доска в отладочных строках (0 — не писать)
+    LOG_LEVEL: Literal["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_DETECTION_SAMPLE_EVERY: int = 20
     CORS_URL: str = "*"
     PORT: int = 8001
 
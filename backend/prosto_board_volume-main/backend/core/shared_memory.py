@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Optional
+
+from core.logging_config import setup_logger
+
+logger = setup_logger("shared_memory")
+
+# File name prefix of handed-off images; the detect service accepts only these names
+SHM_PREFIX = "prosto-board-image-"
+
+
+class SharedImageStore:
+    """
+    Images handed to the detect service through shared memory (/dev/shm).
+
+    Each image is written to its own file and only the file name (handle) is
+    sent; the detect service memory-maps the file instead of receiving a
+    multipart upload. The file is removed as soon as the response arrives.
+    Files left behind by a crashed or cancelled request are removed once
+    they are older than orphan_seconds, at start and then periodically.
+
+    After a failed handoff (the directory is not writable, or the detect
+    service does not accept handles because it runs on another host or has
+    SHM_ENABLED=false) the store is disabled for retry_seconds and requests
+    go through the regular upload.
+
+    Args:
+        directory: Shared memory directory, mounted into both services
+        orphan_seconds: Age after which a leftover file is removed
+        retry_seconds: How long the handoff stays disabled after a failure
+    """
+
+    def __init__(self, directory: str, orphan_seconds: float, retry_seconds: float):
+        self.directory = directory
+        self.orphan_seconds = orphan_seconds
+        self.retry_seconds = retry_seconds
+        self._disabled_until = 0.0
+        self._cleanup_task: Optional[asyncio.Task] = None
+        self.handoffs_total = 0
+        self.fallbacks_total = 0
+        self.orphans_removed = 0
+
+    async def start(self) -> None:
+        if self._cleanup_task is None:
+            self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._cleanup_task is not None:
+            self._cleanup_task.cancel()
+            self._cleanup_task = None
+
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def disable(self, reason: str) -> None:
+        """
+        Fall back to the upload for retry_seconds.
+        """
+        self.fallbacks_total += 1
+        self._disabled_until = time.monotonic() + self.retry_seconds
+        logger.warning(
+            "Передача изображений через общую память отключена на %.0f с: %s", self.retry_seconds, reason
+        )
+
+    def write(self, image_bytes: bytes) -> str:
+        """
+        Write an image to a new file in the shared memory directory.
+
+        Args:
+            image_bytes: Uploaded image
+
+        Returns:
+            Handle (file name) to pass to the detect service
+
+        Raises:
+            OSError: If the file could not be written
+        """
+        handle = f"{SHM_PREFIX}{uuid.uuid4().hex}"
+        path = os.path.join(self.directory, handle)
+        try:
+            with open(path, "xb") as f:
+                f.write(image_bytes)
+        except OSError:
+            self.remove(handle)
+            raise
+        return handle
+
+    def remove(self, handle: str) -> None:
+        try:
+            os.unlink(os.path.join(self.directory, handle))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("Не удалось удалить %s из общей памяти: %s", handle, e)
+
+    def cleanup_orphans(self) -> int:
+        """
+        Remove handed-off images older than orphan_seconds.
+
+        Returns:
+            Number of removed files
+        """
+        threshold = time.time() - self.orphan_seconds
+        removed = 0
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return 0
+        for entry in entries:
+            if not entry.name.startswith(SHM_PREFIX):
+                continue
+            try:
+                if entry.stat().st_mtime < threshold:
+                    os.unlink(entry.path)
+                    removed += 1
+            except OSError:
+                # Removed by another worker in the meantime
+                continue
+        if removed:
+            self.orphans_removed += removed
+            logger.warning("Удалено %d брошенных изображений из %s", removed, self.directory)
+        return removed
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.to_thread(self.cleanup_orphans)
+            await asyncio.sleep(self.orphan_seconds / 2)
+
+    def metrics(self) -> dict:
+        return {
+            "directory": self.directory,
+            "available": self.available(),
+            "handoffs_total": self.handoffs_total,
+            "fallbacks_total": self.fallbacks_total,
+            "orphans_removed": self.orphans_removed,
+        }
@@ -1,13 +1,25 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.segmentation import segmenter
 from core.settings import settings
 
 from api.healthcheck import router as router_healthcheck
+from api.metrics import router as router_metrics
 from api.wooden_boards_volume_seg import router as router_wooden_boards_volume_seg
 
 
-app = FastAPI() 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled client to the segmentation service, or the model itself with INFERENCE_MODE=local
+    await segmenter.start()
+    yield
+    await segmenter.close()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,6 +31,7 @@ app.add_middleware(
 
 app.include_router(router_healthcheck)
 app.include_router(router_wooden_boards_volume_seg)
+app.include_router(router_metrics)
 
 
 if __name__ == "__main__":
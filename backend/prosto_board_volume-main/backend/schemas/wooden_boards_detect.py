@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 from fastapi import UploadFile
 from pydantic import BaseModel
 
@@ -11,6 +11,12 @@ class Wooden_boards_seg_schema_input(BaseModel):
     length: float = 100
 
 
+class Wooden_boards_remeasure_schema_input(BaseModel):
+    handle: str
+    height: float = 5
+    length: float = 100
+
+
 class Wooden_board_seg(BaseModel):
     volume: float
     height: float
@@ -23,3 +29,4 @@ class Wooden_boards_seg_schema_output(BaseModel):
     total_volume: float
     total_count: int
     wooden_boards: List[Wooden_board_seg]
+    detection_handle: Optional[str] = None
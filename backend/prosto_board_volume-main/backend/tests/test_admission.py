@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from core.admission import AdmissionLimiter, AdmissionQueueFullError, AdmissionTimeoutError
+
+
+async def hold(limiter, name, order, release, timeout=5.0):
+    """
+    Takes a slot, notes the order in which slots were granted and holds it until release is set.
+    """
+    async with limiter.slot(timeout):
+        order.append(name)
+        await release.wait()
+
+
+def test_slots_are_granted_in_arrival_order():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=1, max_waiting=10)
+        order = []
+        releases = {name: asyncio.Event() for name in "abcd"}
+        tasks = []
+        for name in "abcd":
+            tasks.append(asyncio.create_task(hold(limiter, name, order, releases[name])))
+            await asyncio.sleep(0)
+        assert limiter.status()["waiting"] == 3
+
+        for name in "abcd":
+            releases[name].set()
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+        return order, limiter.status()
+
+    order, status = asyncio.run(main())
+    assert order == ["a", "b", "c", "d"]
+    assert status["in_flight"] == 0
+    assert status["admitted_total"] == 4
+    assert status["queued_total"] == 3
+
+
+def test_new_request_does_not_overtake_the_queue():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=1, max_waiting=10)
+        order = []
+        release = asyncio.Event()
+        first = asyncio.create_task(hold(limiter, "first", order, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(limiter, "waiting", order, release))
+        await asyncio.sleep(0)
+
+        # The slot is handed to the waiter directly, a request arriving right after cannot take it
+        release.set()
+        await asyncio.sleep(0)
+        late = asyncio.create_task(hold(limiter, "late", order, release))
+        await asyncio.gather(first, waiting, late)
+        return order
+
+    assert asyncio.run(main()) == ["first", "waiting", "late"]
+
+
+def test_full_queue_rejects_at_once():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=1, max_waiting=1)
+        release = asyncio.Event()
+        tasks = [asyncio.create_task(hold(limiter, name, [], release)) for name in ("running", "waiting")]
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionQueueFullError):
+            await limiter.acquire(5.0)
+        status = limiter.status()
+
+        release.set()
+        await asyncio.gather(*tasks)
+        return status
+
+    status = asyncio.run(main())
+    assert status["rejected_total"] == 1
+    assert status["waiting"] == 1
+
+
+def test_wait_times_out_and_leaves_the_queue():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=1, max_waiting=10)
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(limiter, "running", [], release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(AdmissionTimeoutError):
+            await limiter.acquire(0.01)
+        status = limiter.status()
+
+        release.set()
+        await running
+        return status, limiter.status()
+
+    during, after = asyncio.run(main())
+    assert during["waiting"] == 0
+    assert during["timeouts_total"] == 1
+    assert after["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_take_a_slot():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=1, max_waiting=10)
+        order = []
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(limiter, "running", order, release))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(hold(limiter, "cancelled", order, release))
+        waiting = asyncio.create_task(hold(limiter, "waiting", order, release))
+        await asyncio.sleep(0)
+
+        cancelled.cancel()
+        release.set()
+        await asyncio.gather(running, waiting)
+        return order, limiter.status()
+
+    order, status = asyncio.run(main())
+    assert order == ["running", "waiting"]
+    assert status["in_flight"] == 0
+
+
+def test_zero_max_in_flight_disables_the_limit():
+    async def main():
+        limiter = AdmissionLimiter(max_in_flight=0, max_waiting=0)
+        for _ in range(100):
+            await limiter.acquire(0)
+        return limiter.status()
+
+    status = asyncio.run(main())
+    assert status["in_flight"] == 100
+    assert status["queued_total"] == 0
@@ -0,0 +1,166 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import circuit_breaker
+from core.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker, "time", SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def make_breaker(**overrides) -> CircuitBreaker:
+    options = dict(
+        window_seconds=30,
+        min_calls=4,
+        failure_rate=0.5,
+        slow_call_seconds=5,
+        slow_call_rate=0.75,
+        open_seconds=10,
+        half_open_probes=2,
+    )
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def call(breaker, failed=False, duration=0.1):
+    breaker.record(breaker.acquire(), failed, duration)
+
+
+def open_breaker(breaker):
+    for _ in range(4):
+        call(breaker, failed=True)
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, failed=True)
+
+    assert breaker.state == CLOSED
+    assert breaker.status()["failure_rate"] == 1.0
+
+
+def test_opens_at_failure_rate(clock):
+    breaker = make_breaker()
+    call(breaker)
+    call(breaker)
+    call(breaker, failed=True)
+    assert breaker.state == CLOSED
+
+    call(breaker, failed=True)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_total == 1
+    assert breaker.last_open_reason.startswith("failure rate 50%")
+
+
+def test_opens_at_slow_call_rate(clock):
+    breaker = make_breaker()
+    call(breaker)
+    for _ in range(3):
+        call(breaker, duration=5)
+
+    assert breaker.state == OPEN
+    assert breaker.last_open_reason.startswith("slow call rate 75%")
+
+
+def test_old_outcomes_leave_the_window(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        call(breaker, failed=True)
+    clock.now += 31
+
+    call(breaker, failed=True)
+
+    assert breaker.state == CLOSED
+    assert breaker.status()["calls_in_window"] == 1
+
+
+def test_open_rejects_until_open_seconds_pass(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 4
+
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.acquire()
+
+    assert error.value.retry_after == pytest.approx(6)
+    assert breaker.rejected_total == 1
+    assert breaker.status()["retry_after_seconds"] == pytest.approx(6)
+
+
+def test_half_open_closes_after_successful_probes(clock):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 10
+
+    first = breaker.acquire()
+    assert breaker.state == HALF_OPEN
+    second = breaker.acquire()
+    # Both probes are in flight, further calls wait for their outcome
+    with pytest.raises(CircuitOpenError):
+        breaker.acquire()
+
+    breaker.record(first, False, 0.1)
+    assert breaker.state == HALF_OPEN
+    breaker.record(second, False, 0.1)
+
+    assert breaker.state == CLOSED
+    assert breaker.acquire() is None
+
+
+@pytest.mark.parametrize("failed, duration", [(True, 0.1), (False, 5)])
+def test_failed_or_slow_probe_opens_again(clock, failed, duration):
+    breaker = make_breaker()
+    open_breaker(breaker)
+    clock.now += 10
+
+    breaker.record(breaker.acquire(), failed, duration)
+
+    assert breaker.state == OPEN
+    assert breaker.opened_total == 2
+
+
+def test_released_probe_frees_its_place(clock):
+    breaker = make_breaker(half_open_probes=1)
+    open_breaker(breaker)
+    clock.now += 10
+
+    breaker.release(breaker.acquire())
+
+    breaker.record(breaker.acquire(), False, 0.1)
+    assert breaker.state == CLOSED
+
+
+def test_late_outcomes_are_ignored(clock):
+    breaker = make_breaker()
+    # A call that started while closed finishes after the circuit opened
+    late = breaker.acquire()
+    open_breaker(breaker)
+    breaker.record(late, False, 0.1)
+    assert breaker.state == OPEN
+
+    # A probe from an earlier half-open period does not count in the next one
+    clock.now += 10
+    stale = breaker.acquire()
+    breaker.record(breaker.acquire(), True, 0.1)
+    clock.now += 10
+    breaker.acquire()
+    breaker.record(stale, True, 0.1)
+
+    assert breaker.state == HALF_OPEN
+    assert breaker.status()["probes_in_flight"] == 1
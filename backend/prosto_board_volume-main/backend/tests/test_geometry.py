@@ -0,0 +1,169 @@
+import math
+
+import cv2
+import numpy as np
+import pytest
+
+from core.geometry import QUAD_FIT_METHODS, board_dimensions, fit_quads, order_quads
+
+INPUT_HEIGHT = 0.05
+INPUT_LENGTH = 6.0
+
+
+# Reference: the per-board implementation the endpoint used before core/geometry.py
+
+
+def reference_optimize_quad_points(points_array: np.ndarray) -> np.ndarray:
+    if len(points_array) == 4:
+        return points_array
+
+    points_reshaped = points_array.reshape(-1, 1, 2).astype(np.float32)
+
+    perimeter = cv2.arcLength(points_reshaped, True)
+    for eps_factor in np.linspace(0.01, 0.2, 20):
+        approx = cv2.approxPolyDP(points_reshaped, eps_factor * perimeter, True)
+        if len(approx) == 4:
+            return approx.reshape(-1, 2)
+
+    hull = cv2.convexHull(points_reshaped)
+    hull_perimeter = cv2.arcLength(hull, True)
+    for eps_factor in np.linspace(0.01, 0.2, 20):
+        approx = cv2.approxPolyDP(hull, eps_factor * hull_perimeter, True)
+        if len(approx) == 4:
+            return approx.reshape(-1, 2)
+
+    return cv2.boxPoints(cv2.minAreaRect(points_reshaped))
+
+
+def reference_order_points(points: np.ndarray) -> np.ndarray:
+    centroid = np.mean(points, axis=0)
+    angles = np.arctan2(points[:, 1] - centroid[1], points[:, 0] - centroid[0])
+    ordered = points[np.argsort(angles)]
+    return np.roll(ordered, -np.argmin(np.sum(ordered, axis=1)), axis=0)
+
+
+def reference_timber_dimensions(quad: np.ndarray, input_height: float) -> tuple:
+    sides = [math.dist(quad[i], quad[(i + 1) % 4]) for i in range(4)]
+    if any(side <= 0 for side in sides):
+        raise ValueError(f"Invalid side lengths: {sides}")
+
+    width = (sides[0] + sides[2]) / 2
+    height = (sides[1] + sides[3]) / 2
+    if width < height:
+        width, height = height, width
+
+    ratio = input_height / height
+    if ratio <= 0 or not math.isfinite(ratio):
+        raise ValueError(f"Invalid scaling ratio: {ratio}")
+    return width, height, ratio
+
+
+def random_contours(count: int, seed: int = 0) -> list:
+    """
+    Noisy, rotated board outlines with a varying number of points, plus random blobs.
+    """
+    rng = np.random.default_rng(seed)
+    contours = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            w, h = rng.uniform(20, 400), rng.uniform(5, 80)
+            per_side = int(rng.integers(2, 40))
+            t = np.linspace(0, 1, per_side, endpoint=False)[:, None]
+            corners = np.array([[0, 0], [w, 0], [w, h], [0, h]])
+            outline = np.concatenate([a + t * (b - a) for a, b in zip(corners, np.roll(corners, -1, axis=0))])
+            angle = rng.uniform(0, 2 * np.pi)
+            rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+            points = outline @ rotation.T + rng.uniform(0, 2000, 2) + rng.normal(0, rng.uniform(0, 3), outline.shape)
+        else:
+            angles = np.sort(rng.uniform(0, 2 * np.pi, int(rng.integers(3, 60))))
+            radii = rng.uniform(10, 100, len(angles))
+            points = np.stack([radii * np.cos(angles), radii * np.sin(angles)], axis=1) + 500
+        contours.append(points.astype(np.float32))
+    return contours
+
+
+def test_search_matches_reference_implementation():
+    contours = random_contours(3000)
+
+    quads, fitted = fit_quads(contours, "search")
+    ordered = order_quads(quads)
+    dimensions = board_dimensions(ordered, INPUT_HEIGHT, INPUT_LENGTH)
+
+    assert fitted.all()
+    for i, contour in enumerate(contours):
+        expected = reference_order_points(reference_optimize_quad_points(contour))
+        np.testing.assert_array_equal(ordered[i], expected)
+
+        try:
+            width_px, height_px, ratio = reference_timber_dimensions(expected, INPUT_HEIGHT)
+        except ValueError:
+            assert not dimensions.valid[i]
+            continue
+        assert dimensions.valid[i]
+        assert dimensions.ratios[i] == pytest.approx(ratio, rel=1e-9)
+        assert dimensions.widths[i] == pytest.approx(width_px * ratio, rel=1e-9)
+        assert dimensions.heights[i] == pytest.approx(height_px * ratio, rel=1e-9)
+        assert dimensions.volumes[i] == pytest.approx(width_px * ratio * height_px * ratio * INPUT_LENGTH, rel=1e-9)
+
+
+def test_four_point_polygons_are_kept():
+    quad = np.array([[10, 0], [0, 0], [0, 5], [10, 5]], dtype=np.float32)
+
+    for method in QUAD_FIT_METHODS:
+        quads, fitted = fit_quads([quad], method)
+        assert fitted[0]
+        np.testing.assert_array_equal(quads[0], quad)
+
+
+@pytest.mark.parametrize("method", QUAD_FIT_METHODS)
+def test_alternative_methods_fit_rectangles(method):
+    contours = random_contours(150, seed=1)
+
+    quads, fitted = fit_quads(contours, method)
+    dimensions = board_dimensions(order_quads(quads), INPUT_HEIGHT, INPUT_LENGTH)
+
+    assert fitted.all()
+    assert np.isfinite(quads).all()
+    assert dimensions.valid.mean() > 0.95
+
+
+@pytest.mark.parametrize("method", QUAD_FIT_METHODS)
+@pytest.mark.parametrize(
+    "points",
+    [
+        pytest.param([[1, 1]], id="one point"),
+        pytest.param([[0, 0], [5, 5]], id="two points"),
+        pytest.param([[0, 0], [1, 1], [2, 2], [3, 3], [4, 4]], id="collinear"),
+        pytest.param([[2, 2]] * 6, id="duplicates"),
+    ],
+)
+def test_degenerate_polygons_are_not_valid_boards(method, points):
+    quads, fitted = fit_quads([np.array(points, dtype=np.float32)], method)
+    dimensions = board_dimensions(order_quads(quads), INPUT_HEIGHT, INPUT_LENGTH)
+
+    assert not (fitted[0] and dimensions.valid[0])
+
+
+@pytest.mark.parametrize("method", QUAD_FIT_METHODS)
+def test_empty_polygon_is_not_fitted(method):
+    quads, fitted = fit_quads([np.zeros((0, 2), dtype=np.float32)], method)
+
+    assert not fitted[0]
+
+
+@pytest.mark.parametrize("method", QUAD_FIT_METHODS)
+def test_triangle_falls_back_to_bounding_rectangle(method):
+    triangle = np.array([[0, 0], [10, 0], [0, 10]], dtype=np.float32)
+
+    quads, fitted = fit_quads([triangle], method)
+    dimensions = board_dimensions(order_quads(quads), INPUT_HEIGHT, INPUT_LENGTH)
+
+    assert fitted[0]
+    assert dimensions.valid[0]
+    assert dimensions.heights[0] == pytest.approx(INPUT_HEIGHT)
+
+
+def test_unknown_method_is_not_fitted():
+    quads, fitted = fit_quads([np.array([[0, 0], [10, 0], [10, 5], [5, 6], [0, 5]], dtype=np.float32)], "spline")
+
+    assert not fitted[0]
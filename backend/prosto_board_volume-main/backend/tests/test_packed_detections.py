@@ -0,0 +1,119 @@
+import importlib.util
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.packed_detections import PackedDetections
+
+DETECT_PACKED_DETECTIONS = Path(__file__).resolve().parents[2] / "detect" / "services" / "packed_detections.py"
+
+
+def load_detect_module():
+    spec = importlib.util.spec_from_file_location("detect_packed_detections", DETECT_PACKED_DETECTIONS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_polygons(count: int):
+    rng = np.random.default_rng(count)
+    confidences = rng.uniform(0.3, 1.0, size=count).astype(np.float32)
+    names = [("board", "доска", "knot")[i % 3] for i in range(count)]
+    polygons = [rng.uniform(0, 4000, size=(3 + i, 2)).astype(np.float32) for i in range(count)]
+    return confidences, names, polygons
+
+
+def to_json(confidences, names, polygons) -> bytes:
+    return json.dumps(
+        [
+            {
+                "confidence": float(confidence),
+                "class_name": name,
+                "points": [{"x": float(x), "y": float(y)} for x, y in polygon],
+            }
+            for confidence, name, polygon in zip(confidences, names, polygons)
+        ]
+    ).encode()
+
+
+def assert_same(decoded: PackedDetections, original) -> None:
+    assert decoded.class_names == original.class_names
+    np.testing.assert_array_equal(decoded.confidences, original.confidences)
+    np.testing.assert_array_equal(decoded.class_ids, original.class_ids)
+    np.testing.assert_array_equal(decoded.offsets, original.offsets)
+    np.testing.assert_array_equal(decoded.points, original.points)
+
+
+@pytest.mark.skipif(not DETECT_PACKED_DETECTIONS.is_file(), reason="detect service sources are not available")
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_decodes_detect_service_bytes(count):
+    confidences, names, polygons = make_polygons(count)
+    sent = load_detect_module().PackedDetections.from_polygons(confidences, names, polygons)
+
+    received = PackedDetections.from_bytes(sent.to_bytes())
+
+    assert_same(received, sent)
+    assert [received.class_name(i) for i in range(count)] == names
+    for i, polygon in enumerate(polygons):
+        np.testing.assert_array_equal(received.polygon(i), polygon)
+
+
+@pytest.mark.skipif(not DETECT_PACKED_DETECTIONS.is_file(), reason="detect service sources are not available")
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_json_and_bytes_decode_to_the_same_arrays(count):
+    confidences, names, polygons = make_polygons(count)
+    sent = load_detect_module().PackedDetections.from_polygons(confidences, names, polygons)
+
+    from_json = PackedDetections.from_json(to_json(confidences, names, polygons))
+
+    assert_same(from_json, PackedDetections.from_bytes(sent.to_bytes()))
+
+
+def test_from_bytes_rejects_other_formats():
+    with pytest.raises(ValueError):
+        PackedDetections.from_bytes(b"XXXX" + bytes(12))
+
+
+@pytest.mark.skipif(not DETECT_PACKED_DETECTIONS.is_file(), reason="detect service sources are not available")
+def test_from_bytes_validates_decoded_arrays():
+    sent = load_detect_module().PackedDetections.from_polygons([0.9], ["board"], [np.full((4, 2), np.nan)])
+
+    with pytest.raises(ValueError):
+        PackedDetections.from_bytes(sent.to_bytes())
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"class_ids": np.array([0, 0], dtype=np.uint32)},
+        {"offsets": np.array([0, 3], dtype=np.uint32)},
+        {"offsets": np.array([1, 4], dtype=np.uint32)},
+        {"class_ids": np.array([1], dtype=np.uint32)},
+        {"confidences": np.array([np.inf], dtype=np.float32)},
+        {"points": np.full((4, 2), np.nan, dtype=np.float32)},
+    ],
+)
+def test_validate_rejects_inconsistent_arrays(change):
+    packed = PackedDetections.from_polygons([0.9], ["board"], [np.zeros((4, 2))])
+
+    assert packed.validate() is packed
+    with pytest.raises(ValueError):
+        packed._replace(**change).validate()
+
+
+def test_validate_rejects_decreasing_offsets():
+    packed = PackedDetections.from_polygons([0.9, 0.8], ["board", "board"], [np.zeros((4, 2)), np.zeros((2, 2))])
+
+    with pytest.raises(ValueError):
+        packed._replace(offsets=np.array([0, 7, 6], dtype=np.uint32)).validate()
+
+
+@pytest.mark.parametrize(
+    "body",
+    [b'{"confidence": 1}', b'[{"confidence": 0.9, "points": []}]', b'[{"confidence": 0.9, "class_name": 1, "points": []}]'],
+)
+def test_from_json_rejects_malformed_detections(body):
+    with pytest.raises(ValueError):
+        PackedDetections.from_json(body)
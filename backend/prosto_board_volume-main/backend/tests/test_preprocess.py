@@ -0,0 +1,53 @@
+import importlib.util
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from core.preprocess import decode_image
+
+DETECT_PREPROCESS = Path(__file__).resolve().parents[2] / "detect" / "services" / "preprocess.py"
+
+
+def encode(size, orientation=1, image_format="JPEG") -> bytes:
+    image = Image.new("RGB", size, (10, 200, 30))
+    exif = image.getexif()
+    exif[0x0112] = orientation
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, exif=exif)
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize(
+    "size, orientation, expected_size, expected_scale",
+    [
+        ((2000, 1000), 1, (640, 320), (3.125, 3.125)),
+        ((2000, 1000), 6, (320, 640), (3.125, 3.125)),
+        ((300, 200), 1, (300, 200), (1.0, 1.0)),
+    ],
+)
+def test_decode_image_shrinks_and_rotates(size, orientation, expected_size, expected_scale):
+    prepared = decode_image(encode(size, orientation), 640)
+
+    assert prepared.image.size == expected_size
+    assert prepared.scale == expected_scale
+
+
+@pytest.mark.skipif(not DETECT_PREPROCESS.is_file(), reason="detect service sources are not available")
+@pytest.mark.parametrize(
+    "size, orientation, image_format",
+    [((2000, 1000), 6, "JPEG"), ((4000, 3000), 8, "JPEG"), ((300, 200), 1, "PNG")],
+)
+def test_decode_image_matches_detect_service(size, orientation, image_format):
+    spec = importlib.util.spec_from_file_location("detect_preprocess", DETECT_PREPROCESS)
+    detect_preprocess = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(detect_preprocess)
+    image_bytes = encode(size, orientation, image_format)
+
+    ours = decode_image(image_bytes, 640)
+    theirs = detect_preprocess.decode_image(image_bytes, 640)
+
+    assert (ours.width, ours.height) == (theirs.width, theirs.height)
+    assert ours.image.size == theirs.image.size
+    assert ours.image.tobytes() == theirs.image.tobytes()
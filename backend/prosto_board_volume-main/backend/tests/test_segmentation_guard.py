@@ -0,0 +1,95 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core.segmentation import SegmentationError, SegmentationGuard, detect_failed
+from core.settings import settings
+
+
+@pytest.fixture
+def guard(monkeypatch):
+    monkeypatch.setattr(settings, "SEGMENT_BREAKER_ENABLED", True)
+    monkeypatch.setattr(settings, "SEGMENT_BREAKER_MIN_CALLS", 4)
+    monkeypatch.setattr(settings, "SEGMENT_BREAKER_FAILURE_RATE", 0.5)
+    return SegmentationGuard(max_in_flight=2)
+
+
+def run_calls(guard, call, count=6, **kwargs):
+    """
+    Runs call count times through the guard and returns the errors raised.
+    """
+
+    async def main():
+        errors = []
+        for _ in range(count):
+            try:
+                await guard.run(call, time.time() + 10, **kwargs)
+            except SegmentationError as e:
+                errors.append(e)
+        return errors
+
+    return asyncio.run(main())
+
+
+def breaker(guard) -> dict:
+    return guard.status()["circuit_breaker"]
+
+
+@pytest.mark.parametrize(
+    "status, own_deadline, failed",
+    [
+        (200, True, False),
+        (422, True, False),
+        (500, True, True),
+        (502, False, True),
+        (503, True, False),
+        (504, True, True),
+        (504, False, False),
+    ],
+)
+def test_detect_failed(status, own_deadline, failed):
+    assert detect_failed(status, own_deadline) is failed
+
+
+def test_queue_full_responses_do_not_open_the_circuit(guard):
+    async def call():
+        return SimpleNamespace(status=503)
+
+    run_calls(guard, call, failed=lambda response: detect_failed(response.status, True))
+
+    assert breaker(guard)["state"] == "closed"
+    assert breaker(guard)["failure_rate"] == 0.0
+
+
+def test_server_errors_open_the_circuit(guard):
+    async def call():
+        return SimpleNamespace(status=500)
+
+    errors = run_calls(guard, call, failed=lambda response: detect_failed(response.status, True))
+
+    assert breaker(guard)["state"] == "open"
+    # After four failed calls the rest are rejected without reaching the service
+    assert [e.status_code for e in errors] == [503, 503]
+
+
+def test_connection_errors_open_the_circuit(guard):
+    async def call():
+        raise SegmentationError(503, "Cannot connect to detection service")
+
+    run_calls(guard, call)
+
+    assert breaker(guard)["state"] == "open"
+
+
+def test_timeouts_count_only_under_our_own_deadline(guard):
+    async def call():
+        raise SegmentationError(504, "Detection service did not respond before the request deadline")
+
+    run_calls(guard, call, own_deadline=False)
+    assert breaker(guard)["state"] == "closed"
+    assert breaker(guard)["calls_in_window"] == 0
+
+    run_calls(guard, call, own_deadline=True)
+    assert breaker(guard)["state"] == "open"
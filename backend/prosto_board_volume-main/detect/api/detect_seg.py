@@ -1,60 +1,745 @@
-from fastapi import APIRouter, Depends
-from PIL import Image
-import io
-from typing import List, Annotated
-from ultralytics import YOLO
+import asyncio
+import json
+import logging
+import multiprocessing
+import time
+from collections import Counter
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from PIL import Image, UnidentifiedImageError
+from typing import Awaitable, List, Annotated, Optional, Tuple
 
-from schemas.detect import Detection_schema_input, Detection_Seg, Point
+from schemas.detect import (
+    Detection_batch_schema_input,
+    Detection_schema_input,
+    Detection_Seg,
+    Detection_shm_schema_input,
+    Point,
+)
 from core.settings import settings
+from services.batcher import DeadlineExceededError, InferenceBatcher
+from services.cascade import CascadeThresholds, escalation_reason
+from services.cpu import apply_cpu_settings, set_intra_op_threads
+from services.geometry import fit_quad, simplify_polygon
+from services.executor import InferenceExecutor, QueueFullError
+from services.model_loader import load_segment_model, model_fingerprint
+from services.model_runtime import ModelRuntime, warmup_images
+from services.packed_detections import (
+    PACKED_BATCH_MEDIA_TYPE,
+    PACKED_MEDIA_TYPE,
+    PackedDetections,
+    pack_many,
+)
+from services.perceptual_hash import NearDuplicateIndex, dhash
+from services.prefork import exit_startup_failed, in_worker
+from services.preprocess import PreparedImage, decode_image
+from services.quantization import load_int8_model
+from services.result_cache import ResultCache
+from services.shared_memory import open_shared_image
+from services.tiling import Tile, merge_tiles, plan_tiles
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
-model_seg = YOLO(settings.PATH_TO_YOLO_SEGMENT_MODEL)
+
+# Модель загружается и прогревается в lifespan приложения (startup), а не при импорте
+runtime = ModelRuntime()
+
+
+def load_model():
+    """
+    Загружает модель сегментации с настроенными движком и точностью.
+    """
+    if settings.MODEL_PRECISION == "int8":
+        return load_int8_model(
+            model_path=settings.PATH_TO_YOLO_SEGMENT_MODEL,
+            engine=settings.INFERENCE_ENGINE,
+            cache_dir=settings.EXPORT_CACHE_DIR,
+            imgsz=settings.INFERENCE_IMGSZ,
+            mode=settings.QUANTIZATION_MODE,
+            calibration_dir=settings.QUANT_CALIBRATION_DIR,
+            calibration_limit=settings.QUANT_CALIBRATION_LIMIT,
+            nodes_to_exclude=settings.QUANT_NODES_TO_EXCLUDE,
+            gate_confidence=settings.QUANT_GATE_CONFIDENCE,
+            count_tolerance=settings.QUANT_GATE_COUNT_TOLERANCE,
+            volume_tolerance=settings.QUANT_GATE_VOLUME_TOLERANCE,
+        )
+    return load_segment_model(
+        model_path=settings.PATH_TO_YOLO_SEGMENT_MODEL,
+        engine=settings.INFERENCE_ENGINE,
+        cache_dir=settings.EXPORT_CACHE_DIR,
+        imgsz=settings.INFERENCE_IMGSZ,
+    )
+
+
+def predict(images: list, imgsz: int) -> list:
+    return runtime.model(images, imgsz=imgsz)
+
+
+# Пороги перехода от прохода в низком разрешении к INFERENCE_IMGSZ или тайлам
+cascade_thresholds = CascadeThresholds(
+    min_detections=settings.CASCADE_MIN_DETECTIONS,
+    max_detections=settings.CASCADE_MAX_DETECTIONS,
+    min_mean_confidence=settings.CASCADE_MIN_MEAN_CONFIDENCE,
+    min_mask_side_px=settings.CASCADE_MIN_MASK_SIDE_PX,
+    min_solidity=settings.CASCADE_MIN_SOLIDITY,
+)
+# Число изображений по путям инференса и причины эскалации для /metrics
+inference_paths: Counter = Counter()
+escalation_reasons: Counter = Counter()
+
+# Кэш результатов; namespace задаётся после загрузки модели
+result_cache = ResultCache(
+    max_bytes=settings.RESULT_CACHE_MAX_MB * 1024 * 1024,
+    disk_dir=settings.RESULT_CACHE_DIR,
+    disk_max_bytes=settings.RESULT_CACHE_DISK_MAX_MB * 1024 * 1024,
+)
+
+# Индекс почти совпадающих изображений поверх кэша результатов
+near_duplicates = (
+    NearDuplicateIndex(
+        max_distance=settings.NEAR_DUPLICATE_MAX_DISTANCE,
+        aspect_tolerance=settings.NEAR_DUPLICATE_ASPECT_TOLERANCE,
+        max_entries=settings.NEAR_DUPLICATE_MAX_ENTRIES,
+    )
+    if settings.RESULT_CACHE_ENABLED and settings.NEAR_DUPLICATE_ENABLED
+    else None
+)
+
+# Декодирование и инференс выполняются в выделенном пуле, а не в event loop
+executor = InferenceExecutor(
+    workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_QUEUE_MAX,
+)
+
+# Конкурентные запросы объединяются в пакеты и прогоняются через модель одним вызовом
+batcher = InferenceBatcher(
+    predict=predict,
+    executor=executor,
+    max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS,
+)
+
+
+def configure_cpu(index: int) -> None:
+    """
+    Применяет привязку к ядрам и число потоков torch и OpenCV для воркера index.
+    """
+    runtime.cpu = apply_cpu_settings(
+        workers=settings.SERVER_WORKERS,
+        index=index,
+        affinity=settings.CPU_AFFINITY,
+        intra_op_threads=settings.INTRA_OP_THREADS,
+        inter_op_threads=settings.INTER_OP_THREADS,
+        opencv_threads=settings.OPENCV_THREADS,
+        pool_threads=settings.INFERENCE_WORKERS,
+    )
+
+
+def preload() -> None:
+    """
+    Загружает веса в родительском процессе до fork воркеров (SERVER_WORKERS > 1).
+
+    Родитель не выполняет вычислений: пул потоков OpenMP, запущенный до
+    fork, может зависнуть в воркерах или оставить их с одним потоком.
+    Экспорт, квантизация и проверка точности запускают модель, поэтому
+    выполняются в отдельном процессе, а воркеры загружают готовые файлы из кэша.
+    """
+    if settings.INFERENCE_ENGINE != "torch" or settings.MODEL_PRECISION == "int8":
+        with runtime.phase("prepare_model"):
+            process = multiprocessing.get_context("spawn").Process(target=load_model)
+            process.start()
+            process.join()
+        if process.exitcode != 0:
+            raise RuntimeError(f"Model preparation failed with exit code {process.exitcode}")
+        # Сессия ONNX Runtime/OpenVINO создаётся в каждом воркере
+        return
+
+    # С одним потоком torch преобразования тензоров при загрузке выполняются
+    # без пула OpenMP; воркеры задают своё число потоков в configure_cpu
+    set_intra_op_threads(1)
+    with runtime.phase("load_model"):
+        runtime.model = load_model()
+
+
+def fuse_model() -> None:
+    """
+    Сливает Conv+BN PyTorch-модели. Выполняется в воркере после настройки
+    потоков; слитые веса — собственная копия воркера.
+    """
+    try:
+        runtime.model.fuse()
+    except TypeError:
+        # Экспортированные модели (ONNX, OpenVINO) не сливаются
+        pass
+
+
+async def startup() -> None:
+    """
+    Загружает модель, открывает кэш результатов и прогревает модель на
+    изображениях размеров WARMUP_SIZES. Запускается фоном из lifespan,
+    поэтому /health отвечает сразу, а /ready — только после прогрева.
+    """
+    try:
+        # В режиме SERVER_WORKERS > 1 настройки CPU применяются сразу после fork
+        if runtime.cpu is None:
+            configure_cpu(0)
+
+        # В режиме SERVER_WORKERS > 1 модель уже загружена родительским процессом (preload)
+        if runtime.model is None:
+            with runtime.phase("load_model"):
+                runtime.model = await executor.run(load_model)
+        with runtime.phase("fuse"):
+            await executor.run(fuse_model)
+
+        if settings.RESULT_CACHE_ENABLED:
+            # Ключ кэша включает веса, фактически загруженную модель и параметры инференса
+            namespace = json.dumps(
+                {
+                    "weights": model_fingerprint(settings.PATH_TO_YOLO_SEGMENT_MODEL),
+                    "model": str(runtime.model.model_name),
+                    "imgsz": settings.INFERENCE_IMGSZ,
+                    "fast_decode": settings.FAST_DECODE,
+                    "tiling": tiling_namespace(),
+                    "cascade": cascade_namespace(),
+                },
+                sort_keys=True,
+            )
+            with runtime.phase("open_result_cache"):
+                await asyncio.to_thread(result_cache.open, namespace)
+
+        images = await asyncio.to_thread(warmup_images, settings.WARMUP_SIZES, settings.WARMUP_IMAGE)
+        warmup_imgsz = [settings.INFERENCE_IMGSZ]
+        if settings.CASCADE_ENABLED:
+            warmup_imgsz.append(settings.CASCADE_LOW_IMGSZ)
+        for size, image in zip(settings.WARMUP_SIZES, images):
+            with runtime.phase(f"warmup_{size}"):
+                for _ in range(settings.WARMUP_RUNS):
+                    for imgsz in warmup_imgsz:
+                        await executor.run(predict, [image], imgsz)
+    except Exception as e:
+        runtime.mark_failed(e)
+        if in_worker():
+            # Воркер без модели не нужен: serve_prefork останавливает сервис вместо перезапуска
+            exit_startup_failed()
+        return
+
+    runtime.mark_ready()
+
+
+async def shutdown() -> None:
+    await batcher.close()
+    executor.shutdown()
+
+
+def result_to_packed(result, scale: tuple = (1.0, 1.0)) -> PackedDetections:
+    """
+    Преобразует результат YOLO для одного изображения в PackedDetections.
+
+    scale: Множители (x, y) для перевода координат в координаты исходного изображения
+    """
+    if result.masks is None:
+        return PackedDetections.from_polygons([], [], [])
+
+    return PackedDetections.from_polygons(
+        confidences=[float(conf) for conf in result.boxes.conf],
+        class_names=[result.names[int(cls_id)] for cls_id in result.boxes.cls],
+        # Масштабирование координат к размерам исходного изображения
+        polygons=[seg * scale for seg in result.masks.xy],
+    )
+
+
+def packed_to_detections(packed: PackedDetections) -> List[Detection_Seg]:
+    """
+    Преобразует PackedDetections в список Detection_Seg для ответа в JSON.
+    """
+    return [
+        Detection_Seg(
+            confidence=float(packed.confidences[i]),
+            class_name=packed.class_name(i),
+            points=[Point(x=x, y=y) for x, y in polygon.tolist()],
+        )
+        for i, polygon in enumerate(packed.polygons())
+    ]
+
+
+def shape_detections(
+    packed: PackedDetections, geometry: str, tolerance: float, quad_fit: Optional[str] = None
+) -> PackedDetections:
+    """
+    Приводит полигоны к запрошенной форме: упрощённый контур или 4 угла.
+    В кэше хранятся полные полигоны, форма применяется к ответу.
+
+    quad_fit: Способ приведения к 4 углам от клиента (сервис объёмов передаёт
+        свой QUAD_FIT_METHOD); если не задан, используется QUAD_FIT_METHOD
+    """
+    if geometry == "quad":
+        method = quad_fit or settings.QUAD_FIT_METHOD
+        return packed.map_polygons(lambda points: fit_quad(points, method))
+    if geometry == "simplified":
+        return packed.map_polygons(lambda points: simplify_polygon(points, tolerance))
+    return packed
+
+
+async def shape_many(
+    packed_list: List[PackedDetections], geometry: str, tolerance: float, quad_fit: Optional[str] = None
+) -> List[PackedDetections]:
+    """
+    shape_detections для всех изображений запроса. fit_quad и approxPolyDP
+    вызываются для каждого полигона, поэтому на плотных штабелях форма
+    вычисляется в пуле инференса, а не в event loop.
+    """
+    if geometry == "full":
+        return packed_list
+    return await executor.run(shape_all, packed_list, geometry, tolerance, quad_fit)
+
+
+def shape_all(
+    packed_list: List[PackedDetections], geometry: str, tolerance: float, quad_fit: Optional[str]
+) -> List[PackedDetections]:
+    return [shape_detections(packed, geometry, tolerance, quad_fit) for packed in packed_list]
+
+
+def tiling_namespace() -> Optional[dict]:
+    """
+    Параметры тайлового инференса, влияющие на результат (для ключа кэша).
+    """
+    if not settings.TILING_ENABLED:
+        return None
+    return {
+        "decode_max_side": settings.TILE_DECODE_MAX_SIDE,
+        "size": settings.TILE_SIZE,
+        "overlap": settings.TILE_OVERLAP,
+        "max_tiles": settings.TILE_MAX_TILES,
+        "iou": settings.TILE_IOU_THRESHOLD,
+        "containment": settings.TILE_CONTAINMENT_THRESHOLD,
+    }
+
+
+def cascade_namespace() -> Optional[dict]:
+    """
+    Параметры каскадного инференса, влияющие на результат (для ключа кэша).
+    """
+    if not settings.CASCADE_ENABLED:
+        return None
+    return {"low_imgsz": settings.CASCADE_LOW_IMGSZ, **cascade_thresholds._asdict()}
+
+
+def decode_max_side() -> Optional[int]:
+    """
+    Сторона, до которой уменьшается изображение при декодировании. Для
+    тайлового инференса нужно разрешение выше входа модели.
+    """
+    if not settings.FAST_DECODE:
+        return None
+    if settings.TILING_ENABLED:
+        return max(settings.TILE_DECODE_MAX_SIDE, settings.INFERENCE_IMGSZ)
+    return settings.INFERENCE_IMGSZ
+
+
+def plan_image_tiles(image) -> List[Tile]:
+    """
+    Тайлы для изображения; пустой список, если изображение обрабатывается целиком.
+    """
+    if not settings.TILING_ENABLED:
+        return []
+    tiles = plan_tiles(
+        image.width, image.height, settings.TILE_SIZE, settings.TILE_OVERLAP, settings.TILE_MAX_TILES
+    )
+    return tiles if len(tiles) > 1 else []
+
+
+def merge_tile_results(prepared: PreparedImage, tiles: List[Tile], results: list) -> PackedDetections:
+    """
+    Сводит результаты тайлов в обнаружения для всего изображения в координатах исходного изображения.
+    """
+    merged = merge_tiles(
+        [result_to_packed(result) for result in results],
+        tiles,
+        prepared.image.width,
+        prepared.image.height,
+        iou_threshold=settings.TILE_IOU_THRESHOLD,
+        containment_threshold=settings.TILE_CONTAINMENT_THRESHOLD,
+    )
+    return merged.scaled(*prepared.scale)
+
+
+async def infer_full(images: List[PreparedImage], deadline: Optional[float] = None) -> List[Tuple[PackedDetections, str]]:
+    """
+    Инференс с INFERENCE_IMGSZ. При TILING_ENABLED большие изображения
+    режутся на тайлы, тайлы всех изображений идут в модель одним блоком.
+
+    Возвращает:
+        List[Tuple]: Обнаружения в координатах исходных изображений и путь (high или tiled)
+    """
+    tile_plans = [plan_image_tiles(prepared.image) for prepared in images]
+    inputs = []
+    for prepared, tiles in zip(images, tile_plans):
+        inputs += [prepared.image.crop(tile) for tile in tiles] or [prepared.image]
+
+    outputs = await batcher.submit_many(inputs, settings.INFERENCE_IMGSZ, deadline)
+
+    results = []
+    position = 0
+    for prepared, tiles in zip(images, tile_plans):
+        count = len(tiles) or 1
+        image_outputs = outputs[position : position + count]
+        position += count
+
+        # Преобразование результатов обнаружения в плотные массивы
+        if tiles:
+            results.append((await executor.run(merge_tile_results, prepared, tiles, image_outputs), "tiled"))
+        else:
+            results.append((result_to_packed(image_outputs[0], prepared.scale), "high"))
+    return results
+
+
+async def infer(images: List[PreparedImage], deadline: Optional[float] = None) -> List[Tuple[PackedDetections, str]]:
+    """
+    Инференс с каскадом: при CASCADE_ENABLED изображения сначала проходят
+    через модель с CASCADE_LOW_IMGSZ, и только те, для которых результат
+    ненадёжен (escalation_reason), обрабатываются повторно в infer_full.
+
+    Возвращает:
+        List[Tuple]: Обнаружения в координатах исходных изображений и путь (low, high или tiled)
+    """
+    if not settings.CASCADE_ENABLED:
+        results = await infer_full(images, deadline)
+    else:
+        outputs = await batcher.submit_many(
+            [prepared.image for prepared in images], settings.CASCADE_LOW_IMGSZ, deadline
+        )
+
+        results: List[Optional[Tuple[PackedDetections, str]]] = [None] * len(images)
+        escalated = []
+        for i, (prepared, output) in enumerate(zip(images, outputs)):
+            packed = result_to_packed(output)
+            reason = escalation_reason(packed, prepared.image.size, settings.CASCADE_LOW_IMGSZ, cascade_thresholds)
+            if reason is None:
+                results[i] = packed.scaled(*prepared.scale), "low"
+            else:
+                logger.debug("Escalating image %sx%s: %s", prepared.width, prepared.height, reason)
+                escalation_reasons[reason] += 1
+                escalated.append(i)
+
+        if escalated:
+            for i, result in zip(escalated, await infer_full([images[i] for i in escalated], deadline)):
+                results[i] = result
+
+    inference_paths.update(path for _, path in results)
+    return results
+
+
+def decode_and_hash(image_bytes: bytes, name: str):
+    """
+    Декодирует изображение и, если включён поиск почти совпадающих, считает его dHash.
+
+    Исключения:
+        HTTPException: 400, если файл name не читается как изображение
+    """
+    try:
+        prepared = decode_image(image_bytes, decode_max_side())
+    except UnidentifiedImageError:
+        raise HTTPException(status_code=400, detail=f"Cannot decode image {name}: unknown image format")
+    except (OSError, Image.DecompressionBombError) as e:
+        # Обрезанный или слишком большой файл — ошибка клиента, а не сервиса
+        raise HTTPException(status_code=400, detail=f"Cannot decode image {name}: {e}")
+    if near_duplicates is None:
+        return prepared, None
+    return prepared, dhash(prepared.image, settings.NEAR_DUPLICATE_HASH_SIZE)
+
+
+def check_deadline(deadline: Optional[float]) -> None:
+    """
+    Отклоняет запрос с 504, если его срок (X-Request-Deadline, Unix-время в секундах) истёк.
+    """
+    if deadline is not None and time.time() >= deadline:
+        raise HTTPException(status_code=504, detail="Request deadline exceeded")
+
+
+async def until_disconnected(request: Request, work: Awaitable):
+    """
+    Выполняет work, пока клиент на связи. Если клиент отключился, work
+    отменяется: его изображения снимаются с очереди микропакетов и не
+    занимают модель.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=settings.DISCONNECT_POLL_MS / 1000)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info("Client disconnected, cancelling %s %s", request.method, request.url.path)
+                task.cancel()
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        task.cancel()
+        # Выход только после завершения work: его потоки могут ещё читать буферы запроса
+        await asyncio.wait({task})
+
+
+async def finish_on_cancel(work: Awaitable):
+    """
+    Выполняет work (задачу в потоке) до конца, даже если вызывающий отменён.
+
+    Отмена корутины не останавливает поток, и он продолжил бы читать
+    изображение запроса, в том числе отображение общей памяти, которое
+    /detect_seg/shm закрывает при выходе. Поэтому при отмене work
+    дожидается завершения, и только потом отмена передаётся дальше.
+    """
+    future = asyncio.ensure_future(work)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        await asyncio.wait({future})
+        raise
+
+
+async def segment_many(
+    images: List[bytes], names: List[str], deadline: Optional[float] = None
+) -> List[Tuple[PackedDetections, Optional[str], str]]:
+    """
+    Сегментация изображений с учётом кэша результатов и почти совпадающих изображений.
+    Изображения, которых нет в кэше, прогоняются через модель одним блоком.
+
+    Срок запроса deadline проверяется перед декодированием и перед
+    инференсом, а изображения с истёкшим сроком снимаются с очереди
+    микропакетов; в этих случаях запрос завершается с 504. Если одно из
+    изображений не декодируется, весь запрос завершается с 400 и именем
+    этого файла из names.
+
+    Возвращает:
+        List[Tuple]: Для каждого изображения полные полигоны, состояние кэша
+            (hit, near, miss или None, если кэш выключен) и путь инференса
+            (cache, low, high или tiled)
+    """
+    # До окончания загрузки и прогрева модели запросы не принимаются
+    if not runtime.ready:
+        raise HTTPException(
+            status_code=503,
+            detail=runtime.error or "Model is loading",
+            headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)},
+        )
+
+    results: List[Optional[Tuple[PackedDetections, Optional[str], str]]] = [None] * len(images)
+    cache_keys: List[Optional[str]] = [None] * len(images)
+
+    # Повторно загруженные изображения обслуживаются из кэша без инференса
+    if settings.RESULT_CACHE_ENABLED:
+        for i, image_bytes in enumerate(images):
+            cache_keys[i] = await finish_on_cancel(asyncio.to_thread(result_cache.key, image_bytes))
+            cached = await result_cache.get(cache_keys[i])
+            if cached is not None:
+                results[i] = cached, "hit", "cache"
+
+    todo = [i for i, result in enumerate(results) if result is None]
+    if not todo:
+        return results
+
+    check_deadline(deadline)
+    try:
+        with executor.admit(slots=len(todo)):
+            # Преобразование загруженных файлов в формат PIL Image
+            decoded = await finish_on_cancel(asyncio.gather(
+                *(executor.run(decode_and_hash, images[i], names[i]) for i in todo),
+                return_exceptions=True,
+            ))
+            # Первое нечитаемое изображение в порядке загрузки; остальные уже декодированы
+            for item in decoded:
+                if isinstance(item, BaseException):
+                    raise item
+
+            pending = []
+            for i, (prepared, image_hash) in zip(todo, decoded):
+                # Перекодированная или уменьшенная копия уже обработанного фото
+                if image_hash is not None:
+                    match = near_duplicates.find(image_hash, prepared.width, prepared.height)
+                    cached = await result_cache.get(match.payload, record_stats=False) if match else None
+                    if cached is not None:
+                        packed = cached.scaled(prepared.width / match.width, prepared.height / match.height)
+                        await result_cache.put(cache_keys[i], packed)
+                        results[i] = packed, "near", "cache"
+                        continue
+                pending.append((i, prepared, image_hash))
+
+            # Запуск модели YOLOv8 с поддержкой сегментации в составе микропакетов
+            check_deadline(deadline)
+            outputs = await infer([prepared for _, prepared, _ in pending], deadline)
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(settings.INFERENCE_RETRY_AFTER_SECONDS)},
+        )
+    except DeadlineExceededError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    for (i, prepared, image_hash), (packed, path) in zip(pending, outputs):
+        if cache_keys[i] is None:
+            results[i] = packed, None, path
+            continue
+
+        await result_cache.put(cache_keys[i], packed)
+        if image_hash is not None:
+            near_duplicates.add(image_hash, prepared.width, prepared.height, cache_keys[i])
+        results[i] = packed, "miss", path
+
+    return results
 
 
 @router.post("/detect_seg/")
 async def detect_seg(
     input: Annotated[Detection_schema_input, Depends()],
+    request: Request,
+    response: Response,
+    x_request_deadline: Annotated[Optional[float], Header()] = None,
 ) -> List[Detection_Seg]:
     """
     Конечная точка для обнаружения объектов с сегментацией на изображении.
 
+    Если заголовок Accept содержит PACKED_MEDIA_TYPE, ответ возвращается
+    в бинарном виде PackedDetections.to_bytes, иначе — в JSON.
+
     Параметры:
         file: Загруженное изображение для анализа
+        geometry: full (все точки маски), simplified (упрощённый контур) или quad (4 угла)
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам (search, bisection, hull); по умолчанию QUAD_FIT_METHOD
+        X-Request-Deadline: Срок запроса (Unix-время в секундах); после него запрос завершается с 504
 
     Возвращает:
         List[Detection_Seg]: Список обнаруженных объектов с сегментационными точками, уверенностью модели и именем класса
     """
 
-    # Чтение и преобразование загруженного файла в формат PIL Image
     image_bytes = await input.file.read()
-    image = Image.open(io.BytesIO(image_bytes))
-
-    # Запуск модели YOLOv8 с поддержкой сегментации
-    results = model_seg(image)
-
-    # Преобразование результатов обнаружения в структурированный формат
-    detections = []
-    for result in results:
-        if result.masks is not None:
-            for conf, cls_id, seg in zip(
-                result.boxes.conf, result.boxes.cls, result.masks.xy
-            ):
-                # Преобразование результатов сегментации в список точек с масштабированием координат к размерам изображения
-
-                points = []
-
-                for point in seg:
-                    points.append(
-                        Point(
-                            x=point[0],
-                            y=point[1],
-                        )
-                    )
-                detection = Detection_Seg(
-                    confidence=float(conf),
-                    class_name=result.names[int(cls_id)],
-                    points=points,
-                )
-                detections.append(detection)
-
-    return detections
+
+    return await segment_one(
+        image_bytes, input.file.filename, input.geometry, input.tolerance, input.quad_fit, request, response, x_request_deadline
+    )
+
+
+@router.post("/detect_seg/shm")
+async def detect_seg_shm(
+    input: Annotated[Detection_shm_schema_input, Depends()],
+    request: Request,
+    response: Response,
+    x_request_deadline: Annotated[Optional[float], Header()] = None,
+) -> List[Detection_Seg]:
+    """
+    Сегментация изображения, переданного через общую память (SHM_ENABLED).
+
+    Сервис объёмов на том же хосте записывает изображение в файл в SHM_DIR
+    и передаёт только его имя; файл отображается в память и читается без
+    загрузки через multipart. Ответ тот же, что у /detect_seg/. Если приём
+    через общую память выключен или файла нет (сервисы на разных хостах),
+    запрос завершается с 404 и клиент повторяет его обычной загрузкой.
+
+    Параметры:
+        handle: Имя файла с изображением в SHM_DIR
+        geometry: full (все точки маски), simplified (упрощённый контур) или quad (4 угла)
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам (search, bisection, hull); по умолчанию QUAD_FIT_METHOD
+        X-Request-Deadline: Срок запроса (Unix-время в секундах); после него запрос завершается с 504
+
+    Возвращает:
+        List[Detection_Seg]: Список обнаруженных объектов, как у /detect_seg/
+    """
+    if not settings.SHM_ENABLED:
+        raise HTTPException(status_code=404, detail="Shared memory transport is disabled")
+
+    try:
+        image = await asyncio.to_thread(open_shared_image, settings.SHM_DIR, input.handle)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Image handle not found: {input.handle}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        return await segment_one(
+            image, input.handle, input.geometry, input.tolerance, input.quad_fit, request, response, x_request_deadline
+        )
+    finally:
+        # Потоки хеширования и декодирования к этому моменту завершены (finish_on_cancel)
+        image.close()
+
+
+async def segment_one(
+    image_bytes,
+    name: str,
+    geometry: str,
+    tolerance: float,
+    quad_fit: Optional[str],
+    request: Request,
+    response: Response,
+    deadline: Optional[float],
+):
+    """
+    Сегментирует одно изображение и формирует ответ /detect_seg/: бинарный,
+    если заголовок Accept содержит PACKED_MEDIA_TYPE, иначе список Detection_Seg.
+
+    image_bytes: Байты изображения или отображение файла из общей памяти
+    name: Имя файла для сообщения об ошибке
+    """
+    [(packed, cache_status, path)] = await until_disconnected(
+        request, segment_many([image_bytes], [name], deadline)
+    )
+    [packed] = await shape_many([packed], geometry, tolerance, quad_fit)
+    headers = {"X-Inference-Path": path}
+    if cache_status:
+        headers["X-Cache"] = cache_status
+
+    # Бинарный ответ без объекта Python на каждую вершину
+    if PACKED_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=packed.to_bytes(), media_type=PACKED_MEDIA_TYPE, headers=headers)
+
+    response.headers.update(headers)
+    return packed_to_detections(packed)
+
+
+@router.post("/detect_seg/batch")
+async def detect_seg_batch(
+    input: Annotated[Detection_batch_schema_input, Depends()],
+    request: Request,
+    response: Response,
+    x_request_deadline: Annotated[Optional[float], Header()] = None,
+) -> List[List[Detection_Seg]]:
+    """
+    Пакетная сегментация нескольких изображений одним запросом.
+
+    Изображения, которых нет в кэше, прогоняются через модель пакетами
+    не больше BATCH_MAX_SIZE. Если заголовок Accept содержит
+    PACKED_BATCH_MEDIA_TYPE, ответ возвращается в бинарном виде pack_many.
+
+    Параметры:
+        files: Загруженные изображения для анализа
+        geometry: full (все точки маски), simplified (упрощённый контур) или quad (4 угла)
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам (search, bisection, hull); по умолчанию QUAD_FIT_METHOD
+        X-Request-Deadline: Срок запроса (Unix-время в секундах); после него запрос завершается с 504
+
+    Возвращает:
+        List[List[Detection_Seg]]: Обнаруженные объекты для каждого изображения в порядке загрузки
+    """
+    max_files = min(settings.BATCH_REQUEST_MAX_FILES, settings.INFERENCE_QUEUE_MAX)
+    if len(input.files) > max_files:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many files in one request: {len(input.files)} > {max_files}",
+        )
+
+    images = [await file.read() for file in input.files]
+    names = [file.filename for file in input.files]
+
+    results = await until_disconnected(request, segment_many(images, names, x_request_deadline))
+    packed_list = await shape_many(
+        [packed for packed, _, _ in results], input.geometry, input.tolerance, input.quad_fit
+    )
+    headers = {"X-Inference-Path": ",".join(path for _, _, path in results)}
+    if settings.RESULT_CACHE_ENABLED:
+        headers["X-Cache"] = ",".join(cache_status for _, cache_status, _ in results)
+
+    if PACKED_BATCH_MEDIA_TYPE in request.headers.get("accept", ""):
+        return Response(content=pack_many(packed_list), media_type=PACKED_BATCH_MEDIA_TYPE, headers=headers)
+
+    response.headers.update(headers)
+    return [packed_to_detections(packed) for packed in packed_list]
@@ -1,7 +1,20 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
+
+from api.detect_seg import runtime
 
 router = APIRouter()
 
 @router.get("/health")
 async def read_health():
     return {"status": "ok"}
+
+
+@router.get("/ready")
+async def read_ready(response: Response):
+    """
+    Готовность к приёму запросов: 200 после загрузки и прогрева модели, до этого 503.
+    """
+    status = runtime.status()
+    if not status["ready"]:
+        response.status_code = 503
+    return status
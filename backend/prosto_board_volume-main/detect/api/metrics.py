@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+
+from api.detect_seg import batcher, escalation_reasons, executor, inference_paths, near_duplicates, result_cache, runtime
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def read_metrics():
+    """
+    Метрики пула инференса: глубина очереди допуска, время ожидания и выполнения,
+    снятые с очереди микропакетов изображения (истёк срок, клиент отключился),
+    длительность фаз запуска, а также число изображений по путям инференса
+    и причины эскалации каскада.
+    """
+    return {
+        "executor": executor.metrics(),
+        "batcher": batcher.metrics(),
+        "startup": runtime.status(),
+        "inference_paths": dict(inference_paths),
+        "escalation_reasons": dict(escalation_reasons),
+    }
+
+
+@router.get("/cache/stats")
+async def read_cache_stats():
+    """
+    Статистика кэша результатов: доля попаданий и занимаемая память.
+    """
+    stats = result_cache.stats()
+    if near_duplicates is not None:
+        stats["near_duplicates"] = near_duplicates.stats()
+    return stats
@@ -1,12 +1,99 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Literal
 
 class Settings(BaseSettings):
     PORT: int = 8001
     PATH_TO_YOLO_SEGMENT_MODEL: str
 
+    # Процессы-воркеры с общими весами (fork после загрузки модели) и потоки torch на пакет
+    # (0 — ядра / (воркеры × INFERENCE_WORKERS))
+    SERVER_WORKERS: int = 1
+    INTRA_OP_THREADS: int = 0
+
+    # Потоки torch между операциями и потоки OpenCV (0 — по умолчанию), привязка воркеров к ядрам ("0-7")
+    INTER_OP_THREADS: int = 0
+    OPENCV_THREADS: int = 0
+    CPU_AFFINITY: str = ""
+
+    # Движок инференса и каталог кэша экспортированных моделей
+    INFERENCE_ENGINE: Literal["torch", "onnx", "openvino"] = "torch"
+    EXPORT_CACHE_DIR: str = "models/exported"
+    INFERENCE_IMGSZ: int = 640
+
+    # Прогрев модели при старте: размеры изображений (ШxВ), число прогонов и фото для прогрева
+    WARMUP_SIZES: List[str] = ["640x480", "480x640"]
+    WARMUP_RUNS: int = 1
+    WARMUP_IMAGE: str = ""
+
+    # Декодирование JPEG в уменьшенном разрешении (draft) сразу под размер входа модели
+    FAST_DECODE: bool = True
+
+    # Тайловый инференс больших фото: сторона декодирования, сторона и перекрытие тайлов,
+    # предел числа тайлов и пороги слияния полигонов на границах тайлов
+    TILING_ENABLED: bool = False
+    TILE_DECODE_MAX_SIDE: int = 2560
+    TILE_SIZE: int = 640
+    TILE_OVERLAP: float = 0.2
+    TILE_MAX_TILES: int = 16
+    TILE_IOU_THRESHOLD: float = 0.5
+    TILE_CONTAINMENT_THRESHOLD: float = 0.7
+
+    # Каскадный инференс: сначала проход с CASCADE_LOW_IMGSZ, затем INFERENCE_IMGSZ или тайлы, если
+    # результат ненадёжен по числу обнаружений, уверенности, размеру или форме масок
+    CASCADE_ENABLED: bool = False
+    CASCADE_LOW_IMGSZ: int = 320
+    CASCADE_MIN_DETECTIONS: int = 1
+    CASCADE_MAX_DETECTIONS: int = 60
+    CASCADE_MIN_MEAN_CONFIDENCE: float = 0.6
+    CASCADE_MIN_MASK_SIDE_PX: float = 12
+    CASCADE_MIN_SOLIDITY: float = 0.85
+
+    # INT8-квантование для CPU: режим, калибровка и допуски проверки точности
+    MODEL_PRECISION: Literal["fp32", "int8"] = "fp32"
+    QUANTIZATION_MODE: Literal["static", "dynamic"] = "static"
+    QUANT_CALIBRATION_DIR: str = "../utils/benchmarks/input/wooden_boards_images"
+    QUANT_CALIBRATION_LIMIT: int = 300
+    QUANT_NODES_TO_EXCLUDE: List[str] = []
+    QUANT_GATE_CONFIDENCE: float = 0.5
+    QUANT_GATE_COUNT_TOLERANCE: float = 0.05
+    QUANT_GATE_VOLUME_TOLERANCE: float = 0.05
+
+    # Микробатчинг: максимальный размер пакета и время ожидания его добора
+    BATCH_MAX_SIZE: int = 16
+    BATCH_MAX_WAIT_MS: float = 20
+    # Максимальное число файлов в одном запросе /detect_seg/batch
+    BATCH_REQUEST_MAX_FILES: int = 32
+
+    # Выделенный пул для декодирования и инференса и размер очереди допуска
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_QUEUE_MAX: int = 64
+    INFERENCE_RETRY_AFTER_SECONDS: int = 1
+    # Период проверки отключения клиента во время обработки запроса
+    DISCONNECT_POLL_MS: float = 100
+
+    # Кэш результатов по SHA-256 изображения: LRU в памяти и опциональный дисковый уровень
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_MAX_MB: int = 256
+    RESULT_CACHE_DIR: str = ""
+    RESULT_CACHE_DISK_MAX_MB: int = 2048
+
+    # Поиск почти совпадающих изображений по dHash (требует кэша результатов)
+    NEAR_DUPLICATE_ENABLED: bool = False
+    NEAR_DUPLICATE_HASH_SIZE: int = 16
+    NEAR_DUPLICATE_MAX_DISTANCE: int = 12
+    NEAR_DUPLICATE_ASPECT_TOLERANCE: float = 0.01
+    NEAR_DUPLICATE_MAX_ENTRIES: int = 10000
+
+    # Приём изображений через общую память от сервиса объёмов на том же хосте и её каталог
+    SHM_ENABLED: bool = False
+    SHM_DIR: str = "/dev/shm"
+
+    # Способ приведения контура к 4 углам для geometry=quad: перебор, бинарный поиск epsilon или по выпуклой оболочке
+    QUAD_FIT_METHOD: Literal["search", "bisection", "hull"] = "search"
+
     class Config:
-        env_file = ".env"  # Основной файл .env
+        # Результат `python main.py calibrate` и основной файл .env (значения из .env важнее)
+        env_file = ("models/cpu_tuning.env", ".env")
         env_file_encoding = "utf-8"
 
 # Инициализация настроек
@@ -1,13 +1,31 @@
+import asyncio
+import logging
+import sys
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from core.settings import settings
 
+# Логгеры сервиса (api.*, services.*) пишут в stderr рядом с логами uvicorn
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
 from api.healthcheck import router as router_healthcheck
-from api.detect_seg import router as router_detect_seg
+from api.detect_seg import configure_cpu, preload, router as router_detect_seg, shutdown, startup
+from api.metrics import router as router_metrics
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Модель загружается фоном: /health отвечает сразу, /ready — после прогрева
+    startup_task = asyncio.create_task(startup())
+    yield
+    startup_task.cancel()
+    await shutdown()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -19,8 +37,27 @@ app.add_middleware(
 
 app.include_router(router_healthcheck)
 app.include_router(router_detect_seg)
+app.include_router(router_metrics)
 
 if __name__ == "__main__":
-    import uvicorn
-
-    uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
+    if sys.argv[1:2] == ["calibrate"]:
+        from services.calibration import calibrate
+
+        # Подбор числа потоков: python main.py calibrate [--images DIR] [--output FILE]
+        calibrate(sys.argv[2:])
+    elif settings.SERVER_WORKERS > 1:
+        from services.prefork import serve_prefork
+
+        # Веса загружаются один раз и разделяются воркерами по copy-on-write
+        serve_prefork(
+            app,
+            host="0.0.0.0",
+            port=settings.PORT,
+            workers=settings.SERVER_WORKERS,
+            preload=preload,
+            on_fork=configure_cpu,
+        )
+    else:
+        import uvicorn
+
+        uvicorn.run(app, host="0.0.0.0", port=settings.PORT)
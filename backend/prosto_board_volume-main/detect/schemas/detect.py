@@ -1,10 +1,58 @@
 from fastapi import UploadFile
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 
 
 class Detection_schema_input(BaseModel):
+    """
+    Входные данные сегментации.
+
+    Атрибуты:
+        file: Изображение для анализа
+        geometry: Форма возвращаемых полигонов: full — все точки маски,
+            simplified — контур, упрощённый с точностью tolerance, quad — 4 угла
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам при geometry=quad; по умолчанию QUAD_FIT_METHOD
+    """
+
     file: UploadFile
+    geometry: Literal["full", "simplified", "quad"] = "full"
+    tolerance: float = Field(1.0, ge=0)
+    quad_fit: Optional[Literal["search", "bisection", "hull"]] = None
+
+
+class Detection_batch_schema_input(BaseModel):
+    """
+    Входные данные пакетной сегментации.
+
+    Атрибуты:
+        files: Изображения для анализа; результаты возвращаются в том же порядке
+        geometry: Форма возвращаемых полигонов, как в Detection_schema_input
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам, как в Detection_schema_input
+    """
+
+    files: List[UploadFile]
+    geometry: Literal["full", "simplified", "quad"] = "full"
+    tolerance: float = Field(1.0, ge=0)
+    quad_fit: Optional[Literal["search", "bisection", "hull"]] = None
+
+
+class Detection_shm_schema_input(BaseModel):
+    """
+    Входные данные сегментации изображения из общей памяти.
+
+    Атрибуты:
+        handle: Имя файла с изображением в SHM_DIR
+        geometry: Форма возвращаемых полигонов, как в Detection_schema_input
+        tolerance: Допустимое отклонение упрощённого контура в пикселях
+        quad_fit: Способ приведения к 4 углам, как в Detection_schema_input
+    """
+
+    handle: str
+    geometry: Literal["full", "simplified", "quad"] = "full"
+    tolerance: float = Field(1.0, ge=0)
+    quad_fit: Optional[Literal["search", "bisection", "hull"]] = None
 
 
 class Point(BaseModel):
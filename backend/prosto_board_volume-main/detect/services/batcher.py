@@ -0,0 +1,221 @@
+import asyncio
+import time
+from typing import Any, Callable, Hashable, List, NamedTuple, Optional
+
+from services.executor import InferenceExecutor
+
+
+class DeadlineExceededError(Exception):
+    """
+    Срок запроса истёк до начала инференса, изображение снято с очереди.
+    """
+
+
+class _Item(NamedTuple):
+    image: Any
+    key: Hashable
+    future: asyncio.Future
+    queued_at: float
+    # Срок запроса (Unix-время в секундах) или None
+    deadline: Optional[float]
+    # Изображение из submit_many: пакет с ним отправляется без добора
+    immediate: bool = False
+
+
+class InferenceBatcher:
+    """
+    Планировщик микропакетов для инференса модели.
+
+    Конкурентные запросы собираются в один пакет, пока не будет набран
+    max_batch_size изображений или не истечёт max_wait_ms с момента прихода
+    первого из них. Пакет прогоняется через модель одним вызовом в пуле
+    executor, а каждый результат возвращается своему вызывающему.
+    Одновременно выполняется не больше пакетов, чем потоков в пуле.
+
+    Каждое изображение ставится в очередь с ключом (например, размером входа
+    модели). В один пакет попадают только изображения с одинаковым ключом,
+    ключ передаётся в predict вторым аргументом.
+
+    Изображения, срок запроса которых истёк к моменту формирования пакета,
+    в модель не попадают: их ожидание завершается DeadlineExceededError.
+
+    Параметры:
+        predict: Функция, принимающая список изображений и ключ и возвращающая список результатов в том же порядке
+        executor: Пул, в котором выполняется инференс
+        max_batch_size: Максимальный размер пакета
+        max_wait_ms: Максимальное время ожидания добора пакета в миллисекундах
+    """
+
+    def __init__(
+        self,
+        predict: Callable[[List[Any], Hashable], List[Any]],
+        executor: InferenceExecutor,
+        max_batch_size: int,
+        max_wait_ms: float,
+    ):
+        self._predict = predict
+        self._executor = executor
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+
+        self._pending: List[_Item] = []
+        self._has_items: asyncio.Event | None = None
+        self._batch_full: asyncio.Event | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._worker: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+        self.expired_total = 0
+        self.cancelled_total = 0
+
+    async def submit(self, image: Any, key: Hashable = None, deadline: Optional[float] = None) -> Any:
+        """
+        Ставит изображение в очередь и ожидает результат инференса для него.
+        """
+        self._ensure_worker()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(_Item(image, key, future, time.monotonic(), deadline))
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+
+        return await future
+
+    async def submit_many(
+        self, images: List[Any], key: Hashable = None, deadline: Optional[float] = None
+    ) -> List[Any]:
+        """
+        Ставит несколько изображений в очередь одним блоком и ожидает результаты в том же порядке.
+
+        Изображения одного запроса уже все на руках, поэтому пакет отправляется
+        в модель сразу, без ожидания max_wait_ms. Блоки больше max_batch_size
+        делятся на несколько пакетов.
+        """
+        if not images:
+            return []
+        self._ensure_worker()
+
+        loop = asyncio.get_running_loop()
+        queued_at = time.monotonic()
+        futures = []
+        for image in images:
+            future = loop.create_future()
+            self._pending.append(_Item(image, key, future, queued_at, deadline, immediate=True))
+            futures.append(future)
+        self._has_items.set()
+        self._batch_full.set()
+
+        try:
+            return list(await asyncio.gather(*futures))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def metrics(self) -> dict:
+        return {
+            "queued": len(self._pending),
+            "expired_total": self.expired_total,
+            "cancelled_total": self.cancelled_total,
+        }
+
+    async def close(self) -> None:
+        """
+        Останавливает фоновый обработчик и отменяет ожидающие запросы.
+        """
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+        for item in self._pending:
+            if not item.future.done():
+                item.future.cancel()
+        self._pending.clear()
+
+    def _ensure_worker(self) -> None:
+        # Фоновая задача создаётся лениво, внутри работающего event loop
+        if self._worker is None or self._worker.done():
+            self._has_items = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._slots = asyncio.Semaphore(self._executor.workers)
+            if self._pending:
+                self._has_items.set()
+            self._worker = asyncio.create_task(self._run())
+
+    def _take_batch(self) -> List[_Item]:
+        # Пакет собирается из самых старых изображений с тем же ключом, что у первого в очереди
+        key = self._pending[0].key
+        batch, rest = [], []
+        for item in self._pending:
+            if item.key == key and len(batch) < self.max_batch_size:
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._pending = rest
+
+        if not self._pending:
+            self._has_items.clear()
+        if len(self._pending) < self.max_batch_size and not any(item.immediate for item in self._pending):
+            self._batch_full.clear()
+
+        # Вызывающие, которые уже отменили ожидание (отключились), и запросы
+        # с истёкшим сроком в пакет не попадают
+        now = time.time()
+        live = []
+        for item in batch:
+            if item.future.done():
+                self.cancelled_total += 1
+            elif item.deadline is not None and item.deadline <= now:
+                self.expired_total += 1
+                item.future.set_exception(DeadlineExceededError("Request deadline exceeded while queued"))
+            else:
+                live.append(item)
+        return live
+
+    async def _run(self) -> None:
+        while True:
+            await self._has_items.wait()
+
+            # Добираем пакет, пока он не заполнится или не истечёт время ожидания,
+            # отсчитанное от прихода самого старого изображения в очереди
+            remaining = self.max_wait - (time.monotonic() - self._pending[0].queued_at)
+            if len(self._pending) < self.max_batch_size and remaining > 0:
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            # Пока все потоки пула заняты, запросы продолжают копиться в очереди
+            await self._slots.acquire()
+            batch = self._take_batch()
+            if not batch:
+                self._slots.release()
+                continue
+
+            task = asyncio.create_task(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch: List[_Item]) -> None:
+        try:
+            results = await self._executor.run(
+                self._predict,
+                [item.image for item in batch],
+                batch[0].key,
+                queued_at=[item.queued_at for item in batch],
+            )
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        finally:
+            self._slots.release()
+
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result(result)
@@ -0,0 +1,178 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+from core.settings import settings
+from services.cpu import apply_cpu_settings, available_cpus, worker_cpus
+from services.preprocess import decode_image
+from services.quantization import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+# Настройки, которые перебирает калибровка
+TUNED_SETTINGS = ("INTRA_OP_THREADS", "INTER_OP_THREADS", "OPENCV_THREADS")
+
+
+def load_image_bytes(images_dir: str, limit: int) -> List[bytes]:
+    images = []
+    for filename in sorted(os.listdir(images_dir)):
+        if filename.lower().endswith(IMAGE_EXTENSIONS):
+            with open(os.path.join(images_dir, filename), "rb") as f:
+                images.append(f.read())
+        if len(images) >= limit:
+            break
+
+    if not images:
+        raise ValueError(f"No benchmark images found in {images_dir}")
+    return images
+
+
+def measure(images_dir: str, limit: int, repeats: int) -> dict:
+    """
+    Замеряет пропускную способность одного воркера с текущими настройками.
+
+    Выполняется в отдельном процессе: число inter-op потоков torch можно
+    задать только до первой параллельной работы. Воркер привязывается к
+    своей доле ядер (как воркер 0 при SERVER_WORKERS), чтобы замер учитывал
+    соседние воркеры. Замеряются декодирование и инференс батчами
+    BATCH_MAX_SIZE, которые, как в сервисе, выполняются одновременно
+    INFERENCE_WORKERS потоками; первый проход — прогрев.
+    """
+    from api.detect_seg import load_model
+
+    config = apply_cpu_settings(
+        workers=settings.SERVER_WORKERS,
+        index=0,
+        affinity=settings.CPU_AFFINITY or ",".join(map(str, available_cpus())),
+        intra_op_threads=settings.INTRA_OP_THREADS,
+        inter_op_threads=settings.INTER_OP_THREADS,
+        opencv_threads=settings.OPENCV_THREADS,
+        pool_threads=settings.INFERENCE_WORKERS,
+    )
+    model = load_model()
+    images = load_image_bytes(images_dir, limit)
+    max_side = settings.INFERENCE_IMGSZ if settings.FAST_DECODE else None
+
+    batches = [images[start : start + settings.BATCH_MAX_SIZE] for start in range(0, len(images), settings.BATCH_MAX_SIZE)]
+
+    def run_batch(batch: List[bytes]) -> None:
+        model([decode_image(data, max_side).image for data in batch], imgsz=settings.INFERENCE_IMGSZ, verbose=False)
+
+    with ThreadPoolExecutor(max_workers=max(1, settings.INFERENCE_WORKERS)) as pool:
+        list(pool.map(run_batch, batches))
+        started = time.perf_counter()
+        for _ in range(repeats):
+            list(pool.map(run_batch, batches))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "images_per_second": len(images) * repeats / elapsed,
+        "cpus": config.cpus,
+    }
+
+
+def candidate_configs(cores: int, intra: Optional[List[int]], inter: Optional[List[int]], opencv: Optional[List[int]]) -> List[dict]:
+    """
+    Сетка настроек для перебора. По умолчанию: intra-op потоки — степени
+    двойки до числа ядер воркера на поток пула (INFERENCE_WORKERS) и само
+    это число, inter-op — 1 и 2, OpenCV — 1 и число ядер воркера.
+    """
+    if not intra:
+        per_batch = max(1, cores // max(1, settings.INFERENCE_WORKERS))
+        intra = sorted({2**i for i in range(per_batch.bit_length()) if 2**i <= per_batch} | {per_batch})
+    if not inter:
+        inter = [1, 2]
+    if not opencv:
+        opencv = sorted({1, cores})
+    return [dict(zip(TUNED_SETTINGS, values)) for values in itertools.product(intra, inter, opencv)]
+
+
+def run_config(config: dict, images_dir: str, limit: int, repeats: int) -> Optional[dict]:
+    env = dict(
+        os.environ,
+        RESULT_CACHE_ENABLED="false",
+        NEAR_DUPLICATE_ENABLED="false",
+        **{name: str(value) for name, value in config.items()},
+    )
+    command = [
+        sys.executable, "main.py", "calibrate", "--measure",
+        "--images", images_dir, "--limit", str(limit), "--repeats", str(repeats),
+    ]
+    completed = subprocess.run(
+        command,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env=env,
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    if completed.returncode != 0 or not completed.stdout.strip():
+        logger.warning("Calibration run %s failed with status %s", config, completed.returncode)
+        return None
+    # Результат — последняя строка вывода: модель может печатать свои сообщения
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def write_env(path: str, config: dict, result: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    lines = [
+        f"# Generated by `python main.py calibrate` at {datetime.now().isoformat(timespec='seconds')}",
+        f"# {result['images_per_second']:.2f} images/s per worker, SERVER_WORKERS={settings.SERVER_WORKERS}, "
+        f"INFERENCE_WORKERS={settings.INFERENCE_WORKERS}, engine={settings.INFERENCE_ENGINE}, precision={settings.MODEL_PRECISION}",
+    ]
+    lines += [f"{name}={value}" for name, value in config.items()]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def calibrate(argv: List[str]) -> None:
+    """
+    Команда `python main.py calibrate`: прогоняет изображения при разных
+    настройках потоков и записывает самую быструю в файл настроек.
+    """
+    parser = argparse.ArgumentParser(prog="main.py calibrate", description="Подбор числа потоков torch и OpenCV")
+    parser.add_argument("--images", default=settings.QUANT_CALIBRATION_DIR)
+    parser.add_argument("--limit", type=int, default=32)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--intra", type=int, nargs="*")
+    parser.add_argument("--inter", type=int, nargs="*")
+    parser.add_argument("--opencv", type=int, nargs="*")
+    parser.add_argument("--output", default="models/cpu_tuning.env")
+    parser.add_argument("--measure", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.measure:
+        print(json.dumps(measure(args.images, args.limit, args.repeats)))
+        return
+
+    cpus = available_cpus()
+    cores = len(worker_cpus(cpus, settings.SERVER_WORKERS, 0))
+    configs = candidate_configs(cores, args.intra, args.inter, args.opencv)
+    print(
+        f"Ядер: {len(cpus)}, воркеров: {settings.SERVER_WORKERS}, ядер на воркер: {cores}, "
+        f"потоков пула: {settings.INFERENCE_WORKERS}, конфигураций: {len(configs)}"
+    )
+
+    best = None
+    for config in configs:
+        result = run_config(config, args.images, args.limit, args.repeats)
+        name = ", ".join(f"{key}={value}" for key, value in config.items())
+        if result is None:
+            print(f"{name}: ошибка")
+            continue
+        print(f"{name}: {result['images_per_second']:.2f} изобр./с")
+        if best is None or result["images_per_second"] > best[1]["images_per_second"]:
+            best = (config, result)
+
+    if best is None:
+        raise SystemExit("Ни одна конфигурация не отработала")
+
+    write_env(args.output, *best)
+    print(f"Лучшая конфигурация записана в {args.output}: {best[0]} ({best[1]['images_per_second']:.2f} изобр./с)")
@@ -0,0 +1,76 @@
+from typing import NamedTuple, Optional
+
+import cv2
+import numpy as np
+
+from services.packed_detections import PackedDetections
+
+
+class CascadeThresholds(NamedTuple):
+    """
+    Пороги, при которых результат прохода в низком разрешении считается
+    ненадёжным и изображение обрабатывается повторно.
+
+    Атрибуты:
+        min_detections: Меньше обнаружений — доски, вероятно, пропущены
+        max_detections: Больше обнаружений — плотный штабель мелких торцов
+        min_mean_confidence: Средняя уверенность ниже порога
+        min_mask_side_px: Медианная сторона маски (корень из площади) во входе модели меньше порога
+        min_solidity: Средняя плотность масок (площадь / площадь выпуклой оболочки) ниже порога
+    """
+
+    min_detections: int
+    max_detections: int
+    min_mean_confidence: float
+    min_mask_side_px: float
+    min_solidity: float
+
+
+def escalation_reason(
+    packed: PackedDetections,
+    image_size: tuple,
+    imgsz: int,
+    thresholds: CascadeThresholds,
+) -> Optional[str]:
+    """
+    Причина повторить инференс в высоком разрешении или None, если
+    результата прохода в низком разрешении достаточно.
+
+    Параметры:
+        packed: Результат прохода в низком разрешении в координатах image_size
+        image_size: (ширина, высота) изображения, поданного в модель
+        imgsz: Размер входа модели в проходе низкого разрешения
+        thresholds: Пороги эскалации
+
+    Возвращает:
+        Optional[str]: few_detections, many_detections, low_confidence, small_masks, mask_quality или None
+    """
+    count = len(packed.confidences)
+    if count < thresholds.min_detections:
+        return "few_detections"
+    if count > thresholds.max_detections:
+        return "many_detections"
+    if count == 0:
+        return None
+    if float(np.mean(packed.confidences)) < thresholds.min_mean_confidence:
+        return "low_confidence"
+
+    areas = []
+    solidities = []
+    for polygon in packed.polygons():
+        if len(polygon) < 3:
+            continue
+        area = abs(cv2.contourArea(polygon))
+        hull_area = cv2.contourArea(cv2.convexHull(polygon))
+        areas.append(area)
+        solidities.append(area / hull_area if hull_area > 0 else 0.0)
+    if not areas:
+        return "mask_quality"
+
+    # Координаты изображения переводятся в пиксели входа модели
+    input_scale = imgsz / max(image_size)
+    if float(np.sqrt(np.median(areas))) * input_scale < thresholds.min_mask_side_px:
+        return "small_masks"
+    if float(np.mean(solidities)) < thresholds.min_solidity:
+        return "mask_quality"
+    return None
@@ -0,0 +1,155 @@
+import logging
+import os
+from typing import List, NamedTuple
+
+logger = logging.getLogger(__name__)
+
+
+class CpuConfig(NamedTuple):
+    """
+    Применённые настройки потоков и привязки к ядрам воркера.
+
+    Атрибуты:
+        cpus: Ядра, к которым привязан воркер (пусто — без привязки)
+        intra_op_threads: Потоки torch внутри одной операции
+        inter_op_threads: Потоки torch между независимыми операциями (0 — по умолчанию torch)
+        opencv_threads: Потоки OpenCV (0 — по умолчанию OpenCV)
+    """
+
+    cpus: List[int]
+    intra_op_threads: int
+    inter_op_threads: int
+    opencv_threads: int
+
+
+def available_cpus() -> List[int]:
+    """
+    Ядра, доступные процессу (с учётом cpuset контейнера).
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def available_cores() -> int:
+    return len(available_cpus())
+
+
+def default_threads(workers: int, pool_threads: int = 1) -> int:
+    """
+    Потоков внутри операций на пакет, чтобы пакеты, одновременно выполняемые
+    pool_threads потоками пула в каждом из воркеров, вместе не превышали число ядер.
+    """
+    return max(1, available_cores() // (max(1, workers) * max(1, pool_threads)))
+
+
+def parse_cpu_list(value: str) -> List[int]:
+    """
+    Разбирает список ядер в формате taskset/cpuset: "0-3,8,10-11".
+    """
+    cpus = set()
+    for part in value.replace(" ", "").split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def worker_cpus(cpus: List[int], workers: int, index: int) -> List[int]:
+    """
+    Доля ядер воркера index: ядра делятся между воркерами на непересекающиеся
+    непрерывные части. Если ядер меньше, чем воркеров, воркеры делят их по кругу.
+    """
+    workers = max(1, workers)
+    if len(cpus) < workers:
+        return [cpus[index % len(cpus)]]
+    share = len(cpus) // workers
+    return cpus[index * share : (index + 1) * share]
+
+
+def set_intra_op_threads(threads: int) -> None:
+    """
+    Задаёт число потоков, которыми torch выполняет одну операцию, через
+    torch.set_num_threads: OMP_NUM_THREADS после импорта torch уже не действует.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(threads)
+
+
+def set_inter_op_threads(threads: int) -> None:
+    """
+    Задаёт число потоков torch для независимых операций. torch позволяет
+    сделать это только до первой параллельной работы, поздний вызов пропускается.
+    """
+    try:
+        import torch
+    except ImportError:
+        return
+    try:
+        torch.set_num_interop_threads(threads)
+    except RuntimeError as e:
+        logger.warning("Cannot set inter-op threads to %s: %s", threads, e)
+
+
+def set_opencv_threads(threads: int) -> None:
+    import cv2
+
+    cv2.setNumThreads(threads)
+
+
+def apply_cpu_settings(
+    workers: int,
+    index: int,
+    affinity: str = "",
+    intra_op_threads: int = 0,
+    inter_op_threads: int = 0,
+    opencv_threads: int = 0,
+    pool_threads: int = 1,
+) -> CpuConfig:
+    """
+    Применяет привязку к ядрам и число потоков для воркера index из workers.
+
+    Вызывается в процессе воркера до запуска пулов потоков: привязка
+    наследуется потоками, созданными позже.
+
+    Параметры:
+        workers: Число процессов-воркеров
+        index: Номер текущего воркера
+        affinity: Ядра для всех воркеров в формате "0-3,8"; пусто — без привязки
+        intra_op_threads: Потоки torch внутри операции; 0 — ядра воркера, поделённые между потоками пула
+        inter_op_threads: Потоки torch между операциями; 0 — по умолчанию torch
+        opencv_threads: Потоки OpenCV; 0 — по умолчанию OpenCV
+        pool_threads: Потоки пула инференса воркера; каждый выполняет свой пакет
+            с intra_op_threads потоками torch
+
+    Возвращает:
+        CpuConfig: Фактически применённые настройки
+    """
+    cpus: List[int] = []
+    if affinity:
+        cpus = worker_cpus(parse_cpu_list(affinity), workers, index)
+        os.sched_setaffinity(0, cpus)
+
+    pool_threads = max(1, pool_threads)
+    if intra_op_threads <= 0 and (cpus or workers > 1 or pool_threads > 1):
+        if cpus:
+            intra_op_threads = max(1, len(cpus) // pool_threads)
+        else:
+            intra_op_threads = default_threads(workers, pool_threads)
+    if intra_op_threads > 0:
+        set_intra_op_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        set_inter_op_threads(inter_op_threads)
+    if opencv_threads > 0:
+        set_opencv_threads(opencv_threads)
+
+    config = CpuConfig(cpus, intra_op_threads, inter_op_threads, opencv_threads)
+    logger.info("Worker %s CPU settings: %s", index, config)
+    return config
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator, Sequence
+
+from services.metrics import LatencyStats
+
+
+class QueueFullError(Exception):
+    """
+    Очередь допуска заполнена, запрос нужно отклонить.
+    """
+
+
+class InferenceExecutor:
+    """
+    Выделенный пул потоков для декодирования изображений и инференса.
+
+    Тяжёлая синхронная работа выполняется вне event loop, поэтому
+    healthcheck и остальные запросы воркера не блокируются. Число запросов,
+    одновременно находящихся в обработке, ограничено max_queue: сверх этого
+    лимита admit() сразу выбрасывает QueueFullError.
+
+    Параметры:
+        workers: Число потоков пула
+        max_queue: Максимальное число допущенных запросов (ожидающих и выполняющихся)
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="inference"
+        )
+        self._lock = threading.Lock()
+
+        self.admitted = 0
+        self.pending_tasks = 0
+        self.rejected_total = 0
+        self.wait_time = LatencyStats()
+        self.run_time = LatencyStats()
+
+    @contextmanager
+    def admit(self, slots: int = 1) -> Iterator[None]:
+        """
+        Резервирует места в очереди допуска на время обработки запроса.
+        """
+        with self._lock:
+            if self.admitted + slots > self.max_queue:
+                self.rejected_total += 1
+                raise QueueFullError(
+                    f"Inference queue is full ({self.admitted}/{self.max_queue})"
+                )
+            self.admitted += slots
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.admitted -= slots
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        queued_at: Sequence[float] = (),
+    ) -> Any:
+        """
+        Выполняет fn(*args) в пуле и учитывает время ожидания и выполнения.
+
+        queued_at: Моменты (time.monotonic) постановки в очередь исходных запросов.
+            Если не заданы, ожиданием считается время от вызова run до старта задачи.
+        """
+        submitted = time.monotonic()
+
+        def task() -> Any:
+            started = time.monotonic()
+            with self._lock:
+                self.pending_tasks -= 1
+            for since in queued_at or (submitted,):
+                self.wait_time.observe(started - since)
+            try:
+                return fn(*args)
+            finally:
+                self.run_time.observe(time.monotonic() - started)
+
+        with self._lock:
+            self.pending_tasks += 1
+        return await asyncio.get_running_loop().run_in_executor(self._pool, task)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def metrics(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.admitted,
+            "queue_capacity": self.max_queue,
+            "pending_tasks": self.pending_tasks,
+            "rejected_total": self.rejected_total,
+            "wait_time": self.wait_time.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
@@ -0,0 +1,198 @@
+from typing import Optional
+
+import cv2
+import numpy as np
+
+# Классы, которые сервис wooden_boards_volume_seg считает досками
+BOARD_CLASS_NAMES = ("wood", "wooden", "board", "timber", "lumber")
+
+
+# Способы приведения контура к 4 углам (QUAD_FIT_METHOD):
+# search — перебор 20 значений epsilon для approxPolyDP по контуру и по оболочке,
+# bisection — удвоение и бинарный поиск epsilon на том же отрезке,
+# hull — четырёхугольник наибольшей площади с вершинами на выпуклой оболочке
+QUAD_FIT_METHODS = ("search", "bisection", "hull")
+
+# Диапазон epsilon для approxPolyDP, доля периметра
+_EPS_LOW = 0.01
+_EPS_HIGH = 0.2
+# Точность бинарного поиска: половина шага сетки перебора (0.01)
+_BISECTION_TOLERANCE = 0.005
+# Предел числа вершин оболочки: перебор пар вершин занимает O(n³)
+_MAX_HULL_POINTS = 48
+
+
+def _approx_quad_search(curve: np.ndarray) -> Optional[np.ndarray]:
+    perimeter = cv2.arcLength(curve, True)
+    for eps_factor in np.linspace(_EPS_LOW, _EPS_HIGH, 20):
+        approx = cv2.approxPolyDP(curve, eps_factor * perimeter, True)
+        if len(approx) == 4:
+            return approx.reshape(-1, 2)
+    return None
+
+
+def _approx_quad_bisection(curve: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Наименьший epsilon, при котором у контура остаётся не больше 4 вершин.
+
+    Число вершин approxPolyDP почти всегда не растёт с epsilon. Epsilon
+    удваивается от _EPS_LOW, пока вершин больше 4, а затем граница
+    уточняется бинарным поиском до _BISECTION_TOLERANCE. Обычно хватает
+    1–3 вызовов, как и перебору, но контур, у которого ровно 4 вершин не
+    бывает, отсеивается за 6 вызовов вместо 20. Результат совпадает с
+    первым подходящим шагом перебора.
+    """
+    perimeter = cv2.arcLength(curve, True)
+    eps_low = None
+    eps_high = _EPS_LOW
+    approx = cv2.approxPolyDP(curve, eps_high * perimeter, True)
+    while len(approx) > 4:
+        if eps_high >= _EPS_HIGH:
+            return None
+        eps_low, eps_high = eps_high, min(2 * eps_high, _EPS_HIGH)
+        approx = cv2.approxPolyDP(curve, eps_high * perimeter, True)
+
+    if eps_low is not None:
+        while eps_high - eps_low > _BISECTION_TOLERANCE:
+            eps_mid = (eps_low + eps_high) / 2
+            candidate = cv2.approxPolyDP(curve, eps_mid * perimeter, True)
+            if len(candidate) > 4:
+                eps_low = eps_mid
+            else:
+                eps_high, approx = eps_mid, candidate
+    return approx.reshape(-1, 2) if len(approx) == 4 else None
+
+
+def _max_area_quad(curve: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Четырёхугольник наибольшей площади с вершинами среди вершин выпуклой оболочки.
+
+    Контур сначала упрощается с наименьшим epsilon: оболочка нескольких
+    десятков точек строится быстрее, чем по всем точкам маски, а углы
+    сохраняются. Для каждой диагонали (i, j) лучшие две другие вершины —
+    самые далёкие от неё по обе стороны, а площадь — разность максимума и
+    минимума векторного произведения. Все диагонали считаются одной
+    операцией NumPy.
+    """
+    perimeter = cv2.arcLength(curve, True)
+    hull = cv2.convexHull(cv2.approxPolyDP(curve, _EPS_LOW * perimeter, True))
+    eps_factor = 2 * _EPS_LOW
+    while len(hull) > _MAX_HULL_POINTS:
+        hull = cv2.approxPolyDP(hull, eps_factor * perimeter, True)
+        eps_factor *= 2
+
+    points = hull.reshape(-1, 2).astype(np.float64)
+    if len(points) < 4:
+        return None
+    if len(points) == 4:
+        return points.astype(np.float32)
+
+    # rel[i, k] = P[k] - P[i]; cross[i, j, k] = (P[j] - P[i]) x (P[k] - P[i])
+    rel = points[None, :, :] - points[:, None, :]
+    cross = rel[:, :, None, 0] * rel[:, None, :, 1] - rel[:, :, None, 1] * rel[:, None, :, 0]
+    areas = cross.max(axis=2) - cross.min(axis=2)
+    i, j = np.unravel_index(np.argmax(areas), areas.shape)
+    corners = sorted({int(i), int(j), int(np.argmax(cross[i, j])), int(np.argmin(cross[i, j]))})
+    if len(corners) < 4:
+        return None
+    return points[corners].astype(np.float32)
+
+
+def optimize_quad_points(points_array: np.ndarray, method: str = "search") -> np.ndarray:
+    """
+    Приводит контур к 4 угловым точкам. Способ search совпадает с сервисом
+    wooden_boards_volume_seg: approxPolyDP по контуру, затем по выпуклой
+    оболочке, и minAreaRect как запасной вариант. bisection ищет epsilon
+    бинарным поиском, hull строит четырёхугольник наибольшей площади на
+    выпуклой оболочке (см. QUAD_FIT_METHODS).
+
+    Параметры:
+        points_array: Массив формы (n, 2) с точками контура
+        method: Способ из QUAD_FIT_METHODS
+
+    Возвращает:
+        np.ndarray: Массив формы (4, 2) с угловыми точками
+    """
+    if len(points_array) == 4:
+        return points_array
+
+    points_reshaped = points_array.reshape(-1, 1, 2).astype(np.float32)
+
+    if method == "hull":
+        quad = _max_area_quad(points_reshaped)
+    elif method == "bisection":
+        quad = _approx_quad_bisection(points_reshaped)
+        if quad is None:
+            quad = _approx_quad_bisection(cv2.convexHull(points_reshaped))
+    elif method == "search":
+        quad = _approx_quad_search(points_reshaped)
+        if quad is None:
+            quad = _approx_quad_search(cv2.convexHull(points_reshaped))
+    else:
+        raise ValueError(f"Unknown quad fit method: {method}")
+
+    if quad is not None:
+        return quad
+    return cv2.boxPoints(cv2.minAreaRect(points_reshaped))
+
+
+def order_points_consistently(points: np.ndarray) -> np.ndarray:
+    """
+    Упорядочивает 4 точки по кругу, начиная с точки с минимальной суммой x + y.
+    """
+    centroid = np.mean(points, axis=0)
+    angles = np.arctan2(points[:, 1] - centroid[1], points[:, 0] - centroid[0])
+    ordered = points[np.argsort(angles)]
+    return np.roll(ordered, -np.argmin(np.sum(ordered, axis=1)), axis=0)
+
+
+def simplify_polygon(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Упрощает замкнутый контур алгоритмом Дугласа — Пекера (cv2.approxPolyDP).
+
+    Параметры:
+        points: Массив формы (n, 2) с точками контура
+        tolerance: Максимальное отклонение упрощённого контура от исходного в пикселях
+
+    Возвращает:
+        np.ndarray: Массив формы (m, 2), m <= n; не меньше 3 точек, если их было не меньше 3
+    """
+    if tolerance <= 0 or len(points) <= 4:
+        return points
+
+    approx = cv2.approxPolyDP(points.reshape(-1, 1, 2).astype(np.float32), tolerance, True)
+    if len(approx) < 3:
+        return points
+    return approx.reshape(-1, 2)
+
+
+def fit_quad(points: np.ndarray, method: str = "search") -> np.ndarray:
+    """
+    Четыре угла доски в том же порядке, в котором их получает
+    wooden_boards_volume_seg: optimize_quad_points и order_points_consistently.
+
+    Контуры меньше чем из 3 точек возвращаются без изменений.
+    """
+    if len(points) < 3:
+        return points
+    return order_points_consistently(optimize_quad_points(points.astype(np.float32), method))
+
+
+def board_volume(quad: np.ndarray, height: float = 1.0, length: float = 1.0) -> float:
+    """
+    Объём доски по четырёхугольнику так же, как в wooden_boards_volume_seg:
+    меньшая сторона соответствует известной высоте доски.
+
+    Возвращает 0 для вырожденных четырёхугольников.
+    """
+    quad = np.asarray(quad, dtype=np.float64)
+    sides = np.linalg.norm(np.roll(quad, -1, axis=0) - quad, axis=1)
+    if np.any(sides <= 0):
+        return 0.0
+
+    width_px = (sides[0] + sides[2]) / 2
+    height_px = (sides[1] + sides[3]) / 2
+    width_px, height_px = max(width_px, height_px), min(width_px, height_px)
+
+    ratio = height / height_px
+    return round(float(width_px * ratio * height_px * ratio * length), 6)
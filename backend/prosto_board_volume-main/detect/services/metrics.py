@@ -0,0 +1,46 @@
+import threading
+from collections import deque
+
+
+class LatencyStats:
+    """
+    Потокобезопасная статистика длительностей в секундах.
+
+    Хранит общие счётчики и скользящее окно последних наблюдений
+    для расчёта перцентилей.
+    """
+
+    def __init__(self, window: int = 1024):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        with self._lock:
+            self._recent.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Возвращает статистику в миллисекундах.
+        """
+        with self._lock:
+            recent = sorted(self._recent)
+            count, total, maximum = self.count, self.total, self.max
+
+        def percentile(q: float) -> float:
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(q * len(recent)))] * 1000
+
+        return {
+            "count": count,
+            "avg_ms": total / count * 1000 if count else 0.0,
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "max_ms": maximum * 1000,
+        }
@@ -0,0 +1,83 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+
+from ultralytics import YOLO
+
+# Формат экспорта ultralytics и суффикс результата для каждого движка
+ENGINE_FORMATS = {
+    "onnx": ("onnx", ".onnx"),
+    "openvino": ("openvino", "_openvino_model"),
+}
+
+
+def model_fingerprint(model_path: str) -> str:
+    """
+    Короткий отпечаток файла весов: при замене весов экспорт выполняется заново.
+    """
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def export_model(model_path: str, engine: str, cache_dir: str, imgsz: int) -> Path:
+    """
+    Экспортирует PyTorch-модель в формат движка и кэширует результат.
+
+    Экспорт выполняется один раз: имя результата содержит отпечаток весов
+    и размер входа, поэтому при повторном запуске используется готовая модель.
+
+    Возвращает:
+        Path: Путь к экспортированной модели в cache_dir
+    """
+    export_format, suffix = ENGINE_FORMATS[engine]
+    stem = f"{Path(model_path).stem}-{model_fingerprint(model_path)}-{imgsz}"
+
+    cache = Path(cache_dir)
+    target = cache / f"{stem}{suffix}"
+    if target.exists():
+        return target
+
+    cache.mkdir(parents=True, exist_ok=True)
+
+    # Ultralytics кладёт результат рядом с весами, поэтому экспортируем из
+    # временной копии и переименовываем готовый результат атомарно
+    tmp_weights = cache / f"{stem}.tmp{os.getpid()}.pt"
+    shutil.copyfile(model_path, tmp_weights)
+    try:
+        exported = YOLO(str(tmp_weights), task="segment").export(
+            format=export_format,
+            imgsz=imgsz,
+            dynamic=True,
+            device="cpu",
+        )
+        os.replace(Path(exported), target)
+    finally:
+        tmp_weights.unlink(missing_ok=True)
+
+    return target
+
+
+def load_segment_model(model_path: str, engine: str, cache_dir: str, imgsz: int) -> YOLO:
+    """
+    Загружает модель сегментации для выбранного движка инференса.
+
+    Параметры:
+        model_path: Путь к весам PyTorch (*.pt)
+        engine: Движок инференса: torch, onnx или openvino
+        cache_dir: Каталог для кэша экспортированных моделей
+        imgsz: Размер входа модели
+
+    Возвращает:
+        YOLO: Модель с единым интерфейсом ultralytics для любого движка
+    """
+    if engine == "torch":
+        return YOLO(model_path, task="segment")
+
+    if engine not in ENGINE_FORMATS:
+        raise ValueError(f"Unknown inference engine: {engine}")
+
+    return YOLO(str(export_model(model_path, engine, cache_dir, imgsz)), task="segment")
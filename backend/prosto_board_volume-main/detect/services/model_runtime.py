@@ -0,0 +1,90 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from services.cpu import CpuConfig
+
+logger = logging.getLogger(__name__)
+
+
+def parse_size(value: str) -> Tuple[int, int]:
+    """
+    Разбирает размер вида "640x480" в (ширина, высота).
+    """
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def warmup_images(sizes: List[str], image_path: str = "") -> List[Image.Image]:
+    """
+    Изображения для прогрева модели заданных размеров.
+
+    Если задан image_path, используется это фото (с настоящими досками
+    прогревается и постобработка масок), иначе — шум.
+    """
+    source = None
+    if image_path:
+        with Image.open(image_path) as image:
+            source = image.convert("RGB")
+
+    images = []
+    rng = np.random.default_rng(0)
+    for size in sizes:
+        width, height = parse_size(size)
+        if source is not None:
+            images.append(source.resize((width, height), Image.BILINEAR))
+        else:
+            images.append(Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)))
+    return images
+
+
+class ModelRuntime:
+    """
+    Состояние модели сегментации, которая загружается при старте приложения,
+    а не при импорте модуля.
+
+    Пока модель не загружена и не прогрета, ready равен False: /ready
+    отвечает 503, а запросы на сегментацию отклоняются. Длительность каждой
+    фазы запуска сохраняется в timings и пишется в лог.
+    """
+
+    def __init__(self):
+        self.model: Any = None
+        self.cpu: Optional[CpuConfig] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._created = time.monotonic()
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """
+        Замеряет длительность фазы запуска.
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.monotonic() - started
+            logger.info("Startup phase %s: %.1f ms", name, self.timings[name] * 1000)
+
+    def mark_ready(self) -> None:
+        self.timings["total"] = time.monotonic() - self._created
+        self.ready = True
+        logger.info("Model is ready in %.1f ms", self.timings["total"] * 1000)
+
+    def mark_failed(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+        logger.error("Model startup failed: %s", self.error, exc_info=error)
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in self.timings.items()},
+            "cpu": self.cpu._asdict() if self.cpu is not None else None,
+        }
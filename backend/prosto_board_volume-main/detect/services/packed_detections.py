@@ -0,0 +1,178 @@
+import struct
+from typing import Callable, List, NamedTuple, Sequence, Tuple
+
+import numpy as np
+
+# Тип содержимого бинарного ответа /detect_seg/ и /detect_seg/batch
+PACKED_MEDIA_TYPE = "application/vnd.prosto-board.detections"
+PACKED_BATCH_MEDIA_TYPE = "application/vnd.prosto-board.detections-batch"
+
+# Заголовок: сигнатура, версия, зарезервировано, число обнаружений, число вершин
+_HEADER = struct.Struct("<4sHHII")
+_MAGIC = b"PBDS"
+_VERSION = 1
+
+# Заголовок пакета ответов: сигнатура, версия, зарезервировано, число изображений
+_BATCH_HEADER = struct.Struct("<4sHHI")
+_BATCH_MAGIC = b"PBDB"
+
+
+class PackedDetections(NamedTuple):
+    """
+    Результаты сегментации в виде плотных массивов без объекта на каждую вершину.
+
+    Полигон i — это points[offsets[i]:offsets[i + 1]].
+
+    Атрибуты:
+        confidences: float32 (n,) — уверенность модели
+        class_ids: uint32 (n,) — индекс в class_names
+        offsets: uint32 (n + 1,) — границы полигонов в points
+        points: float32 (v, 2) — вершины всех полигонов подряд
+        class_names: Таблица имён классов
+    """
+
+    confidences: np.ndarray
+    class_ids: np.ndarray
+    offsets: np.ndarray
+    points: np.ndarray
+    class_names: Tuple[str, ...]
+
+    @classmethod
+    def from_polygons(
+        cls, confidences: Sequence[float], class_names: Sequence[str], polygons: Sequence[np.ndarray]
+    ) -> "PackedDetections":
+        """
+        Собирает PackedDetections из списков уверенностей, имён классов и полигонов.
+        """
+        table = tuple(dict.fromkeys(class_names))
+        index = {name: i for i, name in enumerate(table)}
+
+        offsets = np.zeros(len(polygons) + 1, dtype=np.uint32)
+        offsets[1:] = np.cumsum([len(polygon) for polygon in polygons])
+        points = (
+            np.concatenate([np.asarray(polygon, dtype=np.float32).reshape(-1, 2) for polygon in polygons])
+            if polygons
+            else np.empty((0, 2), dtype=np.float32)
+        )
+
+        return cls(
+            confidences=np.asarray(confidences, dtype=np.float32).reshape(-1),
+            class_ids=np.fromiter((index[name] for name in class_names), dtype=np.uint32, count=len(class_names)),
+            offsets=offsets,
+            points=points,
+            class_names=table,
+        )
+
+    def polygons(self) -> List[np.ndarray]:
+        """
+        Полигоны как представления (без копирования) массива points.
+        """
+        return np.split(self.points, self.offsets[1:-1])
+
+    def class_name(self, i: int) -> str:
+        return self.class_names[self.class_ids[i]]
+
+    def scaled(self, scale_x: float, scale_y: float) -> "PackedDetections":
+        """
+        Копия с координатами, масштабированными под другое разрешение изображения.
+        """
+        points = (self.points * np.array([scale_x, scale_y])).astype(np.float32)
+        return self._replace(points=points)
+
+    def map_polygons(self, fn: Callable[[np.ndarray], np.ndarray]) -> "PackedDetections":
+        """
+        Копия, в которой каждый полигон заменён результатом fn(полигон).
+        """
+        names = [self.class_name(i) for i in range(len(self.confidences))]
+        return PackedDetections.from_polygons(self.confidences, names, [fn(p) for p in self.polygons()])
+
+    def to_bytes(self) -> bytes:
+        """
+        Бинарное представление (little-endian, все секции выровнены на 4 байта):
+
+            заголовок   <4sHHII: b"PBDS", версия, 0, n, v
+            confidences float32[n]
+            class_ids   uint32[n]
+            offsets     uint32[n + 1]
+            points      float32[v * 2]
+            имена       uint32 длина, UTF-8 имена через "\\n", дополнение нулями до 4 байт
+        """
+        names = "\n".join(self.class_names).encode("utf-8")
+        padding = b"\0" * (-len(names) % 4)
+        return b"".join(
+            (
+                _HEADER.pack(_MAGIC, _VERSION, 0, len(self.confidences), len(self.points)),
+                self.confidences.astype("<f4", copy=False).tobytes(),
+                self.class_ids.astype("<u4", copy=False).tobytes(),
+                self.offsets.astype("<u4", copy=False).tobytes(),
+                self.points.astype("<f4", copy=False).tobytes(),
+                struct.pack("<I", len(names)),
+                names,
+                padding,
+            )
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "PackedDetections":
+        """
+        Разбирает to_bytes без копирования: массивы ссылаются на data и доступны только для чтения.
+        """
+        magic, version, _, count, vertices = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"Неподдерживаемый формат обнаружений: {magic!r} v{version}")
+
+        offset = _HEADER.size
+        confidences = np.frombuffer(data, dtype="<f4", count=count, offset=offset)
+        offset += 4 * count
+        class_ids = np.frombuffer(data, dtype="<u4", count=count, offset=offset)
+        offset += 4 * count
+        offsets = np.frombuffer(data, dtype="<u4", count=count + 1, offset=offset)
+        offset += 4 * (count + 1)
+        points = np.frombuffer(data, dtype="<f4", count=2 * vertices, offset=offset).reshape(-1, 2)
+        offset += 8 * vertices
+        (names_length,) = struct.unpack_from("<I", data, offset)
+        names = bytes(data[offset + 4 : offset + 4 + names_length]).decode("utf-8")
+
+        return cls(
+            confidences=confidences,
+            class_ids=class_ids,
+            offsets=offsets,
+            points=points,
+            class_names=tuple(names.split("\n")) if names else (),
+        )
+
+
+def pack_many(items: Sequence[PackedDetections]) -> bytes:
+    """
+    Бинарное представление результатов нескольких изображений:
+
+        заголовок <4sHHI: b"PBDB", версия, 0, n
+        длины     uint32[n] — размер каждого to_bytes в байтах
+        данные    to_bytes каждого изображения подряд (каждый кратен 4 байтам)
+    """
+    payloads = [item.to_bytes() for item in items]
+    return b"".join(
+        (
+            _BATCH_HEADER.pack(_BATCH_MAGIC, _VERSION, 0, len(payloads)),
+            np.array([len(payload) for payload in payloads], dtype="<u4").tobytes(),
+            *payloads,
+        )
+    )
+
+
+def unpack_many(data: bytes) -> List[PackedDetections]:
+    """
+    Разбирает pack_many; массивы ссылаются на data без копирования.
+    """
+    magic, version, _, count = _BATCH_HEADER.unpack_from(data)
+    if magic != _BATCH_MAGIC or version != _VERSION:
+        raise ValueError(f"Неподдерживаемый формат пакета обнаружений: {magic!r} v{version}")
+
+    lengths = np.frombuffer(data, dtype="<u4", count=count, offset=_BATCH_HEADER.size)
+    view = memoryview(data)
+    offset = _BATCH_HEADER.size + 4 * count
+    items = []
+    for length in lengths.tolist():
+        items.append(PackedDetections.from_bytes(view[offset : offset + length]))
+        offset += length
+    return items
@@ -0,0 +1,162 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 16) -> int:
+    """
+    Разностный перцептивный хеш (dHash) изображения.
+
+    Изображение уменьшается до (hash_size + 1) x hash_size в оттенках серого,
+    каждый бит — сравнение соседних по горизонтали пикселей. Хеш устойчив
+    к перекодированию JPEG и изменению размера.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class _Node:
+    __slots__ = ("hash", "ids", "children")
+
+    def __init__(self, value: int):
+        self.hash = value
+        self.ids: List[int] = []
+        self.children: Dict[int, "_Node"] = {}
+
+
+class BKTree:
+    """
+    BK-дерево для поиска хешей в пределах расстояния Хэмминга.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+
+    def add(self, value: int, item_id: int) -> None:
+        if self._root is None:
+            self._root = _Node(value)
+            self._root.ids.append(item_id)
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(value, node.hash)
+            if distance == 0:
+                node.ids.append(item_id)
+                return
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _Node(value)
+                node.children[distance].ids.append(item_id)
+                return
+            node = child
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """
+        Возвращает пары (расстояние, id) для всех хешей не дальше max_distance.
+        """
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            distance = hamming(value, node.hash)
+            if distance <= max_distance:
+                found.extend((distance, item_id) for item_id in node.ids)
+            # По неравенству треугольника нужные поддеревья лежат в этом диапазоне
+            for edge in range(distance - max_distance, distance + max_distance + 1):
+                child = node.children.get(edge)
+                if child is not None:
+                    stack.append(child)
+        return found
+
+
+class NearDuplicateMatch(NamedTuple):
+    distance: int
+    width: int
+    height: int
+    payload: Any
+
+
+class NearDuplicateIndex:
+    """
+    Индекс почти совпадающих изображений по dHash и размерам.
+
+    Кандидат считается дубликатом, если его хеш отличается не более чем на
+    max_distance бит, а соотношение сторон совпадает с точностью
+    aspect_tolerance. Число записей ограничено max_entries: старые записи
+    помечаются удалёнными, и дерево перестраивается, когда таких становится
+    больше половины.
+
+    Параметры:
+        max_distance: Максимальное расстояние Хэмминга
+        aspect_tolerance: Допустимое относительное расхождение соотношения сторон
+        max_entries: Максимальное число записей в индексе
+    """
+
+    def __init__(self, max_distance: int, aspect_tolerance: float, max_entries: int):
+        self.max_distance = max_distance
+        self.aspect_tolerance = aspect_tolerance
+        self.max_entries = max(1, max_entries)
+
+        self._tree = BKTree()
+        self._entries: OrderedDict[int, Tuple[int, int, int, Any]] = OrderedDict()
+        self._tree_size = 0
+        self._next_id = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, value: int, width: int, height: int, payload: Any) -> None:
+        item_id = self._next_id
+        self._next_id += 1
+        self._entries[item_id] = (value, width, height, payload)
+        self._tree.add(value, item_id)
+        self._tree_size += 1
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._tree_size > 2 * len(self._entries):
+            self._rebuild()
+
+    def find(self, value: int, width: int, height: int) -> Optional[NearDuplicateMatch]:
+        """
+        Ближайший подходящий дубликат или None.
+        """
+        aspect = width / height
+        best = None
+        for distance, item_id in self._tree.search(value, self.max_distance):
+            entry = self._entries.get(item_id)
+            if entry is None:
+                continue
+            _, entry_width, entry_height, payload = entry
+            if abs(entry_width / entry_height - aspect) > self.aspect_tolerance * aspect:
+                continue
+            if best is None or distance < best.distance:
+                best = NearDuplicateMatch(distance, entry_width, entry_height, payload)
+
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _rebuild(self) -> None:
+        self._tree = BKTree()
+        for item_id, (value, *_) in self._entries.items():
+            self._tree.add(value, item_id)
+        self._tree_size = len(self._entries)
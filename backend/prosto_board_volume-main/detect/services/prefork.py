@@ -0,0 +1,143 @@
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Any, Callable, Dict
+
+import uvicorn
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед перезапуском упавшего воркера, чтобы не уйти в цикл быстрых перезапусков
+_RESPAWN_DELAY_SECONDS = 1.0
+
+# Код выхода воркера, который не смог запуститься; родитель останавливает сервис, а не перезапускает воркер
+WORKER_STARTUP_FAILED = 3
+
+# True в процессе воркера, порождённого serve_prefork
+_in_worker = False
+
+
+def in_worker() -> bool:
+    return _in_worker
+
+
+def exit_startup_failed() -> None:
+    """
+    Завершает воркер с WORKER_STARTUP_FAILED. Повторный запуск не поможет
+    (нет весов, ошибка экспорта или настроек), поэтому родитель завершается вместе с ним.
+    """
+    logging.shutdown()
+    os._exit(WORKER_STARTUP_FAILED)
+
+
+def serve_prefork(
+    app: Any,
+    host: str,
+    port: int,
+    workers: int,
+    preload: Callable[[], None],
+    on_fork: Callable[[int], None],
+) -> None:
+    """
+    Запускает несколько процессов uvicorn, разделяющих веса модели.
+
+    Веса загружаются один раз в родительском процессе (preload), после
+    чего воркеры порождаются через fork и получают их страницы памяти по
+    copy-on-write. Все воркеры принимают соединения с одного сокета.
+    Слияние слоёв и прогрев выполняются в каждом воркере (lifespan) после
+    настройки числа потоков. Упавшие воркеры перезапускаются; если воркер
+    не смог запуститься (WORKER_STARTUP_FAILED), останавливается весь сервис.
+
+    Родитель не выполняет вычислений torch: fork после запуска пулов потоков
+    OpenMP/ONNX Runtime небезопасен.
+
+    Параметры:
+        app: ASGI-приложение
+        host: Адрес для прослушивания
+        port: Порт для прослушивания
+        workers: Число процессов-воркеров
+        preload: Загрузка модели в родительском процессе
+        on_fork: Настройка воркера по его номеру, вызывается в дочернем процессе до запуска сервера
+
+    Исключения:
+        SystemExit: Если воркер не смог запуститься
+    """
+    preload()
+
+    # Объекты, созданные до fork, исключаются из сборки мусора, чтобы она не
+    # трогала их страницы в воркерах и не вызывала лишнее копирование
+    gc.collect()
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # pid воркера -> его номер; перезапущенный воркер получает тот же номер
+    children: Dict[int, int] = {}
+    stopping = False
+    failed = False
+
+    def spawn(index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            global _in_worker
+            _in_worker = True
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                on_fork(index)
+                server = uvicorn.Server(uvicorn.Config(app, host=host, port=port))
+                server.run(sockets=[sock])
+            except BaseException:
+                logger.exception("Worker %s failed to start", index)
+                exit_startup_failed()
+            # Сервер не запустился, например из-за ошибки в lifespan
+            if not server.started:
+                exit_startup_failed()
+            os._exit(0)
+        children[pid] = index
+        logger.info("Started worker %s (pid %s)", index, pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(max(1, workers)):
+        spawn(index)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+
+        if not stopping and os.waitstatus_to_exitcode(status) == WORKER_STARTUP_FAILED:
+            logger.error("Worker %s (pid %s) failed to start, stopping the service", index, pid)
+            failed = True
+            stop(signal.SIGTERM, None)
+        elif not stopping:
+            logger.warning("Worker %s (pid %s) exited with status %s, restarting", index, pid, status)
+            time.sleep(_RESPAWN_DELAY_SECONDS)
+            if not stopping:
+                spawn(index)
+
+    sock.close()
+    if failed:
+        raise SystemExit(WORKER_STARTUP_FAILED)
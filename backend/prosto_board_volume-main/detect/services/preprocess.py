@@ -0,0 +1,69 @@
+import io
+import mmap
+from typing import NamedTuple, Optional, Union
+
+from PIL import Image, ImageOps
+
+# Ориентации EXIF, при которых изображение поворачивается на 90 или 270 градусов
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+class PreparedImage(NamedTuple):
+    """
+    Изображение, подготовленное для модели.
+
+    Атрибуты:
+        image: Изображение, которое подаётся в модель (возможно уменьшенное)
+        width: Ширина исходного изображения с учётом ориентации EXIF
+        height: Высота исходного изображения с учётом ориентации EXIF
+    """
+
+    image: Image.Image
+    width: int
+    height: int
+
+    @property
+    def scale(self) -> tuple:
+        """
+        Множители для перевода координат из image в координаты исходного изображения.
+        """
+        return self.width / self.image.width, self.height / self.image.height
+
+
+def decode_image(image_bytes: Union[bytes, mmap.mmap], max_side: Optional[int] = None) -> PreparedImage:
+    """
+    Декодирует загруженный файл в PIL Image с учётом ориентации EXIF.
+
+    Если задан max_side, изображение сразу уменьшается до этого размера
+    по большей стороне: JPEG декодируется в режиме draft (масштабирование
+    1/2, 1/4, 1/8 прямо в libjpeg), поэтому полноразмерный растр 12+ Мп
+    не создаётся. Модель всё равно приводит вход к своему imgsz.
+
+    Выполняется в пуле инференса, поэтому изображение декодируется
+    полностью здесь, а не лениво при первом обращении к пикселям.
+
+    Изображение из общей памяти (mmap) читается декодером напрямую, без
+    копии всего файла.
+    """
+    if isinstance(image_bytes, mmap.mmap):
+        image_bytes.seek(0)
+        image = Image.open(image_bytes)
+    else:
+        image = Image.open(io.BytesIO(image_bytes))
+
+    width, height = image.size
+    if image.getexif().get(0x0112, 1) in _TRANSPOSED_ORIENTATIONS:
+        width, height = height, width
+
+    if max_side and max(image.size) > max_side:
+        scale = max_side / max(image.size)
+        image.draft("RGB", (round(image.width * scale), round(image.height * scale)))
+
+    image = ImageOps.exif_transpose(image)
+
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.BILINEAR, reducing_gap=2.0)
+    else:
+        image.load()
+
+    return PreparedImage(image, width, height)
@@ -0,0 +1,379 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from PIL import Image
+from ultralytics import YOLO
+
+from services.geometry import (
+    BOARD_CLASS_NAMES,
+    board_volume,
+    optimize_quad_points,
+    order_points_consistently,
+)
+from services.model_loader import export_model, load_segment_model, model_fingerprint
+
+logger = logging.getLogger(__name__)
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# Узлы экспортированного графа ultralytics: /model.<номер слоя>/...
+LAYER_NODE_PATTERN = re.compile(r"^/model\.(\d+)/")
+
+
+def calibration_files(calibration_dir: str, limit: int) -> List[str]:
+    """
+    Имена первых limit изображений каталога калибровки в алфавитном порядке.
+
+    Исключения:
+        ValueError: Каталога нет или в нём нет изображений
+    """
+    if not os.path.isdir(calibration_dir):
+        raise ValueError(
+            f"QUANT_CALIBRATION_DIR {os.path.abspath(calibration_dir)} does not exist; "
+            "set it to a directory of board photos (e.g. utils/benchmarks/input/wooden_boards_images)"
+        )
+    filenames = sorted(f for f in os.listdir(calibration_dir) if f.lower().endswith(IMAGE_EXTENSIONS))[:limit]
+    if not filenames:
+        raise ValueError(
+            f"No calibration images ({', '.join(IMAGE_EXTENSIONS)}) in QUANT_CALIBRATION_DIR "
+            f"{os.path.abspath(calibration_dir)}; INT8 precision needs board photos to calibrate and check the model"
+        )
+    return filenames
+
+
+def load_calibration_images(calibration_dir: str, limit: int) -> Dict[str, Image.Image]:
+    """
+    Загружает изображения для калибровки и проверки точности.
+    """
+    images = {}
+    for filename in calibration_files(calibration_dir, limit):
+        with Image.open(os.path.join(calibration_dir, filename)) as img:
+            images[filename] = img.convert("RGB")
+    return images
+
+
+def gate_parameters(calibration_dir: str, calibration_limit: int, confidence: float) -> dict:
+    """
+    Параметры, от которых зависит результат проверки точности.
+
+    Набор изображений представлен хешем имён, размеров и времени изменения
+    файлов, поэтому замена или добавление изображений тоже заметны.
+    """
+    digest = hashlib.sha256()
+    for filename in calibration_files(calibration_dir, calibration_limit):
+        stat = os.stat(os.path.join(calibration_dir, filename))
+        digest.update(f"{filename}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode())
+    return {
+        "confidence": confidence,
+        "calibration_limit": calibration_limit,
+        "calibration_images": digest.hexdigest(),
+    }
+
+
+def excluded_nodes(node_names: List[str], nodes_to_exclude: List[str]) -> List[str]:
+    """
+    Узлы графа ONNX, которые остаются в FP32 при статическом квантовании.
+
+    По умолчанию это голова сегментации — узлы последнего слоя /model.N/.
+    Если имена узлов не соответствуют этой схеме (другая версия экспортера),
+    узлы задаются явно: nodes_to_exclude содержит имена или префиксы имён.
+
+    Исключения:
+        ValueError: Слой головы не найден и nodes_to_exclude не задан
+    """
+    if nodes_to_exclude:
+        return [name for name in node_names if name.startswith(tuple(nodes_to_exclude))]
+
+    layers = [int(match.group(1)) for match in map(LAYER_NODE_PATTERN.match, node_names) if match]
+    if not layers:
+        raise ValueError(
+            "Cannot find the segmentation head in the ONNX graph (no /model.N/ nodes); "
+            "set QUANT_NODES_TO_EXCLUDE to the node names or name prefixes to keep in FP32"
+        )
+    head = f"/model.{max(layers)}/"
+    return [name for name in node_names if name.startswith(head)]
+
+
+def letterbox(image: Image.Image, imgsz: int) -> np.ndarray:
+    """
+    Приводит изображение к входу модели так же, как ultralytics:
+    масштабирование с сохранением пропорций и заполнение серым (114).
+
+    Возвращает:
+        np.ndarray: Тензор формы (1, 3, imgsz, imgsz) в диапазоне 0..1
+    """
+    scale = imgsz / max(image.size)
+    width, height = round(image.width * scale), round(image.height * scale)
+    canvas = Image.new("RGB", (imgsz, imgsz), (114, 114, 114))
+    canvas.paste(image.resize((width, height), Image.BILINEAR), ((imgsz - width) // 2, (imgsz - height) // 2))
+    tensor = np.asarray(canvas, dtype=np.float32).transpose(2, 0, 1) / 255.0
+    return tensor[None]
+
+
+def _quantize_onnx(
+    fp32_path: Path,
+    target: Path,
+    mode: str,
+    images: List[Image.Image],
+    imgsz: int,
+    nodes_to_exclude: List[str],
+) -> None:
+    import onnx
+    from onnxruntime import InferenceSession
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    if mode == "dynamic":
+        quantize_dynamic(str(fp32_path), str(target), weight_type=QuantType.QUInt8)
+    else:
+        input_name = InferenceSession(str(fp32_path), providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+        class Reader(CalibrationDataReader):
+            def __init__(self):
+                self._batches = iter({input_name: letterbox(image, imgsz)} for image in images)
+
+            def get_next(self):
+                return next(self._batches, None)
+
+        # Голову сегментации оставляем в FP32: квантование координат и
+        # коэффициентов масок сильнее всего бьёт по точности
+        model = onnx.load(str(fp32_path), load_external_data=False)
+        head_nodes = excluded_nodes([node.name for node in model.graph.node], nodes_to_exclude)
+
+        quantize_static(
+            str(fp32_path),
+            str(target),
+            Reader(),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            activation_type=QuantType.QUInt8,
+            weight_type=QuantType.QInt8,
+            nodes_to_exclude=head_nodes,
+        )
+
+    # Метаданные ultralytics (имена классов, задача, imgsz) переносим из FP32-модели
+    fp32_model = onnx.load(str(fp32_path), load_external_data=False)
+    int8_model = onnx.load(str(target))
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, str(target))
+
+
+def _quantize_openvino(model_path: str, target: Path, cache: Path, stem: str, names: dict, calibration_dir: str, imgsz: int) -> None:
+    # Калибровка NNCF в ultralytics берёт изображения из описания датасета
+    data_yaml = cache / f"{stem}.calibration.yaml"
+    data_yaml.write_text(
+        json.dumps({"path": os.path.abspath(calibration_dir), "train": ".", "val": ".", "names": names})
+    )
+    tmp_weights = cache / f"{stem}.tmp{os.getpid()}.pt"
+    shutil.copyfile(model_path, tmp_weights)
+    try:
+        exported = YOLO(str(tmp_weights), task="segment").export(
+            format="openvino",
+            imgsz=imgsz,
+            dynamic=True,
+            int8=True,
+            data=str(data_yaml),
+            device="cpu",
+        )
+        os.replace(Path(exported), target)
+    finally:
+        tmp_weights.unlink(missing_ok=True)
+        data_yaml.unlink(missing_ok=True)
+
+
+def build_int8_model(
+    model_path: str,
+    engine: str,
+    cache_dir: str,
+    imgsz: int,
+    mode: str,
+    calibration_dir: str,
+    calibration_limit: int,
+    nodes_to_exclude: List[str],
+) -> Path:
+    """
+    Строит INT8-версию модели сегментации для CPU и кэширует её.
+
+    Параметры:
+        model_path: Путь к весам PyTorch (*.pt)
+        engine: onnx (статическое или динамическое квантование ONNX Runtime) или openvino (статическое, NNCF)
+        cache_dir: Каталог для кэша экспортированных моделей
+        imgsz: Размер входа модели
+        mode: static (с калибровкой на изображениях) или dynamic
+        calibration_dir: Каталог с изображениями для калибровки
+        calibration_limit: Максимальное число изображений для калибровки
+        nodes_to_exclude: Имена или префиксы узлов ONNX, остающихся в FP32 (пусто — голова сегментации)
+
+    Возвращает:
+        Path: Путь к INT8-модели в cache_dir
+    """
+    if engine == "openvino" and mode != "static":
+        raise ValueError("OpenVINO INT8 supports only static quantization")
+    if engine not in ("onnx", "openvino"):
+        raise ValueError(f"INT8 precision requires onnx or openvino engine, got {engine}")
+
+    stem = f"{Path(model_path).stem}-{model_fingerprint(model_path)}-{imgsz}-int8-{mode}"
+    if engine == "onnx" and mode == "static" and nodes_to_exclude:
+        stem += "-" + hashlib.sha256("\n".join(nodes_to_exclude).encode()).hexdigest()[:8]
+    cache = Path(cache_dir)
+    target = cache / (f"{stem}.onnx" if engine == "onnx" else f"{stem}_openvino_model")
+    if target.exists():
+        return target
+
+    if mode == "static":
+        # Каталог калибровки проверяется до долгого экспорта модели
+        calibration_files(calibration_dir, calibration_limit)
+
+    cache.mkdir(parents=True, exist_ok=True)
+    logger.info("Building INT8 model (%s, %s): %s", engine, mode, target)
+
+    if engine == "onnx":
+        fp32_path = export_model(model_path, "onnx", cache_dir, imgsz)
+        images = [] if mode == "dynamic" else list(load_calibration_images(calibration_dir, calibration_limit).values())
+        tmp_target = cache / f"{stem}.tmp{os.getpid()}.onnx"
+        try:
+            _quantize_onnx(fp32_path, tmp_target, mode, images, imgsz, nodes_to_exclude)
+            os.replace(tmp_target, target)
+        finally:
+            tmp_target.unlink(missing_ok=True)
+    else:
+        names = YOLO(model_path, task="segment").names
+        _quantize_openvino(model_path, target, cache, stem, names, calibration_dir, imgsz)
+
+    return target
+
+
+def board_statistics(model: YOLO, image: Image.Image, imgsz: int, confidence: float) -> tuple:
+    """
+    Число досок и их суммарный объём (для единичных высоты и длины) так,
+    как их посчитал бы сервис wooden_boards_volume_seg.
+    """
+    result = model(image, imgsz=imgsz, verbose=False)[0]
+    if result.masks is None:
+        return 0, 0.0
+
+    count, volume = 0, 0.0
+    for conf, cls_id, seg in zip(result.boxes.conf, result.boxes.cls, result.masks.xy):
+        if float(conf) < confidence or result.names[int(cls_id)].lower() not in BOARD_CLASS_NAMES:
+            continue
+        if len(seg) < 3:
+            continue
+        board = board_volume(order_points_consistently(optimize_quad_points(np.asarray(seg, dtype=np.float32))))
+        if board > 0:
+            count += 1
+            volume += board
+
+    return count, volume
+
+
+def accuracy_gate(
+    fp32_model: YOLO,
+    int8_model: YOLO,
+    images: Dict[str, Image.Image],
+    imgsz: int,
+    confidence: float,
+    count_tolerance: float,
+    volume_tolerance: float,
+) -> dict:
+    """
+    Сравнивает INT8-модель с FP32 по числу досок и объёму на наборе изображений.
+
+    Проверка пройдена, если относительное расхождение суммарного числа досок
+    и суммарного объёма не превышает заданных допусков.
+    """
+    per_image = {}
+    totals = np.zeros(4)
+    for filename, image in images.items():
+        fp32_count, fp32_volume = board_statistics(fp32_model, image, imgsz, confidence)
+        int8_count, int8_volume = board_statistics(int8_model, image, imgsz, confidence)
+        per_image[filename] = {
+            "fp32_count": fp32_count,
+            "int8_count": int8_count,
+            "fp32_volume": fp32_volume,
+            "int8_volume": int8_volume,
+        }
+        totals += (fp32_count, int8_count, fp32_volume, int8_volume)
+
+    fp32_count, int8_count, fp32_volume, int8_volume = totals
+    count_error = abs(int8_count - fp32_count) / max(fp32_count, 1)
+    volume_error = abs(int8_volume - fp32_volume) / max(fp32_volume, 1e-9)
+
+    return {
+        "passed": bool(count_error <= count_tolerance and volume_error <= volume_tolerance),
+        "count_error": float(count_error),
+        "volume_error": float(volume_error),
+        "count_tolerance": count_tolerance,
+        "volume_tolerance": volume_tolerance,
+        "images": per_image,
+    }
+
+
+def load_int8_model(
+    model_path: str,
+    engine: str,
+    cache_dir: str,
+    imgsz: int,
+    mode: str,
+    calibration_dir: str,
+    calibration_limit: int,
+    nodes_to_exclude: List[str],
+    gate_confidence: float,
+    count_tolerance: float,
+    volume_tolerance: float,
+) -> YOLO:
+    """
+    Загружает INT8-модель, если она прошла проверку точности, иначе FP32-модель того же движка.
+
+    Результат проверки сохраняется рядом с INT8-моделью (*.gate.json)
+    вместе с параметрами проверки (порог уверенности, число и хеш
+    изображений) и используется повторно, только если они не изменились.
+    """
+    int8_path = build_int8_model(
+        model_path, engine, cache_dir, imgsz, mode, calibration_dir, calibration_limit, nodes_to_exclude
+    )
+
+    parameters = gate_parameters(calibration_dir, calibration_limit, gate_confidence)
+    report_path = int8_path.with_name(f"{int8_path.stem}.gate.json")
+    report = json.loads(report_path.read_text()) if report_path.exists() else None
+    if report is None or report.get("parameters") != parameters:
+        if report is not None:
+            logger.info("Accuracy gate parameters changed, checking the INT8 model again")
+        report = accuracy_gate(
+            load_segment_model(model_path, engine, cache_dir, imgsz),
+            YOLO(str(int8_path), task="segment"),
+            load_calibration_images(calibration_dir, calibration_limit),
+            imgsz,
+            gate_confidence,
+            count_tolerance,
+            volume_tolerance,
+        )
+        report["parameters"] = parameters
+        report_path.write_text(json.dumps(report, indent=2))
+
+    # Сохранённые ошибки сравниваются с текущими допусками, их можно менять без перепроверки
+    if report["count_error"] > count_tolerance or report["volume_error"] > volume_tolerance:
+        logger.error(
+            "INT8 model failed accuracy gate (count error %.4f, volume error %.4f), serving FP32 model",
+            report["count_error"],
+            report["volume_error"],
+        )
+        return load_segment_model(model_path, engine, cache_dir, imgsz)
+
+    logger.info(
+        "INT8 model passed accuracy gate (count error %.4f, volume error %.4f)",
+        report["count_error"],
+        report["volume_error"],
+    )
+    return YOLO(str(int8_path), task="segment")
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import os
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from services.packed_detections import PackedDetections
+
+
+class ResultCache:
+    """
+    Кэш результатов сегментации с адресацией по содержимому.
+
+    Ключ — SHA-256 байтов изображения вместе с идентичностью модели и
+    параметрами инференса (namespace), поэтому смена модели или параметров
+    не приводит к выдаче устаревших результатов. Namespace задаётся в open()
+    после загрузки модели, до этого кэш не используется. Результаты хранятся в
+    бинарном виде PackedDetections: в памяти в LRU с вытеснением по
+    суммарному размеру и, опционально, на диске.
+
+    Параметры:
+        max_bytes: Максимальный суммарный размер записей в памяти
+        disk_dir: Каталог дискового уровня; пустая строка отключает его
+        disk_max_bytes: Максимальный суммарный размер файлов на диске
+    """
+
+    def __init__(self, max_bytes: int, disk_dir: str = "", disk_max_bytes: int = 0):
+        self.namespace = ""
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self.memory_bytes = 0
+
+        self._disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk: OrderedDict[str, int] = OrderedDict()
+        self.disk_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def open(self, namespace: str) -> None:
+        """
+        Задаёт namespace и восстанавливает индекс дискового уровня.
+        Выполняет файловый ввод-вывод, поэтому вызывать вне event loop.
+
+        namespace: Строка с идентичностью модели и параметрами инференса
+        """
+        self.namespace = hashlib.sha256(namespace.encode()).hexdigest()[:16]
+        if self._disk_dir is not None:
+            self._load_disk_index()
+
+    def key(self, image_bytes: bytes) -> str:
+        """
+        Ключ кэша для изображения. Для больших файлов вызывать вне event loop.
+        """
+        return f"{self.namespace}-{hashlib.sha256(image_bytes).hexdigest()}"
+
+    async def get(self, key: str, record_stats: bool = True) -> Optional[PackedDetections]:
+        """
+        Результат из кэша или None. record_stats=False не учитывает обращение
+        в статистике попаданий (например, при поиске почти совпадающих изображений).
+        """
+        data = self._memory.get(key)
+        if data is not None:
+            self._memory.move_to_end(key)
+            self.hits += record_stats
+            return PackedDetections.from_bytes(data)
+
+        if key in self._disk:
+            try:
+                data = await asyncio.to_thread(self._disk_path(key).read_bytes)
+            except OSError:
+                self._forget_disk(key)
+            else:
+                self._disk.move_to_end(key)
+                self._put_memory(key, data)
+                self.hits += record_stats
+                self.disk_hits += record_stats
+                return PackedDetections.from_bytes(data)
+
+        self.misses += record_stats
+        return None
+
+    async def put(self, key: str, detections: PackedDetections) -> None:
+        data = detections.to_bytes()
+        self._put_memory(key, data)
+
+        if self._disk_dir is not None and key not in self._disk:
+            self._disk[key] = len(data)
+            self.disk_bytes += len(data)
+            try:
+                await asyncio.to_thread(self._write_disk, key, data)
+            except OSError:
+                self._forget_disk(key)
+                return
+
+            while self.disk_bytes > self.disk_max_bytes and len(self._disk) > 1:
+                oldest = next(iter(self._disk))
+                self._forget_disk(oldest)
+                await asyncio.to_thread(self._disk_path(oldest).unlink, missing_ok=True)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "memory_items": len(self._memory),
+            "memory_bytes": self.memory_bytes,
+            "memory_max_bytes": self.max_bytes,
+            "disk_items": len(self._disk),
+            "disk_bytes": self.disk_bytes,
+            "disk_max_bytes": self.disk_max_bytes if self._disk_dir is not None else 0,
+        }
+
+    def _put_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+
+        self._memory[key] = data
+        self.memory_bytes += len(data)
+
+        # Вытесняем давно не использованные записи, пока не уложимся в лимит
+        while self.memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _disk_path(self, key: str) -> Path:
+        return self._disk_dir / f"{key}.bin"
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self.disk_bytes -= size
+
+    def _load_disk_index(self) -> None:
+        # Индекс дискового уровня восстанавливается по файлам, от старых к новым
+        self._disk_dir.mkdir(parents=True, exist_ok=True)
+        entries = []
+        for path in self._disk_dir.glob(f"{self.namespace}-*.bin"):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self.disk_bytes += size
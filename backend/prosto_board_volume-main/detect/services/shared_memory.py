@@ -0,0 +1,36 @@
+import mmap
+import os
+import re
+
+# Префикс имён файлов, которые сервис wooden_boards_volume_seg создаёт в общей памяти
+SHM_PREFIX = "prosto-board-image-"
+# Допустимое имя: префикс и случайная часть, без разделителей пути
+_HANDLE_PATTERN = re.compile(r"^" + re.escape(SHM_PREFIX) + r"[A-Za-z0-9_-]{1,64}$")
+
+
+def open_shared_image(directory: str, handle: str) -> mmap.mmap:
+    """
+    Отображает в память изображение, переданное через общую память (/dev/shm).
+
+    Файл открывается только для чтения и не копируется: декодер и хеш
+    кэша читают байты прямо из отображения. Удаляет файл создавший его
+    сервис, после удаления отображение остаётся действительным.
+
+    Параметры:
+        directory: Каталог общей памяти
+        handle: Имя файла в directory
+
+    Возвращает:
+        mmap.mmap: Отображение файла; закрывается вызывающим
+
+    Исключения:
+        ValueError: Имя не похоже на handle сервиса объёмов или файл пуст
+        FileNotFoundError: Файла нет (другой хост или он уже удалён)
+    """
+    if not _HANDLE_PATTERN.match(handle):
+        raise ValueError(f"Invalid image handle: {handle!r}")
+
+    with open(os.path.join(directory, handle), "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Image handle {handle!r} is empty")
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
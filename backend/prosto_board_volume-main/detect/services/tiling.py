@@ -0,0 +1,205 @@
+import math
+from typing import List, NamedTuple, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+from services.packed_detections import PackedDetections
+
+# Тайл: (x0, y0, x1, y1) в пикселях декодированного изображения
+Tile = Tuple[int, int, int, int]
+
+# Полигон считается касающимся внутренней границы тайла, если подходит к ней ближе чем на столько пикселей
+_BORDER_MARGIN_PX = 2
+# Доля площади меньшего фрагмента, при которой два обрезанных границами фрагмента объединяются в один объект
+_FRAGMENT_MERGE_OVERLAP = 0.2
+
+
+def _axis_tiles(length: int, tile: int, overlap: float) -> List[Tuple[int, int]]:
+    if length <= tile:
+        return [(0, length)]
+    count = math.ceil((length - tile) / (tile * (1 - overlap))) + 1
+    # Тайлы распределяются равномерно, крайние прилегают к краям изображения
+    step = (length - tile) / (count - 1)
+    return [(round(i * step), round(i * step) + tile) for i in range(count)]
+
+
+def plan_tiles(width: int, height: int, tile_size: int, overlap: float, max_tiles: int) -> List[Tile]:
+    """
+    Разбивает изображение на перекрывающиеся тайлы.
+
+    Число тайлов зависит от размера изображения: изображение не больше
+    tile_size даёт один тайл, большее — столько, чтобы соседние тайлы
+    перекрывались не меньше чем на overlap. Если тайлов получается больше
+    max_tiles, размер тайла увеличивается (модель уменьшит его до своего
+    входа).
+
+    Параметры:
+        width: Ширина изображения
+        height: Высота изображения
+        tile_size: Сторона тайла в пикселях
+        overlap: Минимальное перекрытие соседних тайлов, доля стороны тайла
+        max_tiles: Максимальное число тайлов
+
+    Возвращает:
+        List[Tile]: Тайлы построчно, слева направо и сверху вниз
+    """
+    overlap = min(max(overlap, 0.0), 0.9)
+    tile = max(1, tile_size)
+    while True:
+        xs = _axis_tiles(width, tile, overlap)
+        ys = _axis_tiles(height, tile, overlap)
+        if len(xs) * len(ys) <= max(1, max_tiles):
+            return [(x0, y0, x1, y1) for y0, y1 in ys for x0, x1 in xs]
+        tile = math.ceil(tile * 1.25)
+
+
+class _Candidate(NamedTuple):
+    confidence: float
+    class_name: str
+    polygon: np.ndarray
+    # Ограничивающий прямоугольник (x0, y0, x1, y1) в целых пикселях
+    box: Tuple[int, int, int, int]
+    area: int
+    # Обрезан внутренней границей тайла
+    touches_border: bool
+
+
+def _box(polygon: np.ndarray) -> Tuple[int, int, int, int]:
+    x0, y0 = np.floor(polygon.min(axis=0)).astype(int)
+    x1, y1 = np.ceil(polygon.max(axis=0)).astype(int) + 1
+    return int(x0), int(y0), int(x1), int(y1)
+
+
+def _rasterize(polygon: np.ndarray, box: Tuple[int, int, int, int]) -> np.ndarray:
+    """
+    Маска полигона в окне box.
+    """
+    x0, y0, x1, y1 = box
+    mask = np.zeros((max(y1 - y0, 1), max(x1 - x0, 1)), dtype=np.uint8)
+    points = np.round(polygon - (x0, y0)).astype(np.int32)
+    cv2.fillPoly(mask, [points], 1)
+    return mask
+
+
+def _intersection(a: _Candidate, b: _Candidate) -> int:
+    box = (max(a.box[0], b.box[0]), max(a.box[1], b.box[1]), min(a.box[2], b.box[2]), min(a.box[3], b.box[3]))
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return 0
+    return int(np.count_nonzero(_rasterize(a.polygon, box) & _rasterize(b.polygon, box)))
+
+
+def _union(a: _Candidate, b: _Candidate) -> _Candidate:
+    """
+    Объект из двух фрагментов: внешний контур объединения их масок.
+    """
+    box = (min(a.box[0], b.box[0]), min(a.box[1], b.box[1]), max(a.box[2], b.box[2]), max(a.box[3], b.box[3]))
+    mask = _rasterize(a.polygon, box) | _rasterize(b.polygon, box)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contour = max(contours, key=cv2.contourArea).reshape(-1, 2).astype(np.float32) + (box[0], box[1])
+    return _Candidate(
+        confidence=max(a.confidence, b.confidence),
+        class_name=a.class_name,
+        polygon=contour,
+        box=_box(contour),
+        area=int(np.count_nonzero(mask)),
+        touches_border=a.touches_border and b.touches_border,
+    )
+
+
+def _candidates(packed: PackedDetections, tile: Tile, width: int, height: int) -> List[_Candidate]:
+    x0, y0, x1, y1 = tile
+    candidates = []
+    for i, polygon in enumerate(packed.polygons()):
+        if len(polygon) < 3:
+            continue
+        polygon = polygon + np.array([x0, y0], dtype=np.float32)
+        low, high = polygon.min(axis=0), polygon.max(axis=0)
+        # Границы тайла, совпадающие с краями изображения, объект не обрезают
+        touches_border = bool(
+            (x0 > 0 and low[0] <= x0 + _BORDER_MARGIN_PX)
+            or (y0 > 0 and low[1] <= y0 + _BORDER_MARGIN_PX)
+            or (x1 < width and high[0] >= x1 - 1 - _BORDER_MARGIN_PX)
+            or (y1 < height and high[1] >= y1 - 1 - _BORDER_MARGIN_PX)
+        )
+        box = _box(polygon)
+        candidates.append(
+            _Candidate(
+                confidence=float(packed.confidences[i]),
+                class_name=packed.class_name(i),
+                polygon=polygon,
+                box=box,
+                area=int(np.count_nonzero(_rasterize(polygon, box))),
+                touches_border=touches_border,
+            )
+        )
+    return candidates
+
+
+def merge_tiles(
+    results: Sequence[PackedDetections],
+    tiles: Sequence[Tile],
+    width: int,
+    height: int,
+    iou_threshold: float,
+    containment_threshold: float,
+) -> PackedDetections:
+    """
+    Объединяет результаты тайлов в результат для всего изображения.
+
+    Полигоны переводятся в координаты изображения и проходят NMS по
+    площади пересечения масок. Целые объекты обрабатываются раньше
+    обрезанных границей тайла, а внутри группы — по убыванию уверенности.
+    Объект подавляется, если его IoU с уже принятым того же класса не
+    меньше iou_threshold или он сам лежит внутри принятого не меньше чем
+    на containment_threshold своей площади: так отбрасываются дубли из
+    соседних тайлов и обрезанные фрагменты целых объектов. Два обрезанных
+    фрагмента одного объекта, не попавшего целиком ни в один тайл,
+    объединяются в один полигон.
+
+    Параметры:
+        results: Результаты тайлов в координатах тайлов
+        tiles: Тайлы в том же порядке
+        width: Ширина изображения
+        height: Высота изображения
+        iou_threshold: Порог IoU для подавления дублей
+        containment_threshold: Порог доли площади для подавления вложенных фрагментов
+
+    Возвращает:
+        PackedDetections: Обнаружения в координатах изображения
+    """
+    candidates = [
+        candidate
+        for packed, tile in zip(results, tiles)
+        for candidate in _candidates(packed, tile, width, height)
+    ]
+    candidates.sort(key=lambda c: (c.touches_border, -c.confidence))
+
+    kept: List[_Candidate] = []
+    for candidate in candidates:
+        if candidate.area == 0:
+            continue
+        for k, other in enumerate(kept):
+            if other.class_name != candidate.class_name:
+                continue
+            inter = _intersection(candidate, other)
+            if inter == 0:
+                continue
+            iou = inter / (candidate.area + other.area - inter)
+            if iou >= iou_threshold or inter / candidate.area >= containment_threshold:
+                break
+            if (
+                candidate.touches_border
+                and other.touches_border
+                and inter / min(candidate.area, other.area) >= _FRAGMENT_MERGE_OVERLAP
+            ):
+                kept[k] = _union(other, candidate)
+                break
+        else:
+            kept.append(candidate)
+
+    return PackedDetections.from_polygons(
+        confidences=[c.confidence for c in kept],
+        class_names=[c.class_name for c in kept],
+        polygons=[c.polygon for c in kept],
+    )
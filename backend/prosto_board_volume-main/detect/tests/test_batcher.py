@@ -0,0 +1,196 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.batcher import DeadlineExceededError, InferenceBatcher
+from services.executor import InferenceExecutor, QueueFullError
+
+
+class RecordingModel:
+    """
+    Модель-заглушка: запоминает пакеты и возвращает (ключ, изображение) для каждого изображения.
+    """
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, images, key):
+        self.batches.append((list(images), key))
+        return [(key, image) for image in images]
+
+
+def run(scenario, model, workers=1, max_batch_size=16, max_wait_ms=50.0):
+    """
+    Выполняет сценарий с новым батчером и останавливает его фоновые задачи.
+    """
+    executor = InferenceExecutor(workers=workers, max_queue=64)
+    batcher = InferenceBatcher(model, executor, max_batch_size, max_wait_ms)
+
+    async def main():
+        try:
+            return await scenario(batcher)
+        finally:
+            await batcher.close()
+
+    try:
+        return asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+def test_concurrent_submits_share_one_batch():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        return await asyncio.gather(*(batcher.submit(i, key=640) for i in range(5)))
+
+    assert run(scenario, model) == [(640, i) for i in range(5)]
+    assert model.batches == [([0, 1, 2, 3, 4], 640)]
+
+
+def test_full_batch_does_not_wait():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        started = time.monotonic()
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        return results, time.monotonic() - started
+
+    results, elapsed = run(scenario, model, max_batch_size=2, max_wait_ms=10_000)
+    assert results == [(None, "a"), (None, "b")]
+    assert elapsed < 1.0
+
+
+def test_batches_are_split_by_size_and_key():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        return await asyncio.gather(
+            batcher.submit(1, key=320),
+            batcher.submit(2, key=640),
+            batcher.submit(3, key=320),
+            batcher.submit(4, key=320),
+        )
+
+    assert run(scenario, model, workers=2, max_batch_size=2) == [(320, 1), (640, 2), (320, 3), (320, 4)]
+    assert sorted(model.batches) == [([1, 3], 320), ([2], 640), ([4], 320)]
+
+
+def test_submit_many_keeps_order_and_splits_large_blocks():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        started = time.monotonic()
+        results = await batcher.submit_many(list(range(7)), key=640)
+        return results, time.monotonic() - started
+
+    results, elapsed = run(scenario, model, max_batch_size=3, max_wait_ms=10_000)
+    assert results == [(640, i) for i in range(7)]
+    assert [images for images, _ in model.batches] == [[0, 1, 2], [3, 4, 5], [6]]
+    assert elapsed < 1.0
+
+
+def test_max_wait_is_measured_from_the_oldest_item():
+    # Изображение с другим ключом ждёт в очереди, пока первый пакет добирается;
+    # после его отправки повторно ждать max_wait оно не должно
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        started = time.monotonic()
+
+        async def timed(image, key):
+            await batcher.submit(image, key=key)
+            return time.monotonic() - started
+
+        return await asyncio.gather(timed("a", 320), timed("b", 640))
+
+    first, second = run(scenario, model, workers=2, max_wait_ms=300)
+    assert first >= 0.25
+    assert second < 0.5
+
+
+def test_expired_requests_are_not_predicted():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        results = await asyncio.gather(
+            batcher.submit("late", deadline=time.time() - 1),
+            batcher.submit("live", deadline=time.time() + 60),
+            return_exceptions=True,
+        )
+        return results, batcher.metrics()
+
+    (late, live), metrics = run(scenario, model)
+    assert isinstance(late, DeadlineExceededError)
+    assert live == (None, "live")
+    assert model.batches == [(["live"], None)]
+    assert metrics["expired_total"] == 1
+
+
+def test_cancelled_requests_are_not_predicted():
+    model = RecordingModel()
+
+    async def scenario(batcher):
+        gone = asyncio.create_task(batcher.submit("gone"))
+        kept = asyncio.create_task(batcher.submit("kept"))
+        await asyncio.sleep(0.01)
+        gone.cancel()
+        return await kept, batcher.metrics()
+
+    result, metrics = run(scenario, model, max_wait_ms=100)
+    assert result == (None, "kept")
+    assert model.batches == [(["kept"], None)]
+    assert metrics["cancelled_total"] == 1
+
+
+def test_predict_error_reaches_every_caller():
+    def broken(images, key):
+        raise RuntimeError("model failed")
+
+    async def scenario(batcher):
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    assert [str(error) for error in run(scenario, broken)] == ["model failed", "model failed"]
+
+
+def test_admit_rejects_requests_over_capacity():
+    executor = InferenceExecutor(workers=1, max_queue=3)
+    try:
+        with executor.admit(slots=2):
+            with executor.admit():
+                assert executor.metrics()["queue_depth"] == 3
+                with pytest.raises(QueueFullError):
+                    with executor.admit():
+                        pass
+            with pytest.raises(QueueFullError):
+                with executor.admit(slots=2):
+                    pass
+        assert executor.admitted == 0
+        assert executor.rejected_total == 2
+    finally:
+        executor.shutdown()
+
+
+def test_admit_releases_slots_on_error():
+    executor = InferenceExecutor(workers=1, max_queue=1)
+    try:
+        with pytest.raises(ValueError):
+            with executor.admit():
+                raise ValueError("request failed")
+        with executor.admit():
+            assert executor.admitted == 1
+        assert executor.admitted == 0
+    finally:
+        executor.shutdown()
+
+
+def test_run_executes_in_the_pool():
+    executor = InferenceExecutor(workers=2, max_queue=1)
+    try:
+        thread = asyncio.run(executor.run(lambda: threading.current_thread().name))
+        assert thread.startswith("inference")
+        assert executor.metrics()["run_time"]["count"] == 1
+    finally:
+        executor.shutdown()
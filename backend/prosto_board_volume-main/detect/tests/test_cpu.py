@@ -0,0 +1,40 @@
+import pytest
+
+from services import cpu
+
+
+@pytest.fixture
+def applied(monkeypatch):
+    """
+    Число потоков torch, заданное apply_cpu_settings, на машине с 16 ядрами.
+    """
+    threads = []
+    monkeypatch.setattr(cpu, "available_cores", lambda: 16)
+    monkeypatch.setattr(cpu, "set_intra_op_threads", threads.append)
+    monkeypatch.setattr(cpu.os, "sched_setaffinity", lambda pid, cpus: None)
+    return threads
+
+
+@pytest.mark.parametrize(
+    "workers, pool_threads, expected",
+    [(1, 1, []), (2, 1, [8]), (1, 4, [4]), (2, 4, [2]), (4, 8, [1])],
+)
+def test_default_threads_are_split_between_workers_and_pool_threads(applied, workers, pool_threads, expected):
+    config = cpu.apply_cpu_settings(workers=workers, index=0, pool_threads=pool_threads)
+
+    # Один воркер с одним потоком пула оставляет значение torch по умолчанию
+    assert applied == expected
+    assert config.intra_op_threads == (expected[0] if expected else 0)
+
+
+def test_pinned_worker_splits_its_cores_between_pool_threads(applied):
+    config = cpu.apply_cpu_settings(workers=2, index=1, affinity="0-7", pool_threads=2)
+
+    assert config.cpus == [4, 5, 6, 7]
+    assert applied == [2]
+
+
+def test_explicit_threads_are_kept(applied):
+    cpu.apply_cpu_settings(workers=2, index=0, intra_op_threads=6, pool_threads=4)
+
+    assert applied == [6]
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from services.packed_detections import PackedDetections, pack_many, unpack_many
+
+
+def make_detections(count: int) -> PackedDetections:
+    """
+    count обнаружений с полигонами разной длины и повторяющимися классами.
+    """
+    rng = np.random.default_rng(count)
+    polygons = [rng.uniform(0, 4000, size=(3 + i, 2)) for i in range(count)]
+    names = [("board", "доска", "knot")[i % 3] for i in range(count)]
+    return PackedDetections.from_polygons(rng.uniform(0.3, 1.0, size=count), names, polygons)
+
+
+def assert_same(decoded: PackedDetections, original: PackedDetections) -> None:
+    assert decoded.class_names == original.class_names
+    np.testing.assert_array_equal(decoded.confidences, original.confidences)
+    np.testing.assert_array_equal(decoded.class_ids, original.class_ids)
+    np.testing.assert_array_equal(decoded.offsets, original.offsets)
+    np.testing.assert_array_equal(decoded.points, original.points)
+
+
+def test_from_polygons_builds_dense_arrays():
+    polygons = [np.array([[0, 0], [1, 0], [1, 1]]), np.array([[5, 5], [6, 5], [6, 6], [5, 6]])]
+    packed = PackedDetections.from_polygons([0.9, 0.8], ["board", "board"], polygons)
+
+    assert packed.class_names == ("board",)
+    assert packed.class_ids.tolist() == [0, 0]
+    assert packed.offsets.tolist() == [0, 3, 7]
+    assert packed.points.dtype == np.float32 and packed.points.shape == (7, 2)
+    assert [polygon.tolist() for polygon in packed.polygons()] == [polygon.tolist() for polygon in polygons]
+
+
+@pytest.mark.parametrize("count", [0, 1, 5])
+def test_bytes_round_trip(count):
+    original = make_detections(count)
+    data = original.to_bytes()
+
+    decoded = PackedDetections.from_bytes(data)
+
+    assert len(data) % 4 == 0
+    assert_same(decoded, original)
+    assert not decoded.points.flags.writeable
+
+
+def test_from_bytes_rejects_other_formats():
+    data = bytearray(make_detections(1).to_bytes())
+    data[:4] = b"XXXX"
+    with pytest.raises(ValueError):
+        PackedDetections.from_bytes(bytes(data))
+
+    data = bytearray(make_detections(1).to_bytes())
+    data[4] = 2
+    with pytest.raises(ValueError):
+        PackedDetections.from_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("counts", [[], [0], [1, 0, 5]])
+def test_pack_many_round_trip(counts):
+    originals = [make_detections(count) for count in counts]
+
+    decoded = unpack_many(pack_many(originals))
+
+    assert len(decoded) == len(originals)
+    for item, original in zip(decoded, originals):
+        assert_same(item, original)
+
+
+def test_unpack_many_rejects_single_payload():
+    with pytest.raises(ValueError):
+        unpack_many(make_detections(1).to_bytes())
+
+
+def test_scaled_and_map_polygons_keep_classes():
+    original = make_detections(5)
+
+    scaled = original.scaled(2.0, 0.5)
+    reversed_polygons = original.map_polygons(lambda polygon: polygon[::-1])
+
+    np.testing.assert_allclose(scaled.points, original.points * [2.0, 0.5], rtol=1e-6)
+    assert [reversed_polygons.class_name(i) for i in range(5)] == [original.class_name(i) for i in range(5)]
+    for polygon, source in zip(reversed_polygons.polygons(), original.polygons()):
+        np.testing.assert_array_equal(polygon, source[::-1])
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+from ultralytics import YOLO
+
+
+def load_model(model_path, engine, imgsz, work_dir):
+    """Загружаем модель для движка, экспортируя её так же, как сервис detect"""
+    if engine == "torch":
+        return YOLO(model_path, task="segment")
+
+    # Экспортируем из копии весов, чтобы не засорять каталог с моделями
+    os.makedirs(work_dir, exist_ok=True)
+    weights = os.path.join(work_dir, os.path.basename(model_path))
+    if not os.path.exists(weights):
+        shutil.copyfile(model_path, weights)
+
+    exported = YOLO(weights, task="segment").export(
+        format=engine, imgsz=imgsz, dynamic=True, device="cpu"
+    )
+    return YOLO(exported, task="segment")
+
+
+def load_images(input_dir):
+    images = {}
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            with Image.open(os.path.join(input_dir, filename)) as img:
+                images[filename] = img.convert("RGB")
+    return images
+
+
+def rasterize(polygons, size):
+    """Объединение полигонов в одну бинарную маску размера изображения"""
+    mask = Image.new("1", size, 0)
+    draw = ImageDraw.Draw(mask)
+    for polygon in polygons:
+        if len(polygon) >= 3:
+            draw.polygon([(float(x), float(y)) for x, y in polygon], fill=1)
+    return np.array(mask, dtype=bool)
+
+
+def run_engine(model, images, imgsz, runs, warmup):
+    latencies = []
+    polygons = {}
+
+    for filename, image in images.items():
+        for _ in range(warmup):
+            model(image, imgsz=imgsz, verbose=False)
+
+        for _ in range(runs):
+            started = time.perf_counter()
+            result = model(image, imgsz=imgsz, verbose=False)[0]
+            latencies.append(time.perf_counter() - started)
+
+        polygons[filename] = [] if result.masks is None else list(result.masks.xy)
+
+    return latencies, polygons
+
+
+def mask_agreement(reference, candidate, images):
+    """IoU объединённых масок и разница в числе обнаружений относительно эталона"""
+    ious = []
+    count_diffs = []
+    for filename, image in images.items():
+        ref_mask = rasterize(reference[filename], image.size)
+        cand_mask = rasterize(candidate[filename], image.size)
+        union = np.logical_or(ref_mask, cand_mask).sum()
+        ious.append(1.0 if union == 0 else np.logical_and(ref_mask, cand_mask).sum() / union)
+        count_diffs.append(abs(len(reference[filename]) - len(candidate[filename])))
+
+    return {
+        "mean_iou": float(np.mean(ious)),
+        "min_iou": float(np.min(ious)),
+        "mean_count_diff": float(np.mean(count_diffs)),
+        "max_count_diff": int(np.max(count_diffs)),
+    }
+
+
+def main(input_dir, output_dir, model_path, engines, imgsz=640, runs=5, warmup=1):
+    os.makedirs(output_dir, exist_ok=True)
+    images = load_images(input_dir)
+    print(f"Изображений: {len(images)}, движки: {', '.join(engines)}")
+
+    report = {}
+    reference = None
+    for engine in engines:
+        model = load_model(model_path, engine, imgsz, os.path.join(output_dir, "models"))
+        latencies, polygons = run_engine(model, images, imgsz, runs, warmup)
+
+        report[engine] = {
+            "p50_ms": float(np.percentile(latencies, 50)) * 1000,
+            "p95_ms": float(np.percentile(latencies, 95)) * 1000,
+            "images_per_sec": len(latencies) / sum(latencies),
+        }
+        # Первый движок в списке служит эталоном для сравнения масок
+        if reference is None:
+            reference = polygons
+        else:
+            report[engine].update(mask_agreement(reference, polygons, images))
+
+        print(
+            f"{engine:>9}: p50={report[engine]['p50_ms']:.1f} мс, "
+            f"p95={report[engine]['p95_ms']:.1f} мс"
+            + (f", IoU={report[engine]['mean_iou']:.4f}" if "mean_iou" in report[engine] else "")
+        )
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Сравнение движков инференса модели сегментации")
+    parser.add_argument("--input-dir", default="input/wooden_boards_images")
+    parser.add_argument("--output-dir", default="output/wooden_boards_images/engines")
+    parser.add_argument("--model", default="../../detect/models/wood.pt")
+    parser.add_argument("--engines", nargs="+", default=["torch", "onnx", "openvino"])
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    args = parser.parse_args()
+
+    main(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        model_path=args.model,
+        engines=args.engines,
+        imgsz=args.imgsz,
+        runs=args.runs,
+        warmup=args.warmup,
+    )
@@ -0,0 +1,107 @@
+import argparse
+import io
+import json
+import os
+import sys
+
+from PIL import Image
+
+# Используем ту же реализацию хеша и индекса, что и сервис detect
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "detect"))
+from services.perceptual_hash import NearDuplicateIndex, dhash  # noqa: E402
+
+# Синтетические перекодирования: (масштаб, качество JPEG)
+VARIANTS = [
+    (1.0, 95),
+    (1.0, 75),
+    (1.0, 50),
+    (1.0, 30),
+    (0.75, 75),
+    (0.5, 75),
+    (0.25, 60),
+]
+
+
+def reencode(image, scale, quality):
+    """Имитируем пересжатие фото мессенджером или приложением камеры"""
+    if scale != 1.0:
+        image = image.resize((round(image.width * scale), round(image.height * scale)), Image.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, "JPEG", quality=quality)
+    buf.seek(0)
+    return Image.open(buf).convert("RGB")
+
+
+def load_images(input_dir):
+    images = {}
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            with Image.open(os.path.join(input_dir, filename)) as img:
+                images[filename] = img.convert("RGB")
+    return images
+
+
+def evaluate(images, hashes, variants, max_distance, aspect_tolerance):
+    index = NearDuplicateIndex(max_distance, aspect_tolerance, max_entries=len(images))
+    for filename, image in images.items():
+        index.add(hashes[filename], image.width, image.height, filename)
+
+    true_hits = false_hits = misses = 0
+    for filename, variant, variant_hash in variants:
+        match = index.find(variant_hash, variant.width, variant.height)
+        if match is None:
+            misses += 1
+        elif match.payload == filename:
+            true_hits += 1
+        else:
+            false_hits += 1
+
+    total = len(variants)
+    return {
+        "true_hit_rate": true_hits / total,
+        "false_hit_rate": false_hits / total,
+        "miss_rate": misses / total,
+    }
+
+
+def main(input_dir, output_dir, distances, hash_size=16, aspect_tolerance=0.01):
+    os.makedirs(output_dir, exist_ok=True)
+    images = load_images(input_dir)
+    hashes = {filename: dhash(image, hash_size) for filename, image in images.items()}
+    variants = []
+    for filename, image in images.items():
+        for scale, quality in VARIANTS:
+            variant = reencode(image, scale, quality)
+            variants.append((filename, variant, dhash(variant, hash_size)))
+    print(f"Изображений: {len(images)}, перекодированных вариантов: {len(variants)}")
+
+    report = {}
+    for max_distance in distances:
+        report[max_distance] = evaluate(images, hashes, variants, max_distance, aspect_tolerance)
+        print(
+            f"distance<={max_distance:>2}: "
+            f"верные={report[max_distance]['true_hit_rate']:.3f}, "
+            f"ложные={report[max_distance]['false_hit_rate']:.3f}, "
+            f"промахи={report[max_distance]['miss_rate']:.3f}"
+        )
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Доля ложных совпадений поиска почти одинаковых изображений")
+    parser.add_argument("--input-dir", default="input/wooden_boards_images")
+    parser.add_argument("--output-dir", default="output/wooden_boards_images/near_duplicate")
+    parser.add_argument("--hash-size", type=int, default=16)
+    parser.add_argument("--distances", nargs="+", type=int, default=[0, 4, 8, 12, 16, 20, 24])
+    parser.add_argument("--aspect-tolerance", type=float, default=0.01)
+    args = parser.parse_args()
+
+    main(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        distances=args.distances,
+        hash_size=args.hash_size,
+        aspect_tolerance=args.aspect_tolerance,
+    )
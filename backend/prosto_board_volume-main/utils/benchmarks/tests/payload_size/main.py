@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+from ultralytics import YOLO
+
+# Используем ту же геометрию, что и сервис detect
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "detect"))
+from services.geometry import board_volume, fit_quad, simplify_polygon  # noqa: E402
+
+
+def load_images(input_dir):
+    images = {}
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            with Image.open(os.path.join(input_dir, filename)) as img:
+                images[filename] = img.convert("RGB")
+    return images
+
+
+def segment(model, images, imgsz):
+    """Полные полигоны (conf, class_name, points) для каждого изображения"""
+    detections = {}
+    for filename, image in images.items():
+        result = model(image, imgsz=imgsz, verbose=False)[0]
+        detections[filename] = []
+        if result.masks is not None:
+            for conf, cls_id, seg in zip(result.boxes.conf, result.boxes.cls, result.masks.xy):
+                detections[filename].append((float(conf), result.names[int(cls_id)], np.asarray(seg, dtype=np.float64)))
+    return detections
+
+
+def shape(points, geometry, tolerance):
+    if geometry == "quad":
+        return fit_quad(points)
+    if geometry == "simplified":
+        return simplify_polygon(points, tolerance)
+    return points
+
+
+def to_payload(detections, geometry, tolerance):
+    """Ответ /detect_seg/ в том же виде, что отдаёт сервис"""
+    return [
+        {
+            "confidence": conf,
+            "class_name": class_name,
+            "points": [{"x": float(x), "y": float(y)} for x, y in shape(points, geometry, tolerance)],
+        }
+        for conf, class_name, points in detections
+    ]
+
+
+def measure(detections, geometry, tolerance, repeats):
+    sizes = []
+    dump_times = []
+    load_times = []
+    volume_errors = []
+    for items in detections.values():
+        payload = to_payload(items, geometry, tolerance)
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            data = json.dumps(payload).encode()
+        dump_times.append((time.perf_counter() - started) / repeats)
+
+        started = time.perf_counter()
+        for _ in range(repeats):
+            json.loads(data)
+        load_times.append((time.perf_counter() - started) / repeats)
+
+        sizes.append(len(data))
+
+        # Объём по упрощённому контуру против объёма по полному полигону
+        for (_, _, full_points), shaped in zip(items, payload):
+            if len(full_points) < 3:
+                continue
+            reference = board_volume(fit_quad(full_points))
+            points = np.array([(p["x"], p["y"]) for p in shaped["points"]])
+            if reference > 0:
+                volume_errors.append(abs(board_volume(fit_quad(points)) - reference) / reference)
+
+    return {
+        "total_bytes": int(np.sum(sizes)),
+        "mean_bytes": float(np.mean(sizes)),
+        "mean_dump_ms": float(np.mean(dump_times) * 1000),
+        "mean_load_ms": float(np.mean(load_times) * 1000),
+        "max_volume_rel_error": float(np.max(volume_errors)) if volume_errors else 0.0,
+    }
+
+
+def main(input_dir, output_dir, model_path, imgsz, tolerances, repeats):
+    os.makedirs(output_dir, exist_ok=True)
+    images = load_images(input_dir)
+    model = YOLO(model_path, task="segment")
+    detections = segment(model, images, imgsz)
+    print(f"Изображений: {len(images)}, обнаружений: {sum(len(items) for items in detections.values())}")
+
+    modes = [("full", 0.0)] + [("simplified", tolerance) for tolerance in tolerances] + [("quad", 0.0)]
+    report = {}
+    for geometry, tolerance in modes:
+        name = f"{geometry}@{tolerance:g}" if geometry == "simplified" else geometry
+        report[name] = measure(detections, geometry, tolerance, repeats)
+
+    baseline = report["full"]["total_bytes"]
+    for name, row in report.items():
+        row["size_ratio"] = row["total_bytes"] / baseline if baseline else 1.0
+        print(
+            f"{name:>16}: {row['mean_bytes'] / 1024:8.1f} КБ/ответ "
+            f"({row['size_ratio'] * 100:5.1f}% от full), "
+            f"dump={row['mean_dump_ms']:.2f} мс, load={row['mean_load_ms']:.2f} мс, "
+            f"ошибка объёма<={row['max_volume_rel_error'] * 100:.3f}%"
+        )
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Размер ответа /detect_seg/ для разных форм полигонов")
+    parser.add_argument("--input-dir", default="input/wooden_boards_images")
+    parser.add_argument("--output-dir", default="output/wooden_boards_images/payload_size")
+    parser.add_argument("--model", default="../../detect/models/wood.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--tolerances", nargs="+", type=float, default=[0.5, 1.0, 2.0, 4.0])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    main(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        model_path=args.model,
+        imgsz=args.imgsz,
+        tolerances=args.tolerances,
+        repeats=args.repeats,
+    )
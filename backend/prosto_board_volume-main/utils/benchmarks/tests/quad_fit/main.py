@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Используем ту же геометрию, что и сервис detect
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "..", "..", "detect"))
+from services.geometry import QUAD_FIT_METHODS, board_volume, fit_quad  # noqa: E402
+
+
+def synthetic_board(rng, noise, rounding):
+    """
+    Торец доски: повёрнутый четырёхугольник со случайной перспективой,
+    растеризованный в маску, как маска сегментации. Возвращает (контур, истинные углы).
+    """
+    height = rng.uniform(15, 80)
+    width = height * rng.uniform(1.5, 8)
+    corners = np.array([[0, 0], [width, 0], [width, height], [0, height]], dtype=np.float64)
+    # Перспектива: каждый угол смещается на долю высоты доски
+    corners += rng.uniform(-0.15, 0.15, size=(4, 2)) * height
+    angle = rng.uniform(0, np.pi)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    corners = corners @ rotation.T
+    corners += 10 + rounding - corners.min(axis=0)
+
+    size = (int(np.ceil(corners[:, 1].max())) + 10 + rounding, int(np.ceil(corners[:, 0].max())) + 10 + rounding)
+    mask = np.zeros(size, dtype=np.uint8)
+    cv2.fillPoly(mask, [np.round(corners).astype(np.int32)], 1)
+    if rounding:
+        # Скруглённые углы, как у масок YOLO
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * rounding + 1, 2 * rounding + 1))
+        mask = cv2.morphologyEx(mask, cv2.MORPH_OPEN, kernel)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+    contour = max(contours, key=cv2.contourArea).reshape(-1, 2).astype(np.float64)
+    if noise:
+        # Дрожание границы маски
+        contour += rng.normal(0, noise, size=contour.shape)
+    return contour, corners
+
+
+def synthetic_contours(count, seed):
+    rng = np.random.default_rng(seed)
+    cases = []
+    for i in range(count):
+        noise = (0.0, 0.5, 1.0)[i % 3]
+        rounding = (0, 2, 4)[(i // 3) % 3]
+        cases.append(synthetic_board(rng, noise, rounding))
+    return cases
+
+
+def real_contours(input_dir, model_path, imgsz):
+    """Полные полигоны досок с изображений; ultralytics нужен только для этого набора"""
+    from ultralytics import YOLO
+
+    model = YOLO(model_path, task="segment")
+    contours = []
+    for filename in sorted(os.listdir(input_dir)):
+        if not filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            continue
+        with Image.open(os.path.join(input_dir, filename)) as img:
+            result = model(img.convert("RGB"), imgsz=imgsz, verbose=False)[0]
+        if result.masks is not None:
+            contours += [np.asarray(seg, dtype=np.float64) for seg in result.masks.xy if len(seg) >= 3]
+    return contours
+
+
+def corner_error(quad, reference):
+    """Средняя ошибка углов в пикселях при лучшем совпадении порядка углов"""
+    quad = fit_quad(np.asarray(quad, dtype=np.float32)).astype(np.float64)
+    reference = fit_quad(np.asarray(reference, dtype=np.float32)).astype(np.float64)
+    return min(
+        float(np.mean(np.linalg.norm(np.roll(quad, shift, axis=0) - reference, axis=1)))
+        for shift in range(4)
+    )
+
+
+def volume_error(quad, reference):
+    expected = board_volume(fit_quad(np.asarray(reference, dtype=np.float32)))
+    if expected <= 0:
+        return 0.0
+    return abs(board_volume(quad) - expected) / expected
+
+
+def time_method(contours, method, repeats):
+    """Время на каждый контур в микросекундах"""
+    times = []
+    for contour in contours:
+        contour = contour.astype(np.float32)
+        started = time.perf_counter()
+        for _ in range(repeats):
+            fit_quad(contour, method)
+        times.append((time.perf_counter() - started) / repeats * 1e6)
+    return np.array(times)
+
+
+def evaluate(contours, references, repeats):
+    """
+    Ошибка углов и объёма каждого способа относительно references, доля
+    контуров с теми же углами, что у способа search, и время на контур.
+    """
+    report = {}
+    baseline = [fit_quad(contour.astype(np.float32), "search") for contour in contours]
+    for method in QUAD_FIT_METHODS:
+        quads = [fit_quad(contour.astype(np.float32), method) for contour in contours]
+        same = [corner_error(quad, expected) < 0.5 for quad, expected in zip(quads, baseline)]
+        corner_errors = [corner_error(quad, reference) for quad, reference in zip(quads, references)]
+        volume_errors = [volume_error(quad, reference) for quad, reference in zip(quads, references)]
+        times = time_method(contours, method, repeats)
+        report[method] = {
+            "us_per_contour": float(np.mean(times)),
+            "p99_us_per_contour": float(np.percentile(times, 99)),
+            "mean_corner_error_px": float(np.mean(corner_errors)),
+            "p95_corner_error_px": float(np.percentile(corner_errors, 95)),
+            "max_corner_error_px": float(np.max(corner_errors)),
+            "mean_volume_rel_error": float(np.mean(volume_errors)),
+            "max_volume_rel_error": float(np.max(volume_errors)),
+            "same_as_search": float(np.mean(same)),
+        }
+    return report
+
+
+def print_report(title, report):
+    print(title)
+    baseline = report["search"]["us_per_contour"]
+    for method, row in report.items():
+        print(
+            f"{method:>10}: {row['us_per_contour']:8.1f} мкс/контур (x{baseline / row['us_per_contour']:.1f}), "
+            f"p99 {row['p99_us_per_contour']:.1f} мкс, "
+            f"ошибка углов: средняя {row['mean_corner_error_px']:.2f}, p95 {row['p95_corner_error_px']:.2f}, "
+            f"макс {row['max_corner_error_px']:.2f} пкс, "
+            f"ошибка объёма: средняя {row['mean_volume_rel_error'] * 100:.2f}%, "
+            f"макс {row['max_volume_rel_error'] * 100:.2f}%, "
+            f"совпадает с search: {row['same_as_search'] * 100:.1f}%"
+        )
+
+
+def main(input_dir, output_dir, model_path, imgsz, count, seed, repeats):
+    os.makedirs(output_dir, exist_ok=True)
+    report = {}
+
+    # Синтетические контуры сравниваются с истинными углами
+    cases = synthetic_contours(count, seed)
+    report["synthetic"] = evaluate([contour for contour, _ in cases], [corners for _, corners in cases], repeats)
+    print_report(f"Синтетические контуры: {len(cases)}, эталон — истинные углы", report["synthetic"])
+
+    # Реальные контуры сравниваются с текущим способом (search)
+    if model_path and os.path.exists(model_path):
+        contours = real_contours(input_dir, model_path, imgsz)
+        if contours:
+            references = [fit_quad(contour.astype(np.float32), "search") for contour in contours]
+            report["real"] = evaluate(contours, references, repeats)
+            print_report(f"Реальные контуры: {len(contours)}, эталон — способ search", report["real"])
+    else:
+        print(f"Модель {model_path} не найдена, реальные контуры пропущены")
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Скорость и точность способов приведения контура к 4 углам")
+    parser.add_argument("--input-dir", default="input/wooden_boards_images")
+    parser.add_argument("--output-dir", default="output/wooden_boards_images/quad_fit")
+    parser.add_argument("--model", default="../../detect/models/wood.pt")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--count", type=int, default=900, help="Число синтетических контуров")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    main(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        model_path=args.model,
+        imgsz=args.imgsz,
+        count=args.count,
+        seed=args.seed,
+        repeats=args.repeats,
+    )
@@ -1,11 +1,13 @@
 import os
 import requests
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, ImageOps
 import random
 
 def draw_polygons(image_path, output_path, detections):
     """Рисуем полигоны обнаруженных объектов на изображении"""
-    with Image.open(image_path) as img:
+    with Image.open(image_path) as source:
+        # Сервис возвращает координаты с учётом ориентации EXIF
+        img = ImageOps.exif_transpose(source)
         draw = ImageDraw.Draw(img, 'RGBA')
         
         for detection in detections:
@@ -40,42 +42,49 @@ def draw_polygons(image_path, output_path, detections):
         
         img.save(output_path)
 
-def process_image(input_path, output_dir):
-    url = "http://0.0.0.0:8001/detect_seg/"
+def process_batch(input_paths, output_dir):
+    """Отправляем несколько изображений одним запросом к /detect_seg/batch"""
+    url = "http://0.0.0.0:8001/detect_seg/batch"
     
     try:
-        with open(input_path, 'rb') as f:
-            response = requests.post(
-                url,
-                files={'file': f},
-                headers={'accept': 'application/json'}
-            )
+        files = []
+        for input_path in input_paths:
+            with open(input_path, 'rb') as f:
+                files.append(('files', (os.path.basename(input_path), f.read())))
+        response = requests.post(
+            url,
+            files=files,
+            headers={'accept': 'application/json'}
+        )
         response.raise_for_status()
         
-        detections = response.json()
-        
-        # Создаем имя выходного файла
-        filename = os.path.basename(input_path)
-        output_path = os.path.join(output_dir, f"annotated_{filename}")
-        
-        # Рисуем и сохраняем результат
-        draw_polygons(input_path, output_path, detections)
-        print(f"Обработано: {filename} -> {output_path}")
+        # Результаты приходят в том же порядке, что и файлы
+        for input_path, detections in zip(input_paths, response.json()):
+            # Создаем имя выходного файла
+            filename = os.path.basename(input_path)
+            output_path = os.path.join(output_dir, f"annotated_{filename}")
+            
+            # Рисуем и сохраняем результат
+            draw_polygons(input_path, output_path, detections)
+            print(f"Обработано: {filename} -> {output_path}")
         
     except requests.exceptions.HTTPError as errh:
         print(f"HTTP ошибка: {errh}")
     except Exception as e:
         print(f"Ошибка: {e}")
 
-def main(input_dir, output_dir):
+def main(input_dir, output_dir, batch_size=8):
     # Создаем выходную директорию
     os.makedirs(output_dir, exist_ok=True)
     
-    # Обрабатываем все изображения в директории
-    for filename in os.listdir(input_dir):
-        if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-            file_path = os.path.join(input_dir, filename)
-            process_image(file_path, output_dir)
+    # Обрабатываем все изображения в директории пакетами
+    file_paths = [
+        os.path.join(input_dir, filename)
+        for filename in os.listdir(input_dir)
+        if filename.lower().endswith(('.png', '.jpg', '.jpeg'))
+    ]
+    for start in range(0, len(file_paths), batch_size):
+        process_batch(file_paths[start:start + batch_size], output_dir)
 
 if __name__ == "__main__":
     main(
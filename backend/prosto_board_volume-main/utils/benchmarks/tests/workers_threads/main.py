@@ -0,0 +1,185 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+
+def splits(cores):
+    """Все разбиения ядер на воркеры×потоки без переподписки"""
+    return [(workers, cores // workers) for workers in range(1, cores + 1) if cores % workers == 0]
+
+
+def load_images(input_dir, limit):
+    images = []
+    for filename in sorted(os.listdir(input_dir)):
+        if filename.lower().endswith((".png", ".jpg", ".jpeg")):
+            with open(os.path.join(input_dir, filename), "rb") as f:
+                images.append((filename, f.read()))
+    return images[:limit]
+
+
+def start_service(detect_dir, port, cores, workers, threads):
+    """Запускаем detect в режиме pre-fork на первых cores ядрах"""
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        SERVER_WORKERS=str(workers),
+        INTRA_OP_THREADS=str(threads),
+        # Повторяющиеся изображения не должны обслуживаться из кэша
+        RESULT_CACHE_ENABLED="false",
+        NEAR_DUPLICATE_ENABLED="false",
+    )
+    return subprocess.Popen(
+        [sys.executable, "main.py"],
+        cwd=detect_dir,
+        env=env,
+        start_new_session=True,
+        preexec_fn=lambda: os.sched_setaffinity(0, range(cores)),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def wait_ready(base_url, workers, timeout):
+    """Ждём, пока прогреются все воркеры (каждый ответ /ready приходит от случайного воркера)"""
+    deadline = time.monotonic() + timeout
+    ready_in_row = 0
+    while time.monotonic() < deadline:
+        try:
+            ready_in_row = ready_in_row + 1 if requests.get(f"{base_url}/ready", timeout=5).ok else 0
+        except requests.RequestException:
+            ready_in_row = 0
+        if ready_in_row >= 4 * workers:
+            return True
+        time.sleep(0.25)
+    return False
+
+
+def stop_service(process):
+    os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def process_tree_pss_mb(pid):
+    """Суммарный PSS родителя и воркеров: общие по copy-on-write страницы делятся между процессами"""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids += [int(child) for child in f.read().split()]
+    except OSError:
+        return None
+
+    total_kb = 0
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            pass
+    return total_kb / 1024
+
+
+def load_test(base_url, images, concurrency, duration):
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        latencies = []
+        errors = 0
+        session = requests.Session()
+        i = offset
+        while time.monotonic() < deadline:
+            filename, data = images[i % len(images)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                response = session.post(f"{base_url}/detect_seg/", files={"file": (filename, data)}, timeout=120)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except requests.RequestException:
+                errors += 1
+        return latencies, errors
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(client, range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    latencies = np.array([latency for result in results for latency in result[0]])
+    return {
+        "requests": int(len(latencies)),
+        "errors": int(sum(result[1] for result in results)),
+        "throughput_rps": float(len(latencies) / elapsed),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+        "p95_ms": float(np.percentile(latencies, 95) * 1000) if len(latencies) else None,
+    }
+
+
+def main(input_dir, output_dir, detect_dir, cores, port, concurrency, duration, limit, ready_timeout):
+    os.makedirs(output_dir, exist_ok=True)
+    images = load_images(input_dir, limit)
+    base_url = f"http://127.0.0.1:{port}"
+    print(f"Изображений: {len(images)}, ядер: {cores}, параллельных клиентов: {concurrency}")
+
+    report = {}
+    for workers, threads in splits(cores):
+        name = f"{workers}x{threads}"
+        process = start_service(detect_dir, port, cores, workers, threads)
+        try:
+            if not wait_ready(base_url, workers, ready_timeout):
+                print(f"{name}: сервис не стал готов за {ready_timeout} с")
+                continue
+            load_test(base_url, images, concurrency, min(5.0, duration))
+            row = load_test(base_url, images, concurrency, duration)
+            row["pss_mb"] = process_tree_pss_mb(process.pid)
+        finally:
+            stop_service(process)
+
+        report[name] = row
+        pss = f"{row['pss_mb']:.0f} МБ" if row["pss_mb"] is not None else "н/д"
+        print(
+            f"воркеры×потоки={name:>6}: {row['throughput_rps']:.2f} изобр./с, "
+            f"p50={row['p50_ms'] or 0:.0f} мс, p95={row['p95_ms'] or 0:.0f} мс, "
+            f"ошибок={row['errors']}, память (PSS)={pss}"
+        )
+
+    with open(os.path.join(output_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пропускная способность detect в зависимости от разбиения ядер на воркеры×потоки")
+    parser.add_argument("--input-dir", default="input/wooden_boards_images")
+    parser.add_argument("--output-dir", default="output/wooden_boards_images/workers_threads")
+    parser.add_argument("--detect-dir", default="../../detect")
+    parser.add_argument("--cores", type=int, default=len(os.sched_getaffinity(0)))
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    args = parser.parse_args()
+
+    main(
+        input_dir=args.input_dir,
+        output_dir=args.output_dir,
+        detect_dir=args.detect_dir,
+        cores=args.cores,
+        port=args.port,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        limit=args.limit,
+        ready_timeout=args.ready_timeout,
+    )